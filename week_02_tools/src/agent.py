@@ -2,16 +2,41 @@
 Agent module that creates a structured output agent using LangChain
 and a local gpt-oss model via prompt engineering.
 """
+import asyncio
 import json
+import os
 
+from async_tools import (
+    ASYNC_TOOLS,
+    aclose_http_client,
+    current_weather_tool,
+    stock_price_tool,
+    stock_prices_tool,
+    top_headlines_tool,
+)
 from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI
+from intent import FastPath
+from json_stream import IncrementalJSONParser
+from report import city_report_tool
 from schemas import CityReport  # We still use this for validation/parsing
-from tools import get_current_weather, get_stock_price, get_top_headlines
+
+# "json" asks the LLM to write the CityReport JSON itself; "structured" builds it
+# in Python from the tool results and skips that final generation.
+AGENT_OUTPUT_MODE = os.getenv("AGENT_OUTPUT_MODE", "json").lower()
+# Print tokens and tool events as they happen instead of waiting for the full answer
+AGENT_STREAMING = os.getenv("AGENT_STREAMING", "1") != "0"
+# OpenAI-compatible endpoint serving the model (LM Studio by default)
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "http://localhost:1234/v1")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-oss-20b")
+# Answer simple single-tool questions locally, without the LLM (see intent.py)
+AGENT_FAST_PATH = os.getenv("AGENT_FAST_PATH", "1") != "0"
 
 # --- NEW: A detailed prompt that describes the desired JSON output ---
 SYSTEM_PROMPT = """You are a helpful assistant. You must use the provided tools to gather the information required to answer the user's questions.
+When you need several independent pieces of information (e.g. the weather, the news and a stock price), request all of those tool calls in the same turn so they can run at the same time. To look up or compare several stocks, call get_stock_prices once with all the tickers.
+If a tool reports that a service is currently unavailable, do not call it again; answer with the information you have and mention what is missing.
 
 After you have used the tools and have all the necessary information, you MUST format your final answer as a single, valid JSON object. This JSON object must strictly adhere to the following structure:
 
@@ -35,26 +60,49 @@ For all other questions (e.g., "what's the weather in London?", "what's the pric
 Do not include any other text, explanations, or markdown formatting around the final JSON object.
 """
 
-def setup_agent():
+# Structured mode: the LLM only picks tools. City reports come back from
+# get_city_report as a CityReport object, with no final LLM formatting turn.
+STRUCTURED_SYSTEM_PROMPT = """You are a helpful assistant. You must use the provided tools to gather the information required to answer the user's questions.
+
+Whenever the user asks about a city in general, or for both its weather and its news, call get_city_report once with the city and its two-letter country code. Its result is shown to the user directly.
+
+For all other questions (e.g., "what's the weather in London?", "top headlines in the US?", "what's the price of NVDA?"), answer directly and concisely in plain text based on the output from the tools. To look up or compare several stocks, call get_stock_prices once with all the tickers.
+If a tool reports that a service is currently unavailable, do not call it again; answer with the information you have and mention what is missing.
+"""
+
+def setup_agent(structured: bool = AGENT_OUTPUT_MODE == "structured", http_async_client=None):
     """
     Sets up and configures the agent for the gpt-oss model.
     Returns an AgentExecutor instance.
+
+    The tools have both sync and async implementations. Use
+    `agent_executor.ainvoke` to run the tool calls of one LLM turn concurrently.
+
+    Args:
+        structured (bool): If True, city reports are assembled in Python by the
+            get_city_report tool and the executor's output is a CityReport object.
+        http_async_client (httpx.AsyncClient, optional): Client for async LLM calls;
+            its connection limit caps concurrent requests to the LLM server.
     """
     llm = ChatOpenAI(
-        model="gpt-oss-20b",
+        model=LLM_MODEL,
         temperature=0,
-        base_url="http://localhost:1234/v1",
-        api_key="local"
+        base_url=LLM_BASE_URL,
+        api_key="local",
+        http_async_client=http_async_client,
     )
     
     # We now use our new detailed prompt
     prompt = ChatPromptTemplate.from_messages([
-        ("system", SYSTEM_PROMPT),
+        ("system", STRUCTURED_SYSTEM_PROMPT if structured else SYSTEM_PROMPT),
         ("user", "{input}"),
         MessagesPlaceholder(variable_name="agent_scratchpad"),
     ])
 
-    tools = [get_current_weather, get_top_headlines, get_stock_price]
+    if structured:
+        tools = [city_report_tool, current_weather_tool, top_headlines_tool, stock_price_tool, stock_prices_tool]
+    else:
+        tools = ASYNC_TOOLS
 
     # We use the standard llm, NOT a structured_llm
     agent = create_openai_tools_agent(llm, tools, prompt)
@@ -62,36 +110,29 @@ def setup_agent():
     return AgentExecutor(agent=agent, tools=tools, verbose=True)
 
 
-def print_city_report(response_str: str):
+def print_city_report(response_str):
     """
     Parses the JSON string from the agent and prints it.
     
     Args:
-        response_str (str): The agent's raw string output, expected to be JSON.
+        response_str (str | CityReport): The agent's raw string output, expected to be JSON,
+            or a CityReport already built in structured mode.
     """
+    if isinstance(response_str, CityReport):
+        _print_report(response_str.model_dump())
+        return
+
     print("\n--- Raw Agent Output ---")
     print(response_str)
 
+    if not response_str.lstrip().startswith("{"):
+        # A plain-text answer to a simple question; there is no report to parse
+        return
+
     try:
         # The output is now a string that we need to parse into a dictionary
         report = json.loads(response_str)
-        
-        if report.get("error_message"):
-            print(f"\n--- Error Reported by Agent ---")
-            print(report["error_message"])
-            return
-
-        print("\n--- Parsed City Report ---")
-        if "weather" in report and report["weather"]:
-            weather = report["weather"]
-            print(f"Weather in {weather.get('location', 'N/A')}:")
-            print(f"  - Temp: {weather.get('temperature', 'N/A')}°C")
-            print(f"  - Desc: {weather.get('description', 'N/A')}")
-        
-        if "news" in report and report["news"]:
-            print(f"\nTop News Headlines:")
-            for article in report["news"]:
-                print(f"  - {article.get('title', 'No Title')}")
+        _print_report(report)
 
     except json.JSONDecodeError:
         print("\n--- Error ---")
@@ -100,29 +141,156 @@ def print_city_report(response_str: str):
         print(f"\nAn error occurred while printing the report: {e}")
 
 
-if __name__ == '__main__':
-    # --- The Final CLI Application Loop ---
-    
+def _print_report(report: dict):
+    """Prints a city report given as a dictionary."""
+    if report.get("error_message") and not (report.get("weather") or report.get("news")):
+        print(f"\n--- Error Reported by Agent ---")
+        print(report["error_message"])
+        return
+
+    print("\n--- Parsed City Report ---")
+    if "weather" in report and report["weather"]:
+        _print_weather(report["weather"])
+
+    if "news" in report and report["news"]:
+        print(f"\nTop News Headlines:")
+        for article in report["news"]:
+            _print_article(article)
+
+    if report.get("error_message"):
+        print(f"\nNote: {report['error_message']}")
+
+
+def _print_weather(weather: dict):
+    print(f"Weather in {weather.get('location', 'N/A')}:")
+    print(f"  - Temp: {weather.get('temperature', 'N/A')}°C")
+    print(f"  - Desc: {weather.get('description', 'N/A')}")
+
+
+def _print_article(article: dict):
+    print(f"  - {article.get('title', 'No Title')}")
+
+
+class StreamingReportPrinter:
+    """
+    Prints one LLM turn's output while it streams.
+
+    Plain-text answers are echoed token by token. If the answer turns out to be
+    a JSON city report, it is fed to an IncrementalJSONParser and each block is
+    printed as soon as it is complete: the weather first, then every headline.
+    """
+
+    def __init__(self):
+        self.parser = IncrementalJSONParser()
+        self.mode = None  # None until the first non-blank character, then "json" or "text"
+        self.printed = False
+        self._news_header = False
+
+    def feed(self, text: str):
+        if self.mode is None:
+            if not text.strip():
+                return
+            stripped = text.lstrip()
+            self.mode = "json" if stripped.startswith(("{", "`")) else "text"
+            text = stripped
+        if self.mode == "text":
+            print(text, end="", flush=True)
+            self.printed = True
+            return
+        for key, value in self.parser.feed(text):
+            self._render(key, value)
+
+    def _render(self, key: str, value):
+        if key == "weather" and value:
+            print("\n--- City Report ---")
+            _print_weather(value)
+            self.printed = True
+        elif key == "news[]" and isinstance(value, dict):
+            if not self._news_header:
+                print(f"\nTop News Headlines:")
+                self._news_header = True
+            _print_article(value)
+            self.printed = True
+        elif key == "error_message" and value:
+            print(f"\nNote: {value}")
+            self.printed = True
+
+
+async def stream_city_report(agent_executor, user_input: str):
+    """
+    Runs the agent and prints tool events and the answer as they happen.
+
+    Returns:
+        The executor's final output (a string, or a CityReport in structured mode).
+    """
+    printer = StreamingReportPrinter()
+    output = None
+    async for event in agent_executor.astream_events({"input": user_input}, version="v2"):
+        kind = event["event"]
+        if kind == "on_chat_model_start":
+            # Each LLM turn gets its own printer; only the last one holds the answer
+            printer = StreamingReportPrinter()
+        elif kind == "on_chat_model_stream":
+            content = event["data"]["chunk"].content
+            if isinstance(content, str) and content:
+                printer.feed(content)
+        elif kind == "on_tool_start":
+            print(f"  … {event['name']}({event['data'].get('input')})", flush=True)
+        elif kind == "on_tool_end":
+            print(f"  ✓ {event['name']}", flush=True)
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            output = event["data"]["output"].get("output")
+
+    if printer.mode == "text":
+        print()
+    elif not printer.printed and output is not None:
+        # Nothing renderable was streamed (structured mode or malformed JSON)
+        print_city_report(output)
+    return output
+
+
+async def run_cli():
+    """
+    The CLI loop. It runs on a single event loop so that the pooled HTTP
+    client in async_tools keeps its connections alive between questions.
+    """
     print("✅ Your Multi-Tool Assistant is ready! Type 'exit' or 'quit' to end.")
-    
+
     # Setup the agent once
     agent_executor = setup_agent()
-    
-    while True:
-        # Get user input from the command line
-        user_input = input("\n> ")
-        # Check for exit commands
-        if user_input.lower() in ["exit", "quit"]:
-            print("Exiting assistant. Goodbye! 👋")
-            break
-        # Invoke the agent with the user's input
-        try:
-            # Turn off verbose for a cleaner chat experience
-            agent_executor.verbose = False 
-            response = agent_executor.invoke({
-                "input": user_input
-            })
-            # Print the structured report
-            print_city_report(response['output'])
-        except Exception as e:
-            print(f"\nAn error occurred: {e}")
\ No newline at end of file
+    # Turn off verbose for a cleaner chat experience
+    agent_executor.verbose = False
+    fast_path = FastPath() if AGENT_FAST_PATH else None
+
+    try:
+        while True:
+            # Get user input from the command line without blocking the loop
+            user_input = await asyncio.to_thread(input, "\n> ")
+            # Check for exit commands
+            if user_input.lower() in ["exit", "quit"]:
+                print("Exiting assistant. Goodbye! 👋")
+                break
+            try:
+                # Simple questions are answered locally; everything else goes to the agent
+                answer = await fast_path.aanswer(user_input) if fast_path else None
+                if answer is not None:
+                    print(answer)
+                    continue
+                if AGENT_STREAMING:
+                    await stream_city_report(agent_executor, user_input)
+                    continue
+                # Invoke the agent with the user's input
+                response = await agent_executor.ainvoke({
+                    "input": user_input
+                })
+                # Print the structured report
+                print_city_report(response['output'])
+            except Exception as e:
+                print(f"\nAn error occurred: {e}")
+    finally:
+        await aclose_http_client()
+
+
+if __name__ == '__main__':
+    # --- The Final CLI Application Loop ---
+    asyncio.run(run_cli())
@@ -0,0 +1,277 @@
+"""
+Async variants of the week_02 tools.
+
+All three tools share one keep-alive httpx.AsyncClient, so repeated calls reuse
+pooled connections instead of paying a new TCP/TLS handshake each time. Each tool
+exported here carries both the blocking function from tools.py and an async
+coroutine, so it works with AgentExecutor.invoke as well as ainvoke. Under
+ainvoke the executor runs every tool call of a single LLM turn with
+asyncio.gather, which is what makes weather, news and a quote cost one round
+trip instead of three.
+
+The async variants share the TTL cache in cache.py with their sync counterparts.
+"""
+import asyncio
+from typing import Dict, List, Optional
+
+import httpx
+from breaker import CircuitOpenError, ahttp_get
+from cache import cached
+from coalesce import AsyncSingleFlight
+from langchain_core.tools import StructuredTool
+from schemas import NewsArticle, StockPriceResponse, WeatherResponse
+
+from tools import (
+    BATCH_STOCK_URL,
+    CONNECT_TIMEOUT,
+    FMP_API_KEY,
+    NEWS_API_KEY,
+    OPENWEATHERMAP_API_KEY,
+    REQUEST_TIMEOUT,
+    STOCK_URL,
+    WEATHER_URL,
+    format_stock_price,
+    format_weather,
+    cached_quotes,
+    get_current_weather,
+    get_stock_price,
+    get_stock_prices,
+    get_top_headlines,
+    headline_store,
+    is_error_result,
+    news_error,
+    normalise_tickers,
+    parse_articles,
+    parse_quotes,
+    parse_weather,
+    quote_error,
+    remember_quotes,
+    weather_error,
+    weather_params,
+)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the shared AsyncClient, creating it on first use.
+
+    The client is bound to the event loop it first runs on, so callers should
+    keep one loop alive for the life of the process (see agent.py's CLI loop).
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _client
+
+
+async def aclose_http_client():
+    """Closes the shared client and its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+@cached("get_stock_price", skip=is_error_result)
+async def aget_stock_price(ticker: str) -> str:
+    """
+    Get the current stock price for a given ticker symbol.
+
+    Args:
+        ticker (str): The stock ticker symbol (e.g., "AAPL" for Apple).
+
+    Returns:
+        str: A string containing the stock price information or an error message.
+    """
+    if not FMP_API_KEY:
+        return "Error: Financial Modeling Prep API key is not set."
+
+    try:
+        response = await ahttp_get(
+            "fmp", get_http_client(), STOCK_URL.format(ticker=ticker.upper()), params={"apikey": FMP_API_KEY}
+        )
+        response.raise_for_status()
+        return format_stock_price(ticker, response.json())
+    except CircuitOpenError as open_err:
+        return f"Error: {open_err}"
+    except httpx.HTTPStatusError as http_err:
+        return f"Error: HTTP error occurred: {http_err}"
+    except Exception as e:
+        return f"An unexpected error occurred: {e}"
+
+
+_quote_flight = AsyncSingleFlight()
+
+
+async def _afetch_quotes(symbols: List[str]) -> Dict[str, StockPriceResponse]:
+    """One FMP request for all `symbols`. Never raises; failures become error responses."""
+    try:
+        response = await ahttp_get(
+            "fmp", get_http_client(), BATCH_STOCK_URL.format(tickers=",".join(symbols)), params={"apikey": FMP_API_KEY}
+        )
+        response.raise_for_status()
+        quotes = parse_quotes(symbols, response.json())
+    except CircuitOpenError as open_err:
+        quotes = {s: quote_error(s, str(open_err)) for s in symbols}
+    except httpx.HTTPStatusError as http_err:
+        quotes = {s: quote_error(s, f"HTTP error occurred: {http_err}") for s in symbols}
+    except Exception as e:
+        quotes = {s: quote_error(s, f"An unexpected error occurred: {e}") for s in symbols}
+    remember_quotes(quotes)
+    return quotes
+
+
+async def aget_stock_prices(tickers: List[str]) -> List[StockPriceResponse]:
+    """
+    Get the current stock prices for several ticker symbols in a single call.
+
+    Args:
+        tickers (List[str]): The stock ticker symbols (e.g., ["AAPL", "MSFT", "NVDA"]).
+
+    Returns:
+        List[StockPriceResponse]: One entry per ticker; failed lookups have `error_message` set.
+    """
+    symbols = normalise_tickers(tickers)
+    if not FMP_API_KEY:
+        return [quote_error(s, "Financial Modeling Prep API key is not set.") for s in symbols]
+
+    quotes, missing = cached_quotes(symbols)
+    if missing:
+        quotes.update(await _quote_flight.run(missing, _afetch_quotes))
+    return [quotes[s] for s in symbols]
+
+
+@cached("get_current_weather", skip=is_error_result)
+async def aget_current_weather(location: str) -> str:
+    """
+    Get the current weather for a specific location.
+
+    Args:
+        location (str): The city name (e.g., "San Francisco").
+
+    Returns:
+        str: A string containing the weather information or an error message.
+    """
+    if not OPENWEATHERMAP_API_KEY:
+        return "Error: OpenWeatherMap API key is not set."
+
+    try:
+        response = await ahttp_get("openweathermap", get_http_client(), WEATHER_URL, params=weather_params(location))
+        response.raise_for_status()
+        return format_weather(response.json())
+    except CircuitOpenError as open_err:
+        return f"Error: {open_err}"
+    except httpx.HTTPStatusError as http_err:
+        if http_err.response.status_code == 404:
+            return f"Error: City '{location}' not found. Please check the spelling."
+        return f"Error: HTTP error occurred: {http_err}"
+    except Exception as e:
+        return f"An unexpected error occurred: {e}"
+
+
+async def aget_top_headlines(country: str) -> List[Dict]:
+    """
+    Get the top 5 news headlines for a specific country.
+
+    Args:
+        country (str): The two-letter country code (e.g., "us", "gb", "de").
+
+    Returns:
+        List[Dict]: A list of dictionaries, each containing a headline's 'title' and 'url'.
+    """
+    if not NEWS_API_KEY:
+        return [{"error": "News API key is not set."}]
+
+    try:
+        articles = (await headline_store.aget(country, get_http_client())).articles
+        if not articles:
+            return [{"error": f"No news articles found for country code '{country}'."}]
+        return articles
+    except CircuitOpenError as open_err:
+        return [{"error": str(open_err)}]
+    except httpx.HTTPStatusError as http_err:
+        try:
+            error_details = http_err.response.json().get("message", str(http_err))
+        except ValueError:
+            error_details = str(http_err)
+        return [{"error": f"HTTP error occurred: {http_err} - {error_details}"}]
+    except Exception as e:
+        return [{"error": f"An unexpected error occurred: {e}"}]
+
+
+@cached("weather_report", skip=is_error_result, model=WeatherResponse)
+async def afetch_weather(location: str) -> WeatherResponse:
+    """Async counterpart of tools.fetch_weather."""
+    if not OPENWEATHERMAP_API_KEY:
+        return weather_error(location, "OpenWeatherMap API key is not set.")
+
+    try:
+        response = await ahttp_get("openweathermap", get_http_client(), WEATHER_URL, params=weather_params(location))
+        response.raise_for_status()
+        return parse_weather(response.json())
+    except CircuitOpenError as open_err:
+        return weather_error(location, str(open_err))
+    except httpx.HTTPStatusError as http_err:
+        if http_err.response.status_code == 404:
+            return weather_error(location, f"City '{location}' not found. Please check the spelling.")
+        return weather_error(location, f"HTTP error occurred: {http_err}")
+    except Exception as e:
+        return weather_error(location, f"An unexpected error occurred: {e}")
+
+
+async def afetch_news_articles(country: str) -> List[NewsArticle]:
+    """Async counterpart of tools.fetch_news_articles, also read through headline_store."""
+    if not NEWS_API_KEY:
+        return [news_error("News API key is not set.")]
+
+    try:
+        snapshot = await headline_store.aget(country, get_http_client())
+        return parse_articles(country, {"articles": snapshot.articles})
+    except CircuitOpenError as open_err:
+        return [news_error(str(open_err))]
+    except httpx.HTTPStatusError as http_err:
+        return [news_error(f"HTTP error occurred: {http_err}")]
+    except Exception as e:
+        return [news_error(f"An unexpected error occurred: {e}")]
+
+
+def _dual_tool(sync_tool, coroutine) -> StructuredTool:
+    """Builds a tool with the same name/schema as `sync_tool` plus an async path."""
+    return StructuredTool.from_function(
+        func=sync_tool.func,
+        coroutine=coroutine,
+        name=sync_tool.name,
+        description=sync_tool.description,
+        args_schema=sync_tool.args_schema,
+    )
+
+
+current_weather_tool = _dual_tool(get_current_weather, aget_current_weather)
+top_headlines_tool = _dual_tool(get_top_headlines, aget_top_headlines)
+stock_price_tool = _dual_tool(get_stock_price, aget_stock_price)
+stock_prices_tool = _dual_tool(get_stock_prices, aget_stock_prices)
+
+ASYNC_TOOLS = [current_weather_tool, top_headlines_tool, stock_price_tool, stock_prices_tool]
+
+
+# ---- Test the functions concurrently ----
+if __name__ == "__main__":
+    async def _main():
+        try:
+            results = await asyncio.gather(
+                aget_current_weather("Berlin"),
+                aget_top_headlines("us"),
+                aget_stock_price("AAPL"),
+                aget_stock_prices(["AAPL", "MSFT", "NVDA"]),
+            )
+            for result in results:
+                print(result)
+        finally:
+            await aclose_http_client()
+
+    asyncio.run(_main())
@@ -0,0 +1,181 @@
+"""
+Offline latency benchmark for the week_02 tools and agent.
+
+Starts the replay stub server from replay.py in-process, points tools.py and
+setup_agent at it, and reports p50/p95/p99 latencies per tool (sync and async)
+and per end-to-end agent query. Nothing leaves localhost, so results are
+comparable between runs and branches.
+
+Usage:
+    python benchmark.py --iterations 20 --latency-ms 80
+    python benchmark.py --cache --structured --fast-path --json results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Callable, Dict, List
+
+from replay import FIXTURES_PATH, StubServer, load_fixtures
+
+TOOL_CASES = {
+    "get_current_weather": ["Berlin", "London", "Paris"],
+    "get_top_headlines": ["us", "de", "gb"],
+    "get_stock_price": ["AAPL", "MSFT", "NVDA"],
+    "get_stock_prices": [["AAPL", "MSFT", "NVDA"]],
+}
+
+AGENT_QUERIES = [
+    "Give me a report for Berlin",
+    "What's the weather in London?",
+    "Compare AAPL, MSFT and NVDA",
+    "Top news headlines in the US",
+]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Nearest-rank p50/p95/p99 and mean of `samples`, in milliseconds."""
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+        return round(ordered[index] * 1000, 2)
+
+    return {
+        "n": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+    }
+
+
+def _timed(func: Callable, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+async def _atimed(coroutine) -> float:
+    start = time.perf_counter()
+    await coroutine
+    return time.perf_counter() - start
+
+
+async def run(args) -> dict:
+    # Imported here, after the environment points at the stub server
+    import agent
+    import async_tools
+    import tools
+    from breaker import breaker_stats
+    from cache import tool_cache
+    from intent import FastPath, IntentClassifier
+
+    def reset():
+        if not args.cache:
+            tool_cache.clear()
+            tools.headline_store.clear()
+
+    sync_tools = {
+        "get_current_weather": tools.get_current_weather.func,
+        "get_top_headlines": tools.get_top_headlines.func,
+        "get_stock_price": tools.get_stock_price.func,
+        "get_stock_prices": tools.get_stock_prices.func,
+    }
+    async_variants = {
+        "get_current_weather": async_tools.aget_current_weather,
+        "get_top_headlines": async_tools.aget_top_headlines,
+        "get_stock_price": async_tools.aget_stock_price,
+        "get_stock_prices": async_tools.aget_stock_prices,
+    }
+
+    report = {"tools": {}, "agent": {}, "config": vars(args)}
+    for name, cases in TOOL_CASES.items():
+        sync_samples, async_samples = [], []
+        for _ in range(args.iterations):
+            for case in cases:
+                reset()
+                sync_samples.append(_timed(sync_tools[name], case))
+                reset()
+                async_samples.append(await _atimed(async_variants[name](case)))
+        report["tools"][f"{name} (sync)"] = percentiles(sync_samples)
+        report["tools"][f"{name} (async)"] = percentiles(async_samples)
+
+    executor = agent.setup_agent(structured=args.structured)
+    executor.verbose = False
+    fast_path = FastPath(IntentClassifier()) if args.fast_path else None
+    for query in AGENT_QUERIES:
+        samples = []
+        for _ in range(args.agent_iterations):
+            reset()
+            start = time.perf_counter()
+            answer = await fast_path.aanswer(query) if fast_path else None
+            if answer is None:
+                await executor.ainvoke({"input": query})
+            samples.append(time.perf_counter() - start)
+        report["agent"][query] = percentiles(samples)
+
+    report["cache"] = tool_cache.snapshot()
+    report["breakers"] = breaker_stats()
+    await async_tools.aclose_http_client()
+    return report
+
+
+def print_report(report: dict):
+    for section in ("tools", "agent"):
+        print(f"\n--- {section} latency (ms) ---")
+        print(f"{'case':<45} {'n':>4} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for name, stats in report[section].items():
+            print(
+                f"{name[:45]:<45} {stats['n']:>4} {stats.get('mean', 0):>9} "
+                f"{stats.get('p50', 0):>9} {stats.get('p95', 0):>9} {stats.get('p99', 0):>9}"
+            )
+    print(f"\nStub: {report['stub']}")
+    print(f"Cache: {report['cache']}")
+    print(f"Breakers: {report['breakers']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline latency benchmark for week_02 tools and agent.")
+    parser.add_argument("--fixtures", default=FIXTURES_PATH)
+    parser.add_argument("--iterations", type=int, default=10, help="Iterations per tool case.")
+    parser.add_argument("--agent-iterations", type=int, default=3, help="Iterations per agent query.")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Upstream API latency.")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="Fixed cost per LLM call.")
+    parser.add_argument("--llm-token-ms", type=float, default=2.0, help="Cost per generated token.")
+    parser.add_argument("--llm-final-tokens", type=int, default=300, help="Length of the final answer.")
+    parser.add_argument("--cache", action="store_true", help="Keep the tool cache warm between calls.")
+    parser.add_argument("--structured", action="store_true", help="Benchmark the structured CityReport mode.")
+    parser.add_argument("--fast-path", action="store_true", help="Try the local intent fast path first.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Also write the report to this file.")
+    args = parser.parse_args()
+
+    stub = StubServer(
+        fixtures=load_fixtures(args.fixtures),
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        llm_latency_ms=args.llm_latency_ms,
+        llm_token_ms=args.llm_token_ms,
+        llm_final_tokens=args.llm_final_tokens,
+        seed=args.seed,
+    ).start()
+    os.environ.update(stub.env())
+    os.environ["TOOLS_CACHE_PATH"] = ""  # Never read a real on-disk cache here
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        stub.stop()
+    result["stub"] = stub.stats
+
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nReport written to {args.json}")
@@ -0,0 +1,192 @@
+"""
+Circuit breakers and retry policy for the week_02 upstream APIs.
+
+Every call to OpenWeatherMap, NewsAPI or FMP goes through `http_get` (blocking)
+or `ahttp_get` (httpx) with the breaker for that upstream. Transient failures
+(timeouts, connection errors, 429 and 5xx) are retried a bounded number of times
+with full-jitter exponential backoff. After `failure_threshold` failed attempts
+in a row the breaker opens, and for the next `reset_timeout` seconds every call
+fails immediately with CircuitOpenError instead of waiting on a dead upstream.
+After that one probe request is let through; if it succeeds the breaker closes.
+
+Client errors such as 404 (unknown city) mean the upstream is up, so they count
+as successes here and are left to the caller's raise_for_status.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import httpx
+import requests
+
+FAILURE_THRESHOLD = int(os.getenv("TOOLS_BREAKER_FAILURES", "5"))
+RESET_TIMEOUT = float(os.getenv("TOOLS_BREAKER_RESET", "30"))
+# Extra attempts after the first one, for transient failures only
+MAX_RETRIES = int(os.getenv("TOOLS_MAX_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("TOOLS_BACKOFF_BASE", "0.2"))
+BACKOFF_MAX = float(os.getenv("TOOLS_BACKOFF_MAX", "2.0"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        self.name = name
+        self.retry_in = retry_in
+        super().__init__(
+            f"{name} is currently unavailable (circuit open, retry in {retry_in:.0f}s). "
+            "Do not call this tool again for now."
+        )
+
+
+class CircuitBreaker:
+    """
+    Args:
+        name (str): Upstream name, used in error messages and stats.
+        failure_threshold (int): Consecutive failed attempts that open the breaker.
+        reset_timeout (float): Seconds the breaker stays open before a probe is allowed.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "trips": 0}
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Reserves an attempt, or raises CircuitOpenError if the upstream should not be called."""
+        with self._lock:
+            if self.state == OPEN:
+                retry_in = self._opened_at + self.reset_timeout - time.time()
+                if retry_in > 0:
+                    self.stats["rejected"] += 1
+                    raise CircuitOpenError(self.name, retry_in)
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._probe_in_flight:
+                    self.stats["rejected"] += 1
+                    raise CircuitOpenError(self.name, 0)
+                self._probe_in_flight = True
+            self.stats["calls"] += 1
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+            self.state = CLOSED
+
+    def release(self):
+        """Gives back an attempt that ended without telling us anything about the upstream."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.stats["failures"] += 1
+            self._consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.stats["trips"] += 1
+                self.state = OPEN
+                self._opened_at = time.time()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            retry_in = max(0.0, self._opened_at + self.reset_timeout - time.time()) if self.state == OPEN else 0.0
+            return {
+                "state": self.state,
+                "consecutive_failures": self._consecutive_failures,
+                "retry_in": round(retry_in, 1),
+                **self.stats,
+            }
+
+
+BREAKERS = {
+    "openweathermap": CircuitBreaker("OpenWeatherMap"),
+    "newsapi": CircuitBreaker("NewsAPI"),
+    "fmp": CircuitBreaker("Financial Modeling Prep"),
+}
+
+
+def breaker_stats() -> Dict[str, Dict]:
+    """State and counters of every upstream breaker, for /stats and the benchmark."""
+    return {name: breaker.snapshot() for name, breaker in BREAKERS.items()}
+
+
+def _is_transient(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+def _backoff(attempt: int) -> float:
+    """Full jitter: a random delay up to the exponential cap for this attempt."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def http_get(upstream: str, url: str, timeout: float, params: Optional[dict] = None,
+             headers: Optional[dict] = None) -> requests.Response:
+    """
+    GET `url` through the breaker for `upstream`, retrying transient failures.
+
+    Returns:
+        requests.Response: The last response; the caller still calls raise_for_status.
+
+    Raises:
+        CircuitOpenError: If the breaker is open.
+        requests.exceptions.RequestException: If the last attempt failed at the transport level.
+    """
+    breaker = BREAKERS[upstream]
+    for attempt in range(MAX_RETRIES + 1):
+        breaker.allow()
+        try:
+            response = requests.get(url, params=params, headers=headers, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            breaker.record_failure()
+            if attempt == MAX_RETRIES:
+                raise
+        except BaseException:
+            breaker.release()
+            raise
+        else:
+            if not _is_transient(response.status_code):
+                breaker.record_success()
+                return response
+            breaker.record_failure()
+            if attempt == MAX_RETRIES:
+                return response
+        time.sleep(_backoff(attempt))
+
+
+async def ahttp_get(upstream: str, client: httpx.AsyncClient, url: str, params: Optional[dict] = None,
+                    headers: Optional[dict] = None) -> httpx.Response:
+    """Async counterpart of `http_get` using `client` and its timeout."""
+    breaker = BREAKERS[upstream]
+    for attempt in range(MAX_RETRIES + 1):
+        breaker.allow()
+        try:
+            response = await client.get(url, params=params, headers=headers)
+        except httpx.TransportError:
+            breaker.record_failure()
+            if attempt == MAX_RETRIES:
+                raise
+        except BaseException:  # Including cancellation
+            breaker.release()
+            raise
+        else:
+            if not _is_transient(response.status_code):
+                breaker.record_success()
+                return response
+            breaker.record_failure()
+            if attempt == MAX_RETRIES:
+                return response
+        await asyncio.sleep(_backoff(attempt))
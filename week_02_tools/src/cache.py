@@ -0,0 +1,202 @@
+"""
+A small two-tier TTL cache for the week_02 tools.
+
+Tier 1 is an in-memory LRU (an OrderedDict). Tier 2 is an optional sqlite file
+that survives restarts. Every entry carries its own expiry, so each tool can use
+its own freshness window: seconds for stock quotes, minutes for weather and news.
+"""
+import functools
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from pydantic import BaseModel
+
+# Freshness window per tool, in seconds
+TOOL_TTLS = {
+    "get_stock_price": float(os.getenv("STOCK_CACHE_TTL", "15")),
+    "get_stock_prices": float(os.getenv("STOCK_CACHE_TTL", "15")),
+    "get_current_weather": float(os.getenv("WEATHER_CACHE_TTL", "600")),
+    "get_top_headlines": float(os.getenv("NEWS_CACHE_TTL", "300")),
+    "weather_report": float(os.getenv("WEATHER_CACHE_TTL", "600")),
+}
+
+
+class TTLCache:
+    """
+    LRU cache with per-entry expiry and an optional sqlite tier.
+
+    Args:
+        max_entries (int): Size of the in-memory tier before LRU eviction.
+        db_path (str, optional): Path of the sqlite file. None keeps the cache in memory only.
+    """
+
+    def __init__(self, max_entries: int = 1024, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)"
+            )
+            self._db.commit()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Returns (found, value). Expired entries count as misses and are dropped."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return True, value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT expires_at, value FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if row[0] > now:
+                        value = json.loads(row[1])
+                        self._remember(key, row[0], value)
+                        self.stats["disk_hits"] += 1
+                        return True, value
+                    self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.stats["misses"] += 1
+            return False, None
+
+    def set(self, key: str, value: Any, ttl: float):
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, expires_at, value) VALUES (?, ?, ?)",
+                    (key, expires_at, json.dumps(value)),
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Hit/miss counters plus the current in-memory size, for monitoring."""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            hit_rate = (self.stats["hits"] + self.stats["disk_hits"]) / lookups if lookups else 0.0
+            return {**self.stats, "size": len(self._memory), "hit_rate": round(hit_rate, 3)}
+
+    def _remember(self, key: str, expires_at: float, value: Any):
+        # Caller holds the lock
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+
+def make_key(name: str, arguments: Dict[str, Any]) -> str:
+    """Cache key for a tool call. Strings are case/whitespace-normalised, so 'Berlin ' == 'berlin'."""
+    def normalise(value):
+        return value.strip().lower() if isinstance(value, str) else value
+
+    payload = {k: normalise(v) for k, v in arguments.items()}
+    return f"{name}:{json.dumps(payload, sort_keys=True, default=str)}"
+
+
+def _encode(value: Any) -> Any:
+    """Pydantic models are stored as plain dicts so the sqlite tier can hold them."""
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    return value
+
+
+def cached(
+    name: str,
+    ttl: Optional[float] = None,
+    skip: Optional[Callable[[Any], bool]] = None,
+    model: Optional[type] = None,
+):
+    """
+    Decorator that puts the shared tool cache in front of a sync or async function.
+
+    Sync and async variants decorated with the same `name` share their entries.
+
+    Args:
+        name (str): Cache namespace, normally the tool name. Also selects the TTL from TOOL_TTLS.
+        ttl (float, optional): Freshness window in seconds; overrides TOOL_TTLS.
+        skip (Callable, optional): Predicate; results for which it returns True are not cached (e.g. errors).
+        model (type, optional): Pydantic model the function returns (alone or in a list); cached
+            dicts are turned back into it on a hit.
+    """
+    freshness = ttl if ttl is not None else TOOL_TTLS.get(name, 60.0)
+
+    def decode(value):
+        if model is None:
+            return value
+        if isinstance(value, list):
+            return [model(**item) for item in value]
+        return model(**value)
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def key_for(args, kwargs):
+            # Bind first so f("AAPL") and f(ticker="AAPL") share an entry
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return make_key(name, bound.arguments)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = key_for(args, kwargs)
+                found, value = tool_cache.get(key)
+                if found:
+                    return decode(value)
+                value = await func(*args, **kwargs)
+                if not (skip and skip(value)):
+                    tool_cache.set(key, _encode(value), freshness)
+                return value
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = key_for(args, kwargs)
+            found, value = tool_cache.get(key)
+            if found:
+                return decode(value)
+            value = func(*args, **kwargs)
+            if not (skip and skip(value)):
+                tool_cache.set(key, _encode(value), freshness)
+            return value
+        return wrapper
+
+    return decorator
+
+
+# The cache shared by all tools. Set TOOLS_CACHE_PATH to enable the sqlite tier.
+tool_cache = TTLCache(
+    max_entries=int(os.getenv("TOOLS_CACHE_SIZE", "1024")),
+    db_path=os.getenv("TOOLS_CACHE_PATH"),
+)
@@ -0,0 +1,94 @@
+"""
+Request coalescing ("single flight") for the week_02 tools.
+
+When several callers ask for the same key at the same time, only the first one
+goes upstream; the others wait for its result. Keys are coalesced one by one, so
+a lookup for AAPL,NVDA that overlaps an in-flight AAPL,MSFT only fetches NVDA.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, List
+
+
+class SingleFlight:
+    """Thread-based coalescing for the blocking tools."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    def run(self, keys: Iterable[str], fetch_many: Callable[[List[str]], Dict[str, object]]) -> Dict[str, object]:
+        """
+        Returns a value for every key, calling `fetch_many` only for keys nobody is fetching yet.
+
+        Args:
+            keys (Iterable[str]): The keys to look up.
+            fetch_many (Callable): Fetches a list of keys in one upstream call and returns {key: value}.
+                It must return a value for every key it is given.
+        """
+        owned: Dict[str, Future] = {}
+        waiting: Dict[str, Future] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._inflight:
+                    waiting[key] = self._inflight[key]
+                else:
+                    owned[key] = self._inflight[key] = Future()
+
+        if owned:
+            try:
+                results = fetch_many(list(owned))
+                for key, future in owned.items():
+                    future.set_result(results[key])
+            except BaseException as exc:
+                for future in owned.values():
+                    if not future.done():
+                        future.set_exception(exc)
+                raise
+            finally:
+                with self._lock:
+                    for key in owned:
+                        self._inflight.pop(key, None)
+
+        merged = {key: future.result() for key, future in owned.items()}
+        merged.update({key: future.result() for key, future in waiting.items()})
+        return merged
+
+
+class AsyncSingleFlight:
+    """asyncio-based coalescing for the async tools. Use from a single event loop."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def run(self, keys: Iterable[str], fetch_many) -> Dict[str, object]:
+        """Async counterpart of SingleFlight.run; `fetch_many` is a coroutine function."""
+        loop = asyncio.get_running_loop()
+        owned: Dict[str, asyncio.Future] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        for key in keys:
+            if key in self._inflight:
+                waiting[key] = self._inflight[key]
+            else:
+                owned[key] = self._inflight[key] = loop.create_future()
+
+        if owned:
+            try:
+                results = await fetch_many(list(owned))
+                for key, future in owned.items():
+                    future.set_result(results[key])
+            except BaseException as exc:
+                for future in owned.values():
+                    if not future.done():
+                        future.set_exception(exc)
+                raise
+            finally:
+                for key in owned:
+                    self._inflight.pop(key, None)
+
+        merged = {key: future.result() for key, future in owned.items()}
+        for key, future in waiting.items():
+            # shield() so one cancelled waiter does not cancel the shared fetch
+            merged[key] = await asyncio.shield(future)
+        return merged
@@ -0,0 +1,206 @@
+"""
+Per-country headline store for NewsAPI top headlines.
+
+The store keeps the last top-headlines result for every country with its fetch
+time. It refreshes at most once per `min_refresh_interval` and sends the
+previous ETag/Last-Modified so the upstream can answer 304 Not Modified. Articles
+are deduplicated by URL and numbered in the order they were first seen. A poller
+can pass back the `marker` from its previous call as `since` and get only the
+articles that are new since then. When a refresh returns the same URLs as
+before, the stored list is reused as-is instead of being rebuilt.
+"""
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from breaker import ahttp_get, http_get
+
+
+@dataclass
+class HeadlineSnapshot:
+    """What a caller gets back from the store."""
+    country: str
+    articles: List[Dict[str, str]]
+    marker: int          # Pass back as `since` to get only newer articles
+    fetched_at: float    # Unix time of the last successful upstream check
+    changed: bool        # Whether the last refresh brought in new articles
+
+
+@dataclass
+class _CountryEntry:
+    by_url: Dict[str, dict] = field(default_factory=dict)   # url -> {"title", "url", "seq"}
+    top_urls: List[str] = field(default_factory=list)
+    top: List[Dict[str, str]] = field(default_factory=list)
+    last_seq: int = 0
+    fetched_at: float = 0.0
+    changed: bool = False
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class HeadlineStore:
+    """
+    Args:
+        url (str): The top-headlines endpoint.
+        params_for (Callable): Builds the query parameters for a country code.
+        timeout (float | tuple): Request timeout in seconds, or a (connect, read) tuple.
+        min_refresh_interval (float): Seconds a result stays fresh before the upstream is asked again.
+        max_articles (int): Articles remembered per country for `since` queries; the oldest go first.
+        upstream (str): Name of the circuit breaker in breaker.py that guards the requests.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        params_for: Callable[[str], dict],
+        timeout: float = 10.0,
+        min_refresh_interval: float = 300.0,
+        max_articles: int = 200,
+        upstream: str = "newsapi",
+    ):
+        self.url = url
+        self.params_for = params_for
+        self.timeout = timeout
+        self.min_refresh_interval = min_refresh_interval
+        self.max_articles = max_articles
+        self.upstream = upstream
+        self.stats = {"fetches": 0, "not_modified": 0, "unchanged": 0, "throttled": 0}
+        self._entries: Dict[str, _CountryEntry] = {}
+        self._lock = threading.Lock()
+        self._country_locks: Dict[str, threading.Lock] = {}
+        self._async_locks: Dict[str, asyncio.Lock] = {}
+
+    def get(self, country: str, since: Optional[int] = None) -> HeadlineSnapshot:
+        """
+        Returns the headlines for `country`, refreshing them first if they are stale.
+
+        Raises:
+            breaker.CircuitOpenError: If NewsAPI's circuit breaker is open.
+            requests.exceptions.HTTPError: If the upstream refresh fails.
+        """
+        country = country.lower()
+        with self._country_lock(country):
+            entry = self._entry(country)
+            if self._is_stale(entry):
+                response = http_get(
+                    self.upstream,
+                    self.url,
+                    self.timeout,
+                    params=self.params_for(country),
+                    headers=self._conditional_headers(entry),
+                )
+                if response.status_code != 304:
+                    response.raise_for_status()
+                payload = response.json() if response.status_code != 304 else None
+                self._apply(entry, response.status_code, response.headers, payload)
+            return self._snapshot(country, entry, since)
+
+    async def aget(self, country: str, client, since: Optional[int] = None) -> HeadlineSnapshot:
+        """
+        Async counterpart of `get`, using the given httpx.AsyncClient.
+
+        Raises:
+            breaker.CircuitOpenError: If NewsAPI's circuit breaker is open.
+            httpx.HTTPStatusError: If the upstream refresh fails.
+        """
+        country = country.lower()
+        lock = self._async_locks.setdefault(country, asyncio.Lock())
+        async with lock:
+            entry = self._entry(country)
+            if self._is_stale(entry):
+                response = await ahttp_get(
+                    self.upstream,
+                    client,
+                    self.url,
+                    params=self.params_for(country),
+                    headers=self._conditional_headers(entry),
+                )
+                if response.status_code != 304:
+                    response.raise_for_status()
+                payload = response.json() if response.status_code != 304 else None
+                with self._country_lock(country):
+                    self._apply(entry, response.status_code, response.headers, payload)
+            return self._snapshot(country, entry, since)
+
+    def peek(self, country: str, since: Optional[int] = None) -> HeadlineSnapshot:
+        """The stored headlines, without contacting the upstream."""
+        country = country.lower()
+        return self._snapshot(country, self._entry(country), since)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # --- internals ---
+    def _entry(self, country: str) -> _CountryEntry:
+        with self._lock:
+            return self._entries.setdefault(country, _CountryEntry())
+
+    def _country_lock(self, country: str) -> threading.Lock:
+        with self._lock:
+            return self._country_locks.setdefault(country, threading.Lock())
+
+    def _is_stale(self, entry: _CountryEntry) -> bool:
+        if entry.fetched_at and time.time() - entry.fetched_at < self.min_refresh_interval:
+            self.stats["throttled"] += 1
+            return False
+        return True
+
+    @staticmethod
+    def _conditional_headers(entry: _CountryEntry) -> Dict[str, str]:
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def _apply(self, entry: _CountryEntry, status: int, headers, payload: Optional[dict]):
+        self.stats["fetches"] += 1
+        entry.fetched_at = time.time()
+        entry.changed = False
+        if status == 304:
+            self.stats["not_modified"] += 1
+            return
+        entry.etag = headers.get("ETag") or entry.etag
+        entry.last_modified = headers.get("Last-Modified") or entry.last_modified
+
+        articles = [
+            a for a in (payload or {}).get("articles", [])
+            if a.get("title") and a.get("url")
+        ]
+        urls = list(dict.fromkeys(a["url"] for a in articles))
+        if urls == entry.top_urls:
+            self.stats["unchanged"] += 1
+            return
+
+        for article in articles:
+            if article["url"] not in entry.by_url:
+                entry.last_seq += 1
+                entry.by_url[article["url"]] = {"title": article["title"], "url": article["url"], "seq": entry.last_seq}
+                entry.changed = True
+        entry.top_urls = urls
+        entry.top = [{"title": entry.by_url[u]["title"], "url": u} for u in urls]
+
+        if len(entry.by_url) > self.max_articles:
+            # Forget the oldest articles, but never the current top headlines
+            current = set(urls)
+            older = sorted((a for a in entry.by_url.values() if a["url"] not in current), key=lambda a: a["seq"])
+            for article in older[:len(entry.by_url) - self.max_articles]:
+                del entry.by_url[article["url"]]
+
+    def _snapshot(self, country: str, entry: _CountryEntry, since: Optional[int]) -> HeadlineSnapshot:
+        if since is None:
+            articles = list(entry.top)
+        else:
+            newer = sorted((a for a in entry.by_url.values() if a["seq"] > since), key=lambda a: a["seq"])
+            articles = [{"title": a["title"], "url": a["url"]} for a in newer]
+        return HeadlineSnapshot(
+            country=country,
+            articles=articles,
+            marker=entry.last_seq,
+            fetched_at=entry.fetched_at,
+            changed=entry.changed,
+        )
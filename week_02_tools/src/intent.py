@@ -0,0 +1,241 @@
+"""
+Local intent fast path for simple single-tool questions.
+
+Questions like "weather in Berlin" or "price of NVDA" do not need the LLM: a
+pattern pulls out the intent and its argument (city, tickers or country), and,
+when the optional sentence-transformers model is installed, the question is
+also checked against a few example questions per intent. If both agree, the
+tool is called directly and the answer is rendered from a template. Anything
+else, including compound questions and tool errors, returns None so the caller
+falls back to the AgentExecutor.
+"""
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from async_tools import aget_current_weather, aget_stock_price, aget_stock_prices, aget_top_headlines
+from tools import get_current_weather, get_stock_price, get_stock_prices, get_top_headlines, is_error_result
+
+try:
+    from langchain_huggingface import HuggingFaceEmbeddings
+except ImportError:  # The fast path still works on patterns alone
+    HuggingFaceEmbeddings = None
+
+EMBEDDING_MODEL = os.getenv("INTENT_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# Minimum cosine similarity between the question and an example of its intent
+MIN_SIMILARITY = float(os.getenv("INTENT_MIN_SIMILARITY", "0.5"))
+
+_PLACE = r"(?P<place>[a-zA-Z][a-zA-Z .'-]{1,40}?)"
+_TICKERS = r"\$?(?P<tickers>[A-Za-z.]{1,6}(?:(?:\s*,\s*|\s+and\s+|\s*&\s*|\s+)\$?[A-Za-z.]{1,6}){0,9}?)"
+
+PATTERNS = {
+    "weather": [
+        rf"(?:what(?:'s| is) the )?(?:current )?(?:weather|temperature|forecast)(?: like)? (?:in|for|at) {_PLACE}",
+        rf"how(?:'s| is) the weather (?:in|at) {_PLACE}",
+        rf"(?:is it|how) (?:raining|sunny|cold|hot|warm) (?:is it )?in {_PLACE}",
+        rf"{_PLACE} weather",
+    ],
+    "stock": [
+        rf"(?:what(?:'s| is) the )?(?:current )?(?:stock |share )?(?:price|quote|prices|quotes)(?: of| for)? {_TICKERS}(?: stocks?| shares?)?",
+        rf"(?:how much is|how is) {_TICKERS}(?: stock| trading)?(?: doing| worth)?(?: today)?",
+        rf"{_TICKERS} (?:stock )?(?:price|quote)",
+    ],
+    "news": [
+        rf"(?:what(?:'s| is| are) the )?(?:top |latest |today's )?(?:news|headlines)(?: headlines)? (?:in|for|from) {_PLACE}",
+        rf"{_PLACE} (?:news|headlines)",
+    ],
+}
+
+EXAMPLES = {
+    "weather": [
+        "what's the weather in Berlin",
+        "how cold is it in Oslo right now",
+        "current temperature in Tokyo",
+        "is it raining in London",
+    ],
+    "stock": [
+        "what is the price of AAPL",
+        "NVDA stock price",
+        "quote for MSFT and GOOG",
+        "how much is TSLA trading at",
+    ],
+    "news": [
+        "top headlines in the US",
+        "latest news from Germany",
+        "what are the news in France today",
+    ],
+}
+
+COUNTRY_CODES = {
+    "united states": "us", "usa": "us", "us": "us", "america": "us", "the us": "us",
+    "united kingdom": "gb", "uk": "gb", "the uk": "gb", "britain": "gb", "great britain": "gb", "england": "gb",
+    "germany": "de", "france": "fr", "italy": "it", "spain": "es", "netherlands": "nl",
+    "india": "in", "japan": "jp", "china": "cn", "canada": "ca", "australia": "au",
+    "brazil": "br", "mexico": "mx", "switzerland": "ch", "sweden": "se", "norway": "no",
+}
+
+# Words that mean the "place" the pattern caught is really part of a longer question
+_NOT_PLACES = {"what", "how", "is", "and", "or", "weather", "news", "headlines", "price", "stock", "today", "tomorrow"}
+
+# Words the ticker pattern can catch that are never tickers
+_NOT_TICKERS = {"OF", "FOR", "AND", "THE", "STOCK", "PRICE", "SHARE", "SHARES", "QUOTE", "TODAY", "IS", "A"}
+
+
+@dataclass
+class Intent:
+    name: str
+    slots: Dict[str, object] = field(default_factory=dict)
+    confidence: float = 0.0
+
+
+def _normalise(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().rstrip("?!.").strip()
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class IntentClassifier:
+    """
+    Pattern + embedding classifier for the weather, stock and news intents.
+
+    Args:
+        embeddings: An object with embed_query/embed_documents (e.g. HuggingFaceEmbeddings).
+            None means patterns only.
+        min_similarity (float): Embedding agreement needed to call a match confident.
+    """
+
+    def __init__(self, embeddings=None, min_similarity: float = MIN_SIMILARITY):
+        self.embeddings = embeddings
+        self.min_similarity = min_similarity
+        self._compiled = {
+            name: [re.compile(rf"^{pattern}$", re.IGNORECASE) for pattern in patterns]
+            for name, patterns in PATTERNS.items()
+        }
+        self._example_vectors = {}
+        if embeddings is not None:
+            for name, examples in EXAMPLES.items():
+                self._example_vectors[name] = embeddings.embed_documents(examples)
+
+    def classify(self, text: str) -> Optional[Intent]:
+        """Returns a confident Intent, or None when the question should go to the agent."""
+        question = _normalise(text)
+        intent = self._match_pattern(question)
+        if intent is None:
+            return None
+        if not self._example_vectors:
+            return intent
+
+        vector = self.embeddings.embed_query(question)
+        scores = {
+            name: max(_cosine(vector, example) for example in examples)
+            for name, examples in self._example_vectors.items()
+        }
+        best = max(scores, key=scores.get)
+        if best != intent.name or scores[best] < self.min_similarity:
+            return None
+        intent.confidence = scores[best]
+        return intent
+
+    def _match_pattern(self, question: str) -> Optional[Intent]:
+        for name, patterns in self._compiled.items():
+            for pattern in patterns:
+                match = pattern.match(question)
+                if not match:
+                    continue
+                slots = self._slots(name, match)
+                if slots:
+                    return Intent(name=name, slots=slots, confidence=0.9)
+        return None
+
+    @staticmethod
+    def _slots(name: str, match: re.Match) -> Optional[Dict[str, object]]:
+        if name in ("weather", "news"):
+            place = match.group("place").strip()
+            if _NOT_PLACES & set(place.lower().split()):
+                return None
+            if name == "weather":
+                return {"location": place}
+            place = re.sub(r"^the ", "", place.lower())
+            code = COUNTRY_CODES.get(place) or (place if len(place) == 2 else None)
+            return {"country": code} if code else None
+        # Tickers must be written in upper case, so "price of apple" goes to the agent
+        tickers = [t.lstrip("$") for t in re.split(r"\s*,\s*|\s+and\s+|\s*&\s*|\s+", match.group("tickers"))]
+        if not tickers or any(not t.isupper() or t in _NOT_TICKERS for t in tickers):
+            return None
+        return {"tickers": tickers}
+
+
+def render(intent: Intent, result) -> Optional[str]:
+    """Templated answer for a tool result, or None if the result is an error."""
+    if is_error_result(result):
+        return None
+    if intent.name == "news":
+        lines = [f"Top headlines ({intent.slots['country'].upper()}):"]
+        lines += [f"  - {article['title']} ({article['url']})" for article in result]
+        return "\n".join(lines)
+    if isinstance(result, list):  # several stock quotes
+        return "\n".join(f"{q.ticker}: ${q.price} (volume {q.volume})" for q in result)
+    return result
+
+
+class FastPath:
+    """Answers confident single-tool questions locally; returns None otherwise."""
+
+    def __init__(self, classifier: Optional[IntentClassifier] = None):
+        self.classifier = classifier or IntentClassifier(embeddings=_load_embeddings())
+        self.stats = {"local": 0, "fallback": 0}
+
+    def answer(self, text: str) -> Optional[str]:
+        intent = self.classifier.classify(text)
+        if intent is None:
+            return self._fallback()
+        if intent.name == "weather":
+            result = get_current_weather.func(intent.slots["location"])
+        elif intent.name == "news":
+            result = get_top_headlines.func(intent.slots["country"])
+        elif len(intent.slots["tickers"]) == 1:
+            result = get_stock_price.func(intent.slots["tickers"][0])
+        else:
+            result = get_stock_prices.func(intent.slots["tickers"])
+        return self._done(intent, result)
+
+    async def aanswer(self, text: str) -> Optional[str]:
+        intent = self.classifier.classify(text)
+        if intent is None:
+            return self._fallback()
+        if intent.name == "weather":
+            result = await aget_current_weather(intent.slots["location"])
+        elif intent.name == "news":
+            result = await aget_top_headlines(intent.slots["country"])
+        elif len(intent.slots["tickers"]) == 1:
+            result = await aget_stock_price(intent.slots["tickers"][0])
+        else:
+            result = await aget_stock_prices(intent.slots["tickers"])
+        return self._done(intent, result)
+
+    def _done(self, intent: Intent, result) -> Optional[str]:
+        answer = render(intent, result)
+        if answer is None:
+            return self._fallback()
+        self.stats["local"] += 1
+        return answer
+
+    def _fallback(self) -> None:
+        self.stats["fallback"] += 1
+        return None
+
+
+def _load_embeddings():
+    if HuggingFaceEmbeddings is None or os.getenv("INTENT_USE_EMBEDDINGS", "1") == "0":
+        return None
+    try:
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    except Exception as e:
+        print(f"Intent embeddings unavailable, using patterns only: {e}")
+        return None
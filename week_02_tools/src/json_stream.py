@@ -0,0 +1,129 @@
+"""
+Incremental JSON parser for streamed LLM output.
+
+The agent's city report arrives token by token. Instead of waiting for the whole
+string, `IncrementalJSONParser.feed` reports each top-level member of the object
+as soon as its value is complete, and each element of a top-level array as soon
+as that element is complete. The weather block can then be shown while the news
+array is still being generated.
+"""
+import json
+from typing import Any, List, Tuple
+
+
+class IncrementalJSONParser:
+    """
+    Feed it chunks of one JSON object; it returns completed pieces as events.
+
+    Events are (key, value) tuples:
+      - ("weather", {...}) when the top-level member "weather" is complete
+      - ("news[]", {...}) for every completed element of the top-level array "news"
+    Text before the opening brace (e.g. a ```json fence) is ignored.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0           # Index of the next unread character in _text
+        self._started = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key = None        # Current top-level key
+        self._expect_key = True
+        self._value_start = None
+        self._item_start = None
+        self._string_start = None
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        events = []
+        self._text += chunk
+        text = self._text
+
+        while self._pos < len(text) and not self._done:
+            char = text[self._pos]
+            index = self._pos
+            self._pos += 1
+
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect_key:
+                        self._key = json.loads(text[self._string_start:index + 1])
+                        self._expect_key = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+                if self._depth == 1 and not self._expect_key and self._value_start is None:
+                    self._value_start = index
+                if self._depth == 2 and self._top_level_array(text) and self._item_start is None:
+                    self._item_start = index
+                continue
+
+            if char in " \t\r\n":
+                continue
+
+            if self._depth == 1:
+                if char == ":":
+                    continue
+                if char in ",}":
+                    if self._value_start is not None:
+                        # A primitive value (string, number, literal) ended
+                        events.append((self._key, self._decode(text[self._value_start:index])))
+                        self._value_start = None
+                    self._expect_key = True
+                    if char == "}":
+                        self._done = True
+                    continue
+                if self._value_start is None:
+                    self._value_start = index
+
+            if char in "{[":
+                self._depth += 1
+                if self._depth == 3 and self._item_start is None and self._top_level_array(text):
+                    self._item_start = index
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 2 and self._item_start is not None:
+                    events.append((f"{self._key}[]", self._decode(text[self._item_start:index + 1])))
+                    self._item_start = None
+                elif self._depth == 1 and self._value_start is not None:
+                    if self._item_start is not None:
+                        # Last primitive element of a top-level array
+                        events.append((f"{self._key}[]", self._decode(text[self._item_start:index].rstrip())))
+                        self._item_start = None
+                    events.append((self._key, self._decode(text[self._value_start:index + 1])))
+                    self._value_start = None
+            elif char == "," and self._depth == 2 and self._item_start is not None:
+                events.append((f"{self._key}[]", self._decode(text[self._item_start:index].rstrip())))
+                self._item_start = None
+            elif char != "," and self._depth == 2 and self._item_start is None and self._top_level_array(text):
+                self._item_start = index
+
+        return events
+
+    def _top_level_array(self, text: str) -> bool:
+        return self._value_start is not None and text[self._value_start] == "["
+
+    @staticmethod
+    def _decode(raw: str) -> Any:
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            return raw.strip()
@@ -0,0 +1,445 @@
+"""
+Offline record/replay harness for the week_02 tools.
+
+`record` calls the real OpenWeatherMap, NewsAPI and FMP endpoints once and saves
+each response to a fixture file. `StubServer` serves those fixtures on localhost
+with configurable latency and error rate, next to a fake OpenAI-compatible
+chat-completions endpoint, so tools.py and setup_agent can run without API keys
+or network.
+
+Point the tools at a running stub with the *_BASE_URL variables from
+`StubServer.env()` before importing tools.py.
+
+Usage:
+    python replay.py record --cities Berlin,London --countries us,de --tickers AAPL,MSFT
+    python replay.py serve --port 8765 --latency-ms 80 --error-rate 0.05
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "default.json")
+
+# Stub path prefix -> real base URL
+UPSTREAMS = {
+    "weather": "http://api.openweathermap.org",
+    "news": "https://newsapi.org",
+    "fmp": "https://financialmodelingprep.com",
+}
+# Query parameters that carry credentials and never become part of a fixture key
+_SECRET_PARAMS = {"appid", "apikey", "apiKey"}
+
+CITY_COUNTRIES = {"berlin": "de", "london": "gb", "paris": "fr", "new york": "us", "tokyo": "jp"}
+
+
+def fixture_key(upstream: str, path: str, params: Dict[str, str]) -> str:
+    """Stable key for one upstream request, without credentials and case-insensitive."""
+    query = "&".join(
+        f"{k}={str(v).lower()}" for k, v in sorted(params.items()) if k not in _SECRET_PARAMS
+    )
+    return f"{upstream}:{path.lower()}?{query}"
+
+
+def load_fixtures(path: str = FIXTURES_PATH) -> Dict[str, dict]:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def record(cities: List[str], countries: List[str], tickers: List[str], path: str = FIXTURES_PATH) -> int:
+    """
+    Calls the live APIs and adds their responses to the fixture file.
+
+    Needs OPEN_WEATHER_API_KEY, NEWS_API_KEY and FMP_API_KEY (tools.py loads them).
+
+    Returns:
+        int: The number of fixtures written.
+    """
+    from tools import FMP_API_KEY, NEWS_API_KEY, OPENWEATHERMAP_API_KEY, REQUEST_TIMEOUT, headlines_params, weather_params
+
+    calls = []
+    for city in cities:
+        calls.append(("weather", "/data/2.5/weather", weather_params(city) | {"appid": OPENWEATHERMAP_API_KEY}))
+    for country in countries:
+        calls.append(("news", "/v2/top-headlines", headlines_params(country) | {"apiKey": NEWS_API_KEY}))
+    for ticker in tickers:
+        for endpoint in ("quote-short", "quote"):
+            calls.append(("fmp", f"/api/v3/{endpoint}/{ticker.upper()}", {"apikey": FMP_API_KEY}))
+
+    fixtures = load_fixtures(path) if os.path.exists(path) else {}
+    for upstream, url_path, params in calls:
+        response = requests.get(UPSTREAMS[upstream] + url_path, params=params, timeout=REQUEST_TIMEOUT)
+        fixtures[fixture_key(upstream, url_path, params)] = {
+            "status": response.status_code,
+            "body": response.json(),
+        }
+        print(f"Recorded {upstream}{url_path} -> {response.status_code}")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(fixtures, f, indent=2, sort_keys=True)
+    return len(calls)
+
+
+# --- Fake OpenAI-compatible LLM ---
+def _plan_tool_calls(question: str, tool_names: List[str]) -> List[dict]:
+    """Chooses tool calls for a question the way a cooperative model would."""
+    text = question.lower()
+    calls = []
+    city_match = re.search(r"\b(?:in|for|about|of)\s+([A-Z][a-zA-Z]+(?: [A-Z][a-zA-Z]+)?)", question)
+    city = city_match.group(1) if city_match else "Berlin"
+    country = CITY_COUNTRIES.get(city.lower(), "us")
+    tickers = [t for t in re.findall(r"\b[A-Z]{2,5}\b", question) if t not in {"US", "UK"}]
+
+    wants_report = "report" in text or ("weather" in text and "news" in text)
+    if wants_report and "get_city_report" in tool_names:
+        calls.append(("get_city_report", {"city": city, "country_code": country}))
+    else:
+        if "weather" in text or wants_report:
+            calls.append(("get_current_weather", {"location": city}))
+        if "news" in text or "headline" in text or wants_report:
+            calls.append(("get_top_headlines", {"country": country}))
+    if tickers:
+        if len(tickers) > 1 and "get_stock_prices" in tool_names:
+            calls.append(("get_stock_prices", {"tickers": tickers}))
+        else:
+            calls.extend(("get_stock_price", {"ticker": t}) for t in tickers)
+    return [
+        {
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": name, "arguments": json.dumps(args)},
+        }
+        for name, args in calls
+        if name in tool_names
+    ]
+
+
+def _report_from_observations(messages: List[dict]) -> dict:
+    """Builds the JSON city report a model would write from the tool results in `messages`."""
+    report = {"weather": None, "news": [], "error_message": None}
+    for message in messages:
+        if message.get("role") != "tool":
+            continue
+        content = str(message.get("content"))
+        weather = re.match(r"The current weather in (.+?) is (-?[\d.]+)°C with (.+)\.$", content)
+        if weather:
+            report["weather"] = {
+                "location": weather.group(1),
+                "temperature": float(weather.group(2)),
+                "description": weather.group(3),
+            }
+            continue
+        try:
+            articles = json.loads(content)
+        except ValueError:
+            continue
+        if isinstance(articles, list):
+            report["news"].extend(a for a in articles if isinstance(a, dict) and "title" in a)
+    return report
+
+
+def _called_tools(messages: List[dict]) -> Dict[str, str]:
+    """Maps tool_call_id -> tool name for the tool calls in `messages`."""
+    return {
+        call["id"]: call["function"]["name"]
+        for message in messages if message.get("role") == "assistant"
+        for call in message.get("tool_calls") or []
+    }
+
+
+def _plain_answer(messages: List[dict]) -> str:
+    """A plain-text answer stitched together from the tool results in `messages`."""
+    lines = []
+    for message in messages:
+        if message.get("role") != "tool":
+            continue
+        content = str(message.get("content"))
+        try:
+            articles = json.loads(content)
+        except ValueError:
+            articles = None
+        if isinstance(articles, list):
+            titles = [a["title"] for a in articles if isinstance(a, dict) and "title" in a]
+            lines.append("Top headlines: " + "; ".join(titles) if titles else content)
+        else:
+            lines.append(content)
+    return "\n".join(lines) or "I could not find that information."
+
+
+def fake_completion(request: dict) -> dict:
+    """
+    Builds a chat-completion message for `request`.
+
+    The first turn requests the tools the question needs. Once tool results are
+    in the conversation it answers as SYSTEM_PROMPT asks: the JSON city report
+    when both the weather and the headlines (or a city report) were fetched,
+    plain text from the tool results otherwise.
+    """
+    messages = request.get("messages", [])
+    tool_names = [t["function"]["name"] for t in request.get("tools", [])]
+    question = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+
+    if tool_names and not any(m.get("role") == "tool" for m in messages):
+        tool_calls = _plan_tool_calls(question, tool_names)
+        if tool_calls:
+            return {"role": "assistant", "content": None, "tool_calls": tool_calls}
+
+    called = set(_called_tools(messages).values())
+    if "get_city_report" in called or {"get_current_weather", "get_top_headlines"} <= called:
+        return {"role": "assistant", "content": json.dumps(_report_from_observations(messages))}
+    return {"role": "assistant", "content": _plain_answer(messages)}
+
+
+def _split(text: str, pieces: int) -> List[str]:
+    """Splits `text` into about `pieces` chunks, one per simulated token."""
+    size = max(1, -(-len(text) // max(1, pieces)))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+# --- Stub server ---
+class StubServer:
+    """
+    Threaded localhost server that replays fixtures and fakes the LLM.
+
+    Args:
+        fixtures (dict): Fixture map from `load_fixtures`.
+        port (int): Port to listen on; 0 picks a free one.
+        latency_ms (float): Added delay per upstream API response.
+        jitter_ms (float): Uniform random extra delay, 0..jitter_ms.
+        error_rate (float): Fraction of upstream API responses replaced by HTTP 503.
+        llm_latency_ms (float): Fixed delay per LLM call (prompt processing).
+        llm_token_ms (float): Delay per generated token.
+        llm_final_tokens (int): Simulated length of the final answer, in tokens.
+    """
+
+    def __init__(
+        self,
+        fixtures: Optional[dict] = None,
+        port: int = 0,
+        latency_ms: float = 50.0,
+        jitter_ms: float = 10.0,
+        error_rate: float = 0.0,
+        llm_latency_ms: float = 200.0,
+        llm_token_ms: float = 2.0,
+        llm_final_tokens: int = 300,
+        seed: Optional[int] = None,
+    ):
+        self.fixtures = fixtures if fixtures is not None else load_fixtures()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.llm_latency_ms = llm_latency_ms
+        self.llm_token_ms = llm_token_ms
+        self.llm_final_tokens = llm_final_tokens
+        self.stats = {"api_calls": 0, "api_errors": 0, "llm_calls": 0, "misses": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment that points tools.py and agent.py at this server."""
+        return {
+            "OPENWEATHERMAP_BASE_URL": f"{self.base_url}/weather",
+            "NEWS_API_BASE_URL": f"{self.base_url}/news",
+            "FMP_BASE_URL": f"{self.base_url}/fmp",
+            "LLM_BASE_URL": f"{self.base_url}/llm/v1",
+            "OPEN_WEATHER_API_KEY": os.getenv("OPEN_WEATHER_API_KEY") or "replay",
+            "NEWS_API_KEY": os.getenv("NEWS_API_KEY") or "replay",
+            "FMP_API_KEY": os.getenv("FMP_API_KEY") or "replay",
+        }
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        print(f"Replay stub listening on {self.base_url}")
+        for key, value in self.env().items():
+            print(f"  export {key}={value}")
+        self._server.serve_forever()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _delay(self, base_ms: float):
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter_ms)
+        time.sleep((base_ms + jitter) / 1000)
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def _replay(self, upstream: str, path: str, params: Dict[str, str]):
+        """Returns (status, body) for an upstream request."""
+        key = fixture_key(upstream, path, params)
+        if key in self.fixtures:
+            entry = self.fixtures[key]
+            return entry["status"], entry["body"]
+
+        # FMP batch quotes are stitched together from per-symbol fixtures
+        match = re.match(r"(/api/v3/quote)/(.+)", path)
+        if upstream == "fmp" and match and "," in match.group(2):
+            body = []
+            for symbol in match.group(2).split(","):
+                entry = self.fixtures.get(fixture_key(upstream, f"{match.group(1)}/{symbol}", params))
+                if entry and entry["status"] == 200:
+                    body.extend(entry["body"])
+            return 200, body
+
+        self._count("misses")
+        return 404, {"message": f"No fixture for {key}"}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Keep-alive clients (requests.Session, pooled httpx) would otherwise wait ~40 ms
+            # per response on Nagle's algorithm and the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                upstream, _, path = parts.path.lstrip("/").partition("/")
+                if upstream not in UPSTREAMS:
+                    self._send_json(404, {"message": f"Unknown upstream '{upstream}'"})
+                    return
+                stub._count("api_calls")
+                stub._delay(stub.latency_ms)
+                if stub._should_fail():
+                    stub._count("api_errors")
+                    self._send_json(503, {"message": "Injected failure"})
+                    return
+                status, body = stub._replay(upstream, "/" + path, dict(parse_qsl(parts.query)))
+                self._send_json(status, body)
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"message": "Not found"})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                stub._count("llm_calls")
+                stub._delay(stub.llm_latency_ms)
+
+                message = fake_completion(request)
+                tokens = 20 if message.get("tool_calls") else stub.llm_final_tokens
+                if request.get("stream"):
+                    self._stream(request, message, tokens)
+                    return
+                time.sleep(tokens * stub.llm_token_ms / 1000)
+                self._send_json(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "fake"),
+                    "choices": [{
+                        "index": 0,
+                        "message": message,
+                        "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": tokens, "total_tokens": tokens},
+                })
+
+            def _stream(self, request: dict, message: dict, tokens: int):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                base = {
+                    "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": request.get("model", "fake"),
+                }
+
+                def emit(delta: dict, finish_reason=None):
+                    chunk = dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": finish_reason}])
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+
+                emit({"role": "assistant", "content": ""})
+                if message.get("tool_calls"):
+                    time.sleep(tokens * stub.llm_token_ms / 1000)
+                    emit({"tool_calls": [dict(call, index=i) for i, call in enumerate(message["tool_calls"])]})
+                    emit({}, "tool_calls")
+                else:
+                    for piece in _split(message["content"], tokens):
+                        time.sleep(stub.llm_token_ms / 1000)
+                        emit({"content": piece})
+                    emit({}, "stop")
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record or replay week_02 API fixtures.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="Call the live APIs and save fixtures.")
+    rec.add_argument("--cities", default="Berlin,London,Paris")
+    rec.add_argument("--countries", default="us,de,gb")
+    rec.add_argument("--tickers", default="AAPL,MSFT,NVDA")
+    rec.add_argument("--fixtures", default=FIXTURES_PATH)
+
+    srv = sub.add_parser("serve", help="Serve fixtures and a fake LLM on localhost.")
+    srv.add_argument("--port", type=int, default=8765)
+    srv.add_argument("--fixtures", default=FIXTURES_PATH)
+    srv.add_argument("--latency-ms", type=float, default=50.0)
+    srv.add_argument("--jitter-ms", type=float, default=10.0)
+    srv.add_argument("--error-rate", type=float, default=0.0)
+    srv.add_argument("--llm-latency-ms", type=float, default=200.0)
+    srv.add_argument("--llm-token-ms", type=float, default=2.0)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        split = lambda value: [item.strip() for item in value.split(",") if item.strip()]
+        record(split(args.cities), split(args.countries), split(args.tickers), args.fixtures)
+    else:
+        StubServer(
+            fixtures=load_fixtures(args.fixtures),
+            port=args.port,
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            error_rate=args.error_rate,
+            llm_latency_ms=args.llm_latency_ms,
+            llm_token_ms=args.llm_token_ms,
+        ).serve_forever()
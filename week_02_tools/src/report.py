@@ -0,0 +1,85 @@
+"""
+Deterministic CityReport assembly.
+
+The get_city_report tool fetches the weather and the headlines for a city at the
+same time and builds the CityReport in Python from the WeatherResponse and
+NewsArticle objects. It is a `return_direct` tool, so the AgentExecutor returns
+the CityReport as soon as the tool finishes, without a final LLM turn that
+re-types the data as JSON.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from async_tools import afetch_news_articles, afetch_weather
+from langchain_core.tools import StructuredTool
+from schemas import CityReport, NewsArticle, WeatherResponse
+from tools import fetch_news_articles, fetch_weather
+
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="city-report")
+
+
+def build_city_report(
+    city: str,
+    country_code: str,
+    weather: WeatherResponse,
+    articles: List[NewsArticle],
+) -> CityReport:
+    """
+    Builds a CityReport from already-fetched tool results.
+
+    Failed lookups are left out of the report and their messages are collected in
+    `error_message`.
+    """
+    errors = []
+    if weather.error_message:
+        errors.append(f"Weather: {weather.error_message}")
+        weather = None
+
+    news = [article for article in articles if not article.error_message]
+    errors.extend(f"News: {article.error_message}" for article in articles if article.error_message)
+
+    country = country_code.upper()
+    if weather is not None and ", " in weather.location:
+        country = weather.location.rsplit(", ", 1)[1]
+
+    return CityReport(
+        city=city,
+        country=country,
+        weather=weather,
+        news=news or None,
+        error_message="; ".join(errors) or None,
+    )
+
+
+def get_city_report(city: str, country_code: str) -> CityReport:
+    """
+    Get a full report for a city: the current weather and the top news headlines.
+    Use this whenever the user asks for a city report or for both weather and news.
+
+    Args:
+        city (str): The city name (e.g., "Berlin").
+        country_code (str): The two-letter country code of the city (e.g., "de").
+
+    Returns:
+        CityReport: The assembled report.
+    """
+    weather = _pool.submit(fetch_weather, city)
+    articles = _pool.submit(fetch_news_articles, country_code)
+    return build_city_report(city, country_code, weather.result(), articles.result())
+
+
+async def aget_city_report(city: str, country_code: str) -> CityReport:
+    """Async counterpart of get_city_report."""
+    weather, articles = await asyncio.gather(
+        afetch_weather(city),
+        afetch_news_articles(country_code),
+    )
+    return build_city_report(city, country_code, weather, articles)
+
+
+city_report_tool = StructuredTool.from_function(
+    func=get_city_report,
+    coroutine=aget_city_report,
+    return_direct=True,
+)
@@ -1,7 +1,13 @@
 import os
 import requests
+from breaker import CircuitOpenError, http_get
+from cache import TOOL_TTLS, cached, make_key, tool_cache
+from coalesce import SingleFlight
 from dotenv import load_dotenv
+from headlines import HeadlineStore
 from langchain.tools import tool
+from pydantic import BaseModel
+from schemas import NewsArticle, StockPriceResponse, WeatherResponse
 from typing import List, Dict
 
 
@@ -13,7 +19,157 @@ OPENWEATHERMAP_API_KEY = os.getenv("OPEN_WEATHER_API_KEY")
 NEWS_API_KEY = os.getenv("NEWS_API_KEY")
 FMP_API_KEY = os.getenv("FMP_API_KEY")
 
+# Upstream endpoints, shared by the sync tools here and the async ones in async_tools.py.
+# The base URLs can be pointed at the replay stub server in replay.py.
+OPENWEATHERMAP_BASE_URL = os.getenv("OPENWEATHERMAP_BASE_URL", "http://api.openweathermap.org")
+NEWS_API_BASE_URL = os.getenv("NEWS_API_BASE_URL", "https://newsapi.org")
+FMP_BASE_URL = os.getenv("FMP_BASE_URL", "https://financialmodelingprep.com")
+
+WEATHER_URL = f"{OPENWEATHERMAP_BASE_URL}/data/2.5/weather"
+NEWS_URL = f"{NEWS_API_BASE_URL}/v2/top-headlines"
+STOCK_URL = FMP_BASE_URL + "/api/v3/quote-short/{ticker}"
+# FMP's full quote endpoint accepts a comma-separated list of symbols
+BATCH_STOCK_URL = FMP_BASE_URL + "/api/v3/quote/{tickers}"
+
+# Seconds to wait for an upstream API before giving up
+REQUEST_TIMEOUT = float(os.getenv("TOOLS_REQUEST_TIMEOUT", "10"))
+# A dead host should fail fast, well before the read timeout
+CONNECT_TIMEOUT = float(os.getenv("TOOLS_CONNECT_TIMEOUT", "3"))
+HTTP_TIMEOUT = (CONNECT_TIMEOUT, REQUEST_TIMEOUT)
+
+
+# --- Response formatting, shared by the sync and async tools ---
+def format_stock_price(ticker: str, data: list) -> str:
+    """Turn an FMP quote-short payload into the tool's answer string."""
+    if not data:
+        return f"Error: No data found for ticker '{ticker}'."
+    price = data[0].get("price")
+    volume = data[0].get("volume")
+    return f"The current stock price of {ticker.upper()} is ${price} with a volume of {volume}."
+
+
+def parse_weather(data: dict) -> WeatherResponse:
+    """Turn an OpenWeatherMap payload into a WeatherResponse."""
+    return WeatherResponse(
+        location=f"{data['name']}, {data['sys']['country']}",
+        temperature=float(data['main']['temp']),
+        description=data['weather'][0]['description'],
+    )
+
+
+def format_weather(data: dict) -> str:
+    """Turn an OpenWeatherMap payload into the tool's answer string."""
+    weather = parse_weather(data)
+    return f"The current weather in {weather.location} is {weather.temperature}°C with {weather.description}."
+
+
+def weather_error(location: str, message: str) -> WeatherResponse:
+    return WeatherResponse(location=location, temperature=0.0, description="", error_message=message)
+
+
+def parse_articles(country: str, data: dict) -> List[NewsArticle]:
+    """Turn a NewsAPI top-headlines payload into NewsArticle objects."""
+    articles = [
+        NewsArticle(title=article["title"], url=article["url"])
+        for article in data.get("articles", [])
+        if article.get("title") and article.get("url")
+    ]
+    return articles or [news_error(f"No news articles found for country code '{country}'.")]
+
+
+def news_error(message: str) -> NewsArticle:
+    return NewsArticle(title="", url="", error_message=message)
+
+
+def normalise_tickers(tickers: List[str]) -> List[str]:
+    """Upper-cases and de-duplicates tickers, keeping the caller's order."""
+    return list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+
+
+def parse_quotes(symbols: List[str], data: list) -> Dict[str, StockPriceResponse]:
+    """Turn an FMP batch quote payload into one StockPriceResponse per requested symbol."""
+    quotes = {}
+    for item in data or []:
+        symbol = str(item.get("symbol", "")).upper()
+        if symbol in symbols and item.get("price") is not None:
+            quotes[symbol] = StockPriceResponse(
+                ticker=symbol,
+                price=float(item["price"]),
+                volume=int(item.get("volume") or 0),
+            )
+    for symbol in symbols:
+        if symbol not in quotes:
+            quotes[symbol] = quote_error(symbol, f"No data found for ticker '{symbol}'.")
+    return quotes
+
+
+def quote_error(symbol: str, message: str) -> StockPriceResponse:
+    return StockPriceResponse(ticker=symbol, price=0.0, volume=0, error_message=message)
+
+
+def cached_quotes(symbols: List[str]):
+    """Splits symbols into ({symbol: cached quote}, [symbols still to fetch])."""
+    hits, missing = {}, []
+    for symbol in symbols:
+        found, value = tool_cache.get(make_key("get_stock_prices", {"ticker": symbol}))
+        if found:
+            hits[symbol] = StockPriceResponse(**value)
+        else:
+            missing.append(symbol)
+    return hits, missing
+
+
+def remember_quotes(quotes: Dict[str, StockPriceResponse]):
+    for symbol, quote in quotes.items():
+        if not quote.error_message:
+            tool_cache.set(
+                make_key("get_stock_prices", {"ticker": symbol}),
+                quote.model_dump(),
+                TOOL_TTLS["get_stock_prices"],
+            )
+
+
+def is_error_result(result) -> bool:
+    """True for the error strings/entries/models the tools return, which must not be cached."""
+    if isinstance(result, str):
+        return result.startswith(("Error", "An unexpected error"))
+    if isinstance(result, BaseModel):
+        return bool(getattr(result, "error_message", None))
+    if isinstance(result, list):
+        return any(
+            is_error_result(item) if isinstance(item, BaseModel) else not isinstance(item, dict) or "error" in item
+            for item in result
+        )
+    return False
+
+
+def weather_params(location: str) -> Dict:
+    return {
+        "q": location,
+        "appid": OPENWEATHERMAP_API_KEY,
+        "units": "metric"  # Use metric units (Celsius)
+    }
+
+
+def headlines_params(country: str) -> Dict:
+    return {
+        "country": country,
+        "apiKey": NEWS_API_KEY,
+        "pageSize": 5
+    }
+
+
+# Last top headlines per country, shared by the sync and async headline tools
+headline_store = HeadlineStore(
+    NEWS_URL,
+    headlines_params,
+    timeout=HTTP_TIMEOUT,
+    min_refresh_interval=TOOL_TTLS["get_top_headlines"],
+)
+
+
 @tool
+@cached("get_stock_price", skip=is_error_result)
 def get_stock_price(ticker: str) -> str:
     """
     Get the current stock price for a given ticker symbol.
@@ -27,26 +183,69 @@ def get_stock_price(ticker: str) -> str:
     if not FMP_API_KEY:
         return "Error: Financial Modeling Prep API key is not set."
 
-    url = f"https://financialmodelingprep.com/api/v3/quote-short/{ticker.upper()}"
+    url = STOCK_URL.format(ticker=ticker.upper())
     params = {
         "apikey": FMP_API_KEY
     }
 
     try:
-        response = requests.get(url, params=params)
+        response = http_get("fmp", url, HTTP_TIMEOUT, params=params)
         response.raise_for_status()
-        data = response.json()
-        if not data:
-            return f"Error: No data found for ticker '{ticker}'."
-        price = data[0].get("price")
-        volume = data[0].get("volume")
-        return f"The current stock price of {ticker.upper()} is ${price} with a volume of {volume}."
+        return format_stock_price(ticker, response.json())
+    except CircuitOpenError as open_err:
+        return f"Error: {open_err}"
     except requests.exceptions.HTTPError as http_err:
         return f"Error: HTTP error occurred: {http_err}"
     except Exception as e:
         return f"An unexpected error occurred: {e}"
 
+_quote_flight = SingleFlight()
+
+
+def _fetch_quotes(symbols: List[str]) -> Dict[str, StockPriceResponse]:
+    """One FMP request for all `symbols`. Never raises; failures become error responses."""
+    try:
+        response = http_get(
+            "fmp",
+            BATCH_STOCK_URL.format(tickers=",".join(symbols)),
+            HTTP_TIMEOUT,
+            params={"apikey": FMP_API_KEY},
+        )
+        response.raise_for_status()
+        quotes = parse_quotes(symbols, response.json())
+    except CircuitOpenError as open_err:
+        quotes = {s: quote_error(s, str(open_err)) for s in symbols}
+    except requests.exceptions.HTTPError as http_err:
+        quotes = {s: quote_error(s, f"HTTP error occurred: {http_err}") for s in symbols}
+    except Exception as e:
+        quotes = {s: quote_error(s, f"An unexpected error occurred: {e}") for s in symbols}
+    remember_quotes(quotes)
+    return quotes
+
+
 @tool
+def get_stock_prices(tickers: List[str]) -> List[StockPriceResponse]:
+    """
+    Get the current stock prices for several ticker symbols in a single call.
+    Prefer this over calling get_stock_price repeatedly when comparing stocks.
+
+    Args:
+        tickers (List[str]): The stock ticker symbols (e.g., ["AAPL", "MSFT", "NVDA"]).
+
+    Returns:
+        List[StockPriceResponse]: One entry per ticker; failed lookups have `error_message` set.
+    """
+    symbols = normalise_tickers(tickers)
+    if not FMP_API_KEY:
+        return [quote_error(s, "Financial Modeling Prep API key is not set.") for s in symbols]
+
+    quotes, missing = cached_quotes(symbols)
+    if missing:
+        quotes.update(_quote_flight.run(missing, _fetch_quotes))
+    return [quotes[s] for s in symbols]
+
+@tool
+@cached("get_current_weather", skip=is_error_result)
 def get_current_weather(location: str) -> str:
     """
     Get the current weather for a specific location.
@@ -60,32 +259,15 @@ def get_current_weather(location: str) -> str:
     if not OPENWEATHERMAP_API_KEY:
         return "Error: OpenWeatherMap API key is not set."
 
-    # The base URL for the OpenWeatherMap API
-    url = f"http://api.openweathermap.org/data/2.5/weather"
-
-    # Parameters for the API request
-    params = {
-        "q": location,
-        "appid": OPENWEATHERMAP_API_KEY,
-        "units": "metric"  # Use metric units (Celsius)
-    }
-
     try:
         # Make the GET request to the API
-        response = requests.get(url, params=params)
+        response = http_get("openweathermap", WEATHER_URL, HTTP_TIMEOUT, params=weather_params(location))
         # Raise an exception for bad status codes (4xx or 5xx)
         response.raise_for_status()
-        
-        # Parse the JSON response
-        data = response.json()
-        
-        # Extract the relevant information
-        weather_description = data['weather'][0]['description']
-        temperature = data['main']['temp']
-        city = data['name']
-        country = data['sys']['country']
-        
-        return f"The current weather in {city}, {country} is {temperature}°C with {weather_description}."
+        return format_weather(response.json())
+
+    except CircuitOpenError as open_err:
+        return f"Error: {open_err}"
 
     except requests.exceptions.HTTPError as http_err:
         # Handle specific HTTP errors, like 404 Not Found for an invalid city
@@ -98,7 +280,7 @@ def get_current_weather(location: str) -> str:
     except Exception as e:
         # Handle other potential errors (e.g., network issues)
         return f"An unexpected error occurred: {e}"
-    
+
 @tool
 def get_top_headlines(country: str) -> List[Dict]:
     """
@@ -110,34 +292,68 @@ def get_top_headlines(country: str) -> List[Dict]:
     Returns:
         List[Dict]: A list of dictionaries, each containing a headline's 'title' and 'url'.
     """
-    
+
     if not NEWS_API_KEY:
         return [{"error": "News API key is not set."}]
 
-    url = f"https://newsapi.org/v2/top-headlines"
-    params = {
-        "country": country,
-        "apiKey": NEWS_API_KEY,
-        "pageSize": 5
-    }
-
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        articles = data.get("articles", [])
+        # The headline store refreshes at most once per NEWS_CACHE_TTL per country
+        articles = headline_store.get(country).articles
         if not articles:
             return [{"error": f"No news articles found for country code '{country}'."}]
-
-        return [{"title": article["title"], "url": article["url"]} for article in articles if article.get("title")]
+        return articles
+    except CircuitOpenError as open_err:
+        return [{"error": str(open_err)}]
     except requests.exceptions.HTTPError as http_err:
-        error_details = response.json().get("message", str(http_err))
+        try:
+            error_details = http_err.response.json().get("message", str(http_err))
+        except ValueError:
+            error_details = str(http_err)
         return [{"error": f"HTTP error occurred: {http_err} - {error_details}"}]
     except Exception as e:
         return [f"An unexpected error occurred: {e}"]
 
+# --- Structured fetchers, used by the CityReport tool in report.py ---
+@cached("weather_report", skip=is_error_result, model=WeatherResponse)
+def fetch_weather(location: str) -> WeatherResponse:
+    """Current weather for `location` as a WeatherResponse; failures set `error_message`."""
+    if not OPENWEATHERMAP_API_KEY:
+        return weather_error(location, "OpenWeatherMap API key is not set.")
+
+    try:
+        response = http_get("openweathermap", WEATHER_URL, HTTP_TIMEOUT, params=weather_params(location))
+        response.raise_for_status()
+        return parse_weather(response.json())
+    except CircuitOpenError as open_err:
+        return weather_error(location, str(open_err))
+    except requests.exceptions.HTTPError as http_err:
+        if response.status_code == 404:
+            return weather_error(location, f"City '{location}' not found. Please check the spelling.")
+        return weather_error(location, f"HTTP error occurred: {http_err}")
+    except Exception as e:
+        return weather_error(location, f"An unexpected error occurred: {e}")
+
+
+def fetch_news_articles(country: str) -> List[NewsArticle]:
+    """
+    Top headlines for a two-letter country code as NewsArticle objects; failures set `error_message`.
+    Read through headline_store, so get_top_headlines and the reports share its refreshes and ETags.
+    """
+    if not NEWS_API_KEY:
+        return [news_error("News API key is not set.")]
+
+    try:
+        return parse_articles(country, {"articles": headline_store.get(country).articles})
+    except CircuitOpenError as open_err:
+        return [news_error(str(open_err))]
+    except requests.exceptions.HTTPError as http_err:
+        return [news_error(f"HTTP error occurred: {http_err}")]
+    except Exception as e:
+        return [news_error(f"An unexpected error occurred: {e}")]
+
 # ---- Test the function ----
 if __name__ == "__main__":
     print(get_current_weather("Berlin"))
     print(get_top_headlines("us"))
-    print(get_stock_price("AAPL"))
\ No newline at end of file
+    print(get_stock_price("AAPL"))
+    print(get_stock_prices.invoke({"tickers": ["AAPL", "MSFT", "NVDA"]}))
@@ -0,0 +1,132 @@
+"""
+Long-lived HTTP service for the week_02 multi-tool agent.
+
+The LLM client, the tools and the AgentExecutor are built once at startup and
+shared by all requests. Every request runs its own `ainvoke`, and the executor
+keeps the agent scratchpad (the intermediate steps) local to that call, so
+concurrent requests never see each other's tool results. Requests to the LLM
+server go through one httpx client whose connection limit (LLM_MAX_CONCURRENCY)
+caps how many generations run on LM Studio at once. Further requests wait for a
+free connection, while their tool calls keep running.
+
+Run:
+    python web_app.py
+    # or behind a load balancer
+    uvicorn web_app:app --host 0.0.0.0 --port 8000 --workers 2
+"""
+import math
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import httpx
+from agent import AGENT_FAST_PATH, setup_agent
+from async_tools import aclose_http_client, get_http_client
+from breaker import CircuitOpenError, breaker_stats
+from cache import tool_cache
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from intent import FastPath
+from pydantic import BaseModel
+from schemas import CityReport
+from tools import NEWS_API_KEY, headline_store
+
+# Maximum number of concurrent requests to the LLM server
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+# Seconds to wait for one LLM response
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # pool=None: requests over the limit queue for a connection instead of failing
+    app.state.llm_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=LLM_MAX_CONCURRENCY, max_keepalive_connections=LLM_MAX_CONCURRENCY),
+        timeout=httpx.Timeout(LLM_TIMEOUT, pool=None),
+    )
+    app.state.agent_executor = setup_agent(http_async_client=app.state.llm_client)
+    app.state.agent_executor.verbose = False
+    app.state.fast_path = FastPath() if AGENT_FAST_PATH else None
+    yield
+    await app.state.llm_client.aclose()
+    await aclose_http_client()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+# Pydantic model for the incoming message
+class ChatMessage(BaseModel):
+    message: str
+
+
+@app.post("/chat")
+async def chat(chat_message: ChatMessage, request: Request):
+    if not chat_message.message:
+        return JSONResponse(content={"response": "No message provided"}, status_code=400)
+
+    state = request.app.state
+    try:
+        answer = await state.fast_path.aanswer(chat_message.message) if state.fast_path else None
+        if answer is not None:
+            return JSONResponse(content={"response": answer, "source": "fast_path"})
+
+        result = await state.agent_executor.ainvoke({"input": chat_message.message})
+        output = result["output"]
+        if isinstance(output, CityReport):
+            output = output.model_dump()
+        return JSONResponse(content={"response": output, "source": "agent"})
+    except Exception as e:
+        return JSONResponse(content={"response": f"An error occurred: {e}"}, status_code=500)
+
+
+@app.get("/headlines/{country}")
+async def headlines(country: str, since: Optional[int] = None):
+    """
+    Top headlines for a two-letter country code. Pollers should pass the `marker`
+    of their previous response as `since` to receive only articles that are new.
+    """
+    if not NEWS_API_KEY:
+        return JSONResponse(content={"error": "News API key is not set."}, status_code=503)
+    try:
+        snapshot = await headline_store.aget(country, get_http_client(), since=since)
+    except CircuitOpenError as open_err:
+        retry_after = max(1, math.ceil(open_err.retry_in))
+        return JSONResponse(
+            content={"error": f"{open_err.name} is currently unavailable.", "retry_in": retry_after},
+            status_code=503,
+            headers={"Retry-After": str(retry_after)},
+        )
+    except httpx.HTTPStatusError as http_err:
+        return JSONResponse(content={"error": f"HTTP error occurred: {http_err}"}, status_code=502)
+    except httpx.TransportError as transport_err:
+        # Connection failures and timeouts that outlasted the retries in breaker.ahttp_get
+        return JSONResponse(content={"error": f"Upstream request failed: {transport_err!r}"}, status_code=502)
+    return JSONResponse(content={
+        "country": snapshot.country,
+        "articles": snapshot.articles,
+        "marker": snapshot.marker,
+        "fetched_at": snapshot.fetched_at,
+    })
+
+
+@app.get("/health")
+async def health():
+    return JSONResponse(content={"status": "ok"})
+
+
+@app.get("/stats")
+async def stats(request: Request):
+    fast_path = request.app.state.fast_path
+    return JSONResponse(content={
+        "cache": tool_cache.snapshot(),
+        "headlines": headline_store.stats,
+        "breakers": breaker_stats(),
+        "fast_path": fast_path.stats if fast_path else None,
+        "llm_max_concurrency": LLM_MAX_CONCURRENCY,
+    })
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)
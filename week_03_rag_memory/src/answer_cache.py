@@ -0,0 +1,147 @@
+"""
+Semantic answer cache for RAG answers.
+
+Users ask the same things about the paper in slightly different words. The
+cache keeps recent RAG answers with the embedding of their question; a new
+question whose cosine similarity to a cached one reaches `threshold` gets the
+cached answer back without multi-query generation, retrieval or an LLM call.
+Lookups are one matrix-vector product over the cached question vectors.
+
+Entries belong to a collection version (see collection.CollectionVersion);
+when ingestion changes the collection, the next lookup drops them all. Within
+a version, least recently used entries are evicted once there are more than
+`max_entries` or their estimated size passes `max_bytes`.
+"""
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_MAX_MB = float(os.getenv("ANSWER_CACHE_MAX_MB", "32"))
+# Cosine similarity between questions needed for a hit
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+
+_ENTRY_OVERHEAD = 200   # Rough bytes per entry besides its text and vector
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    size: int
+    hits: int = 0
+
+
+class SemanticAnswerCache:
+    """
+    Args:
+        threshold (float): Minimum cosine similarity for a hit.
+        max_entries (int): Entries kept before LRU eviction.
+        max_bytes (int): Estimated size of all entries before LRU eviction.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, max_entries: int = ANSWER_CACHE_SIZE,
+                 max_bytes: int = int(ANSWER_CACHE_MAX_MB * 1024 * 1024)):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = None
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()   # slot -> entry, oldest first
+        self._vectors: Optional[np.ndarray] = None    # One normalised question vector per slot
+        self._live: Optional[np.ndarray] = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, vector: List[float], version) -> Optional[str]:
+        """The cached answer to the most similar question, if it reaches the threshold."""
+        query = self._normalise(vector)
+        with self._lock:
+            self._check_version(version)
+            if not self._entries or query.shape[0] != self._vectors.shape[1]:
+                self.stats["misses"] += 1
+                return None
+            scores = self._vectors @ query
+            scores[~self._live] = -np.inf
+            slot = int(np.argmax(scores))
+            if scores[slot] < self.threshold:
+                self.stats["misses"] += 1
+                return None
+            entry = self._entries[slot]
+            self._entries.move_to_end(slot)
+            entry.hits += 1
+            self.stats["hits"] += 1
+            return entry.answer
+
+    def store(self, question: str, vector: List[float], answer: str, version):
+        if not answer:
+            return
+        query = self._normalise(vector)
+        with self._lock:
+            if version != self.version:
+                return    # Answered from a version the cache has moved past
+            if self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+                self._allocate(query.shape[0])
+            size = len(question) + len(answer) + query.nbytes + _ENTRY_OVERHEAD
+            slot = int(np.argmin(self._live))   # A free slot; evicts first if there is none
+            if self._live[slot]:
+                self._evict_oldest()
+                slot = int(np.argmin(self._live))
+            self._vectors[slot] = query
+            self._live[slot] = True
+            self._entries[slot] = CachedAnswer(question, answer, size)
+            self._bytes += size
+            self.stats["stores"] += 1
+            while self._entries and self._bytes > self.max_bytes:
+                self._evict_oldest()
+
+    def clear(self):
+        with self._lock:
+            self._drop_all()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "version": self.version,
+            }
+
+    # --- internals ---
+    @staticmethod
+    def _normalise(vector: List[float]) -> np.ndarray:
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return query / norm if norm else query
+
+    def _allocate(self, dim: int):
+        self._entries.clear()
+        self._bytes = 0
+        self._vectors = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._live = np.zeros(self.max_entries, dtype=bool)
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self._entries:
+                self.stats["invalidations"] += 1
+            self.version = version
+            self._drop_all()
+
+    def _drop_all(self):
+        self._entries.clear()
+        self._bytes = 0
+        if self._live is not None:
+            self._live[:] = False
+
+    def _evict_oldest(self):
+        slot, entry = self._entries.popitem(last=False)
+        self._live[slot] = False
+        self._bytes -= entry.size
+        self.stats["evictions"] += 1
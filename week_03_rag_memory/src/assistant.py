@@ -3,19 +3,19 @@ import json
 from operator import itemgetter
 
 import langchain
-import qdrant_client
+from collection import CollectionVersion, connect
+from embedding_cache import get_embeddings
 from helper import check_and_download_file, check_qdrant_status
 from langchain.memory import ConversationBufferMemory
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate
-from langchain.retrievers import MultiQueryRetriever
 #from langchain.schema.output_parser import StrOutputParser
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnableBranch, RunnablePassthrough, RunnableLambda
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_openai import ChatOpenAI
 from langchain_qdrant import QdrantVectorStore
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.messages import messages_from_dict, messages_to_dict
+from retrieval import FusedMultiQueryRetriever
 
 chat_history = []
 
@@ -32,12 +32,9 @@ llm = ChatOpenAI(
     model="gpt-oss-20b",
     api_key="lm-studio"
     )
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+embeddings = get_embeddings()
 
-client = qdrant_client.QdrantClient(
-    url="http://localhost:6333",
-    prefer_grpc=False
-)
+client = connect()    # QDRANT_URL, or the embedded store at QDRANT_PATH
 
 qdrant_store = QdrantVectorStore(
     client=client,
@@ -45,7 +42,11 @@ qdrant_store = QdrantVectorStore(
     embedding=embeddings
 )
 
-retriever = MultiQueryRetriever.from_llm(retriever=qdrant_store.as_retriever(), llm=llm)
+# Rewrites are searched in one batched Qdrant request and fused with RRF (see retrieval.py)
+retriever = FusedMultiQueryRetriever.from_llm(
+    llm=llm, embeddings=embeddings, client=client, collection_name="research_assistant",
+    collection_version=CollectionVersion(client, "research_assistant"),    # Cached results end with a re-ingest
+)
 
 
 # --- 2. Setup Memory ---
@@ -1,9 +1,9 @@
 import os
 
 import qdrant_client
+from embedding_cache import get_embeddings
 from langchain.chains import RetrievalQA
 from langchain.retrievers import MultiQueryRetriever
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_openai import ChatOpenAI
 from langchain_qdrant import QdrantVectorStore
 
@@ -15,7 +15,7 @@ llm = ChatOpenAI(
     model="gpt-oss-20b",
     api_key="lm-studio"
     )
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+embeddings = get_embeddings()
 
 client = qdrant_client.QdrantClient(
     url="http://localhost:6333",
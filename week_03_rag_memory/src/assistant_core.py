@@ -1,37 +1,44 @@
+import asyncio
 import os
-import json
 from operator import itemgetter
 
 import langchain
-import qdrant_client
+from answer_cache import SemanticAnswerCache
+from bm25 import BM25Index, index_path
+from chat_log import ChatLog, migrate_json_history
+from collection import CollectionConfig, CollectionVersion, aconnect, connect, is_embedded
+from context import CONTEXT_CANDIDATES, ContextPacker
+from embedding_cache import get_embeddings
 from helper import check_and_download_file, check_qdrant_status
 from langchain.memory import ConversationBufferMemory
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate
-from langchain.retrievers import MultiQueryRetriever
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableBranch, RunnablePassthrough, RunnableLambda
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.runnables import RunnableBranch, RunnableGenerator, RunnablePassthrough, RunnableLambda
 from langchain_openai import ChatOpenAI
 from langchain_qdrant import QdrantVectorStore
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_core.messages import messages_from_dict, messages_to_dict
+from retrieval import FusedMultiQueryRetriever
+from router import ROUTER_MODE, EmbeddingRouter
+from memory import MEMORY_MODE, RollingSummarizer
+from sessions import DEFAULT_SESSION, SessionStore
 
-# Global chat history
-chat_history = []
+CHAT_HISTORY_DIR = os.getenv("CHAT_HISTORY_DIR", "/app/chat_history")
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 langchain.debug = False
 
 # Setup LLM and retriever
 llm = ChatOpenAI(
-    base_url="http://host.docker.internal:1234/v1",
-    model="gpt-oss-20b",
+    base_url=os.getenv("LLM_BASE_URL", "http://host.docker.internal:1234/v1"),
+    model=os.getenv("LLM_MODEL", "gpt-oss-20b"),
     api_key="lm-studio"
 )
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+embeddings = get_embeddings()
 
-qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
-client = qdrant_client.QdrantClient(url=qdrant_url, prefer_grpc=False)
+# The Qdrant server at QDRANT_URL, or the embedded store at QDRANT_PATH (see collection.py)
+client = connect()
+# Used by the async chain (web app), so searches do not hold a worker thread; None when embedded
+async_client = aconnect()
 
 qdrant_store = QdrantVectorStore(
     client=client,
@@ -39,7 +46,19 @@ qdrant_store = QdrantVectorStore(
     embedding=embeddings
 )
 
-retriever = MultiQueryRetriever.from_llm(retriever=qdrant_store.as_retriever(), llm=llm)
+# Changes whenever ingest.py changes the collection; invalidates the retrieval and answer caches
+corpus_version = CollectionVersion(client, "research_assistant", async_client=async_client)
+
+# Rewrites are searched in one batched Qdrant request and in the BM25 index written by
+# ingest.py, and all rankings are fused with RRF (see retrieval.py)
+retriever = FusedMultiQueryRetriever.from_llm(
+    llm=llm, embeddings=embeddings, client=client, async_client=async_client, collection_name="research_assistant",
+    sparse_index=BM25Index.open(index_path("research_assistant")),
+    # Rescoring etc. when the collection is quantised; the embedded store always searches exactly
+    search_params=None if is_embedded() else CollectionConfig().search_params(),
+    collection_version=corpus_version,
+    k=CONTEXT_CANDIDATES, fetch_k=max(8, CONTEXT_CANDIDATES),
+)
 
 # Setup router
 router_template = (
@@ -57,6 +76,27 @@ router_prompt = PromptTemplate(
 )
 router_chain = router_prompt | llm | StrOutputParser()
 
+# Local router: decides with the embedding model instead of an LLM call (see router.py)
+embedding_router = EmbeddingRouter(embeddings, client, "research_assistant", async_client=async_client)
+
+
+def route_topic(inputs):
+    """Returns "YES" for follow-ups to the conversation and "NO" for questions that need RAG."""
+    if ROUTER_MODE == "llm":
+        return router_chain.invoke(inputs)
+    decision = embedding_router.route(inputs["question"], inputs["chat_history"])
+    if ROUTER_MODE == "compare":
+        embedding_router.compare_in_background(decision, lambda: router_chain.invoke(inputs))
+    return "YES" if decision.follow_up else "NO"
+
+async def aroute_topic(inputs):
+    if ROUTER_MODE == "llm":
+        return await router_chain.ainvoke(inputs)
+    decision = await embedding_router.aroute(inputs["question"], inputs["chat_history"])
+    if ROUTER_MODE == "compare":
+        embedding_router.compare_in_background(decision, lambda: router_chain.invoke(inputs))
+    return "YES" if decision.follow_up else "NO"
+
 # RAG chain
 rag_template = (
     "Answer the user's question based on the context provided.\n"
@@ -68,9 +108,20 @@ rag_template = (
     "{question}\n"
 )
 rag_prompt = ChatPromptTemplate.from_template(rag_template)
+
+# Retrieved candidates are deduplicated, reranked and packed into CONTEXT_TOKEN_BUDGET (see context.py)
+context_packer = ContextPacker()
+
+def build_context(inputs):
+    return context_packer(inputs["question"], retriever.invoke(inputs["question"]))
+
+async def abuild_context(inputs):
+    documents = await retriever.ainvoke(inputs["question"])
+    return await asyncio.to_thread(context_packer, inputs["question"], documents)    # Cross-encoder is CPU-bound
+
 rag_chain = (
     {
-        "context": itemgetter("question") | retriever,
+        "context": RunnableLambda(build_context, afunc=abuild_context),
         "question": itemgetter("question"),
     }
     | rag_prompt
@@ -78,6 +129,45 @@ rag_chain = (
     | StrOutputParser()
 )
 
+# Answer cache in front of the RAG chain: a question close enough to an earlier one gets
+# its answer back without retrieval or generation (see answer_cache.py). Follow-ups never
+# reach it, since their answers depend on the conversation.
+answer_cache = SemanticAnswerCache()
+
+def remember_answer(question, vector, version):
+    """Passes the streamed answer through and caches it once complete."""
+    def transform(chunks):
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        answer_cache.store(question, vector, "".join(parts), version)
+
+    async def atransform(chunks):
+        parts = []
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        answer_cache.store(question, vector, "".join(parts), version)
+
+    return RunnableGenerator(transform, atransform)
+
+def cached_rag(inputs):
+    vector = embeddings.embed_query(inputs["question"])
+    version = corpus_version.get()
+    answer = answer_cache.lookup(vector, version)
+    if answer is not None:
+        return answer
+    return rag_chain | remember_answer(inputs["question"], vector, version)
+
+async def acached_rag(inputs):
+    vector = await embeddings.aembed_query(inputs["question"])
+    version = await corpus_version.aget()
+    answer = answer_cache.lookup(vector, version)
+    if answer is not None:
+        return answer
+    return rag_chain | remember_answer(inputs["question"], vector, version)
+
 # Conversational chain
 conversational_prompt = ChatPromptTemplate.from_messages([
     ("system", "You are a helpful AI assistant."),
@@ -88,49 +178,97 @@ conversational_chain = conversational_prompt | llm | StrOutputParser()
 
 # Full chain with routing
 routing_condition = RunnableLambda(lambda x: "YES" in x["topic"].upper())
-branch = RunnableBranch((routing_condition, conversational_chain), rag_chain)
-full_chain = RunnablePassthrough.assign(topic=router_chain) | branch
-
-# Load chat history
-try:
-    with open("/app/chat_history/chat_history.json", "r") as f:
-        retrieved_history = json.load(f)
-        chat_history = messages_from_dict(retrieved_history)
-except FileNotFoundError:
-    pass
-
-def get_assistant_response(user_input):
-    global chat_history
-    
-    response = full_chain.invoke({
-        "question": user_input,
-        "chat_history": chat_history
-    })
-    
-    chat_history.append(HumanMessage(content=user_input))
-    chat_history.append(AIMessage(content=response))
-    
-    # Save chat history
-    os.makedirs("/app/chat_history", exist_ok=True)
-    serializable_history = messages_to_dict(chat_history)
-    with open("/app/chat_history/chat_history.json", "w") as f:
-        json.dump(serializable_history, f, indent=4)
-    
+branch = RunnableBranch((routing_condition, conversational_chain), RunnableLambda(cached_rag, afunc=acached_rag))
+full_chain = RunnablePassthrough.assign(topic=RunnableLambda(route_topic, afunc=aroute_topic)) | branch
+
+# Chat histories, one per session, loaded from their logs on demand (see sessions.py)
+session_store = SessionStore(CHAT_HISTORY_DIR)
+
+# The single history of earlier versions becomes the default session
+_default_log = ChatLog(os.path.join(session_store.directory, f"{DEFAULT_SESSION}.jsonl"))
+if os.path.exists(os.path.join(CHAT_HISTORY_DIR, "chat_history.jsonl")) and not os.path.exists(_default_log.path):
+    os.makedirs(session_store.directory, exist_ok=True)
+    os.replace(os.path.join(CHAT_HISTORY_DIR, "chat_history.jsonl"), _default_log.path)
+migrate_json_history(os.path.join(CHAT_HISTORY_DIR, "chat_history.json"), _default_log)
+_default_log.close()
+
+# Rolling summary of older turns, updated in the background (CHAT_MEMORY_MODE=summary, see memory.py)
+summary_template = (
+    "Progressively summarize the conversation, adding the new lines to the current summary.\n"
+    "Keep names, facts and open questions. Use at most {max_words} words.\n\n"
+    "Current summary:\n"
+    "{summary}\n\n"
+    "New lines:\n"
+    "{new_lines}\n\n"
+    "New summary:"
+)
+summary_chain = PromptTemplate.from_template(summary_template) | llm | StrOutputParser()
+
+def summarize(summary, new_lines, max_words):
+    return summary_chain.invoke({"summary": summary or "(empty)", "new_lines": new_lines, "max_words": max_words})
+
+summarizer = RollingSummarizer(summarize, session_store)
+
+def save_turn(session, user_input, response):
+    session.append([HumanMessage(content=user_input), AIMessage(content=response)])
+    if MEMORY_MODE == "summary":
+        summarizer.after_turn(session)
+
+def get_chat_history(session_id=DEFAULT_SESSION):
+    return session_store.peek(session_id)
+
+def get_assistant_response(user_input, session_id=DEFAULT_SESSION):
+    with session_store.session(session_id) as session:
+        response = full_chain.invoke({
+            "question": user_input,
+            "chat_history": session.history()
+        })
+
+        # Save chat history: appends this turn only
+        save_turn(session, user_input, response)
+
     return response
 
-def clear_chat_history():
-    global chat_history
-    chat_history = []
-    history_file = "/app/chat_history/chat_history.json"
-    if os.path.exists(history_file):
-        os.remove(history_file)
-
-def prune_chat_history(keep_last_n=4):
-    global chat_history
-    if len(chat_history) > keep_last_n:
-        chat_history = chat_history[-keep_last_n:]
-        # Save the pruned history
-        os.makedirs("/app/chat_history", exist_ok=True)
-        serializable_history = messages_to_dict(chat_history)
-        with open("/app/chat_history/chat_history.json", "w") as f:
-            json.dump(serializable_history, f, indent=4)
\ No newline at end of file
+def clear_chat_history(session_id=DEFAULT_SESSION):
+    with session_store.session(session_id) as session:
+        session.clear()
+
+def prune_chat_history(session_id=DEFAULT_SESSION):
+    """Keeps the newest messages that fit in CHAT_HISTORY_TOKEN_BUDGET."""
+    with session_store.session(session_id) as session:
+        session.prune()
+
+# Async versions for the web app: the chain runs on the event loop and only file writes go to a thread
+async def aget_assistant_response(user_input, session_id=DEFAULT_SESSION):
+    async with session_store.asession(session_id) as session:
+        response = await full_chain.ainvoke({
+            "question": user_input,
+            "chat_history": session.history()
+        })
+        await asyncio.to_thread(save_turn, session, user_input, response)
+
+    return response
+
+async def astream_assistant_response(user_input, session_id=DEFAULT_SESSION):
+    """Yields the answer in chunks as the LLM generates it; the turn is saved once it is complete."""
+    async with session_store.asession(session_id) as session:
+        chunks = []
+        async for chunk in full_chain.astream({
+            "question": user_input,
+            "chat_history": session.history()
+        }):
+            chunks.append(chunk)
+            yield chunk
+        response = "".join(chunks)
+        await asyncio.to_thread(save_turn, session, user_input, response)
+
+async def aget_chat_history(session_id=DEFAULT_SESSION):
+    return await session_store.apeek(session_id)
+
+async def aclear_chat_history(session_id=DEFAULT_SESSION):
+    async with session_store.asession(session_id) as session:
+        await asyncio.to_thread(session.clear)
+
+async def aprune_chat_history(session_id=DEFAULT_SESSION):
+    async with session_store.asession(session_id) as session:
+        await asyncio.to_thread(session.prune)
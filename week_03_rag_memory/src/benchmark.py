@@ -0,0 +1,462 @@
+"""
+Per-stage latency benchmark for the research assistant's chain.
+
+Runs a fixed set of conversations through assistant_core.full_chain with a
+fake OpenAI-compatible LLM on localhost and an embedded Qdrant (QDRANT_PATH,
+see collection.py) in a temporary directory, loaded with a small built-in
+corpus (or the PDFs given with --pdf), and records per stage: wall time,
+call count and LLM token counts.
+
+Stages:
+    routing           route_topic, including its embedding and Qdrant calls
+    router_llm        LLM router calls (ROUTER_MODE=llm)
+    retrieval         the multi-query retriever, including everything below it
+    multi_query_llm   the LLM call that writes the rewrites
+    context           retrieval + dedupe/rerank/packing (build_context)
+    generation_llm    the final answer (RAG or conversational)
+    embedding         embed_query / embed_documents calls
+    qdrant            Qdrant client calls
+Stages nest, so their times overlap; compare a stage with itself across runs.
+
+The fake LLM charges a fixed latency per call, a prefill cost per prompt token
+and a cost per generated token, so prompt size shows up in generation time.
+The report is JSON with sorted keys; --compare prints the change per stage
+against an earlier report.
+
+Usage:
+    python benchmark.py --iterations 3 --json before.json
+    python benchmark.py --iterations 3 --json after.json --compare before.json
+    python benchmark.py --fake-embeddings --llm-prefill-ms 0.5
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from latency_stats import percentiles
+from sessions import estimate_tokens
+
+# Conversations: every list is one session, asked in order
+CONVERSATIONS = [
+    ["What is multi-head attention?", "Why does it use several heads?"],
+    ["How does the Transformer encode word positions?", "What is positional encoding?"],
+    ["Which optimizer and learning rate schedule were used for training?"],
+    ["What BLEU score did the big model reach on WMT 2014 English-to-German?", "And on English-to-French?"],
+    ["What is the dimension d_model of the base model?", "How many layers does the encoder have?"],
+    ["What is multi head attention"],    # A rewording of an earlier question: answer cache
+]
+
+CORPUS = [
+    "The Transformer is a sequence transduction model based entirely on attention, dispensing with recurrence and "
+    "convolutions. The encoder maps an input sequence of symbol representations to a sequence of continuous "
+    "representations, and the decoder generates an output sequence one symbol at a time.",
+    "The encoder is composed of a stack of N = 6 identical layers. Each layer has two sub-layers: a multi-head "
+    "self-attention mechanism and a position-wise fully connected feed-forward network, each with a residual "
+    "connection followed by layer normalization. All sub-layers produce outputs of dimension d_model = 512.",
+    "Scaled dot-product attention computes the dot products of the query with all keys, divides each by the square "
+    "root of d_k, and applies a softmax to obtain the weights on the values.",
+    "Multi-head attention linearly projects the queries, keys and values h times with different learned "
+    "projections. Attention is performed in parallel on each projection and the outputs are concatenated. "
+    "Multi-head attention allows the model to jointly attend to information from different representation "
+    "subspaces at different positions. We employ h = 8 parallel attention layers, or heads.",
+    "Since the model contains no recurrence and no convolution, we inject information about the relative or "
+    "absolute position of the tokens. We add positional encodings to the input embeddings, using sine and cosine "
+    "functions of different frequencies.",
+    "We used the Adam optimizer with beta1 = 0.9, beta2 = 0.98 and epsilon = 1e-9. The learning rate increases "
+    "linearly for the first warmup_steps = 4000 training steps and decreases proportionally to the inverse square "
+    "root of the step number afterwards.",
+    "On the WMT 2014 English-to-German translation task, the big Transformer model outperforms the best previously "
+    "reported models by more than 2.0 BLEU, establishing a new state-of-the-art BLEU score of 28.4.",
+    "On the WMT 2014 English-to-French translation task, our big model achieves a BLEU score of 41.0, "
+    "outperforming all of the previously published single models, at less than 1/4 the training cost.",
+    "We apply dropout to the output of each sub-layer before it is added to the sub-layer input and normalized, "
+    "and to the sums of the embeddings and the positional encodings. For the base model we use P_drop = 0.1. "
+    "We also employ label smoothing of value 0.1.",
+    "The decoder is also composed of a stack of N = 6 identical layers. In addition to the two sub-layers in each "
+    "encoder layer, the decoder inserts a third sub-layer, which performs multi-head attention over the output of "
+    "the encoder stack. Masking prevents positions from attending to subsequent positions.",
+]
+
+STAGES = ["routing", "router_llm", "retrieval", "multi_query_llm", "context", "generation_llm", "embedding", "qdrant"]
+
+
+# --- Fake LLM ---
+def fake_answer(prompt: str, answer_tokens: int) -> str:
+    """A deterministic reply for each of the assistant's prompts."""
+    question = prompt.strip().splitlines()[-1] if prompt.strip() else ""
+    if "answer with only 'YES' or 'NO'" in prompt:
+        return "NO"
+    if "different versions of the given user" in prompt:
+        original = prompt.rsplit("Original question:", 1)[-1].strip()
+        return "\n".join(f"{prefix} {original}" for prefix in ("In the paper,", "Explain:", "Details on"))
+    if "Progressively summarize" in prompt:
+        return "The user asked about the Transformer paper."
+    words = re.findall(r"\w+", question) or ["answer"]
+    return " ".join(words[i % len(words)] for i in range(answer_tokens))
+
+
+class FakeLLMServer:
+    """
+    OpenAI-compatible /v1/chat/completions on localhost.
+
+    Args:
+        latency_ms (float): Fixed cost per call.
+        prefill_ms (float): Cost per prompt token (prompt processing).
+        token_ms (float): Cost per generated token.
+        answer_tokens (int): Length of a generated answer.
+    """
+
+    def __init__(self, latency_ms: float = 50.0, prefill_ms: float = 0.2, token_ms: float = 2.0,
+                 answer_tokens: int = 150):
+        self.latency_ms = latency_ms
+        self.prefill_ms = prefill_ms
+        self.token_ms = token_ms
+        self.answer_tokens = answer_tokens
+        self.stats = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _complete(self, request: dict):
+        prompt = "\n".join(str(m.get("content") or "") for m in request.get("messages", []))
+        content = fake_answer(prompt, self.answer_tokens)
+        prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(content)
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+        time.sleep((self.latency_ms + prompt_tokens * self.prefill_ms) / 1000)
+        return content, prompt_tokens, completion_tokens
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Pooled keep-alive clients would otherwise wait ~40 ms per response on Nagle + delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                content, prompt_tokens, completion_tokens = fake._complete(request)
+                base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()),
+                        "model": request.get("model", "fake")}
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                         "total_tokens": prompt_tokens + completion_tokens}
+                if not request.get("stream"):
+                    time.sleep(completion_tokens * fake.token_ms / 1000)
+                    payload = json.dumps(dict(base, object="chat.completion", usage=usage, choices=[{
+                        "index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop",
+                    }])).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                pieces = re.findall(r"\S+\s*", content) or [content]
+                for index, piece in enumerate(pieces):
+                    time.sleep(fake.token_ms / 1000)
+                    chunk = dict(base, object="chat.completion.chunk", choices=[{
+                        "index": 0, "delta": {"role": "assistant", "content": piece} if index == 0 else {"content": piece},
+                        "finish_reason": None,
+                    }])
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                final = dict(base, object="chat.completion.chunk", usage=usage,
+                             choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings for runs without the MiniLM model."""
+
+    def __init__(self, size: int = 384):
+        self.size = size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for word in re.findall(r"\w+", text.lower()):
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.size] += 1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+
+# --- Instrumentation ---
+class StageRecorder(BaseCallbackHandler):
+    """Times chain, retriever and LLM runs by stage, and wraps embeddings and Qdrant clients."""
+
+    run_inline = True   # Timestamps are taken in the calling thread, not an executor
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.tokens: Dict[str, Dict[str, int]] = defaultdict(lambda: {"prompt_tokens": 0, "completion_tokens": 0})
+        self._runs: Dict[uuid.UUID, tuple] = {}     # run_id -> (stage or None, parent_run_id, start)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def instrument(self, obj, methods: List[str], stage: str):
+        """Replaces `obj`'s methods with timed wrappers (sync and async)."""
+        for name in methods:
+            original = getattr(obj, name, None)
+            if original is None:
+                continue
+            if asyncio.iscoroutinefunction(original):
+                async def timed(*args, _original=original, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return await _original(*args, **kwargs)
+                    finally:
+                        self.record(stage, time.perf_counter() - start)
+            else:
+                def timed(*args, _original=original, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return _original(*args, **kwargs)
+                    finally:
+                        self.record(stage, time.perf_counter() - start)
+            object.__setattr__(obj, name, timed)
+
+    # LangChain callbacks
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        stage = {"route_topic": "routing", "build_context": "context"}.get(kwargs.get("name"))
+        self._start(run_id, parent_run_id, stage)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    on_chain_error = lambda self, error, *, run_id, **kwargs: self._end(run_id)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, "retrieval")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id)
+
+    on_retriever_error = lambda self, error, *, run_id, **kwargs: self._end(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        ancestors = self._ancestor_stages(parent_run_id)
+        if "retrieval" in ancestors:
+            stage = "multi_query_llm"
+        elif "routing" in ancestors:
+            stage = "router_llm"
+        else:
+            stage = "generation_llm"
+        self._start(run_id, parent_run_id, stage)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        stage = self._end(run_id)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if not usage:
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    usage = {"prompt_tokens": metadata.get("input_tokens", 0),
+                             "completion_tokens": metadata.get("output_tokens", 0)}
+        if stage:
+            with self._lock:
+                self.tokens[stage]["prompt_tokens"] += usage.get("prompt_tokens", 0) or 0
+                self.tokens[stage]["completion_tokens"] += usage.get("completion_tokens", 0) or 0
+
+    on_llm_error = lambda self, error, *, run_id, **kwargs: self._end(run_id)
+
+    def _start(self, run_id, parent_run_id, stage: Optional[str]):
+        with self._lock:
+            self._runs[run_id] = (stage, parent_run_id, time.perf_counter())
+
+    def _end(self, run_id) -> Optional[str]:
+        with self._lock:
+            stage, _, start = self._runs.get(run_id, (None, None, None))
+        if stage:
+            self.record(stage, time.perf_counter() - start)
+        return stage
+
+    def _ancestor_stages(self, run_id) -> List[str]:
+        stages = []
+        with self._lock:
+            while run_id in self._runs:
+                stage, run_id, _ = self._runs[run_id]
+                if stage:
+                    stages.append(stage)
+        return stages
+
+
+# --- Harness ---
+def prepare_environment(args, llm_server: FakeLLMServer, workdir: str):
+    """Points assistant_core at the fake LLM and throwaway state before it is imported."""
+    os.environ.update({
+        "LLM_BASE_URL": llm_server.base_url,
+        "CHAT_HISTORY_DIR": os.path.join(workdir, "chat_history"),
+        "ROUTER_LOG_PATH": "",
+        "BM25_INDEX_DIR": os.path.join(workdir, "bm25"),
+        "QDRANT_PATH": os.path.join(workdir, "qdrant"),    # Embedded Qdrant, see collection.py
+        "EMBEDDING_CACHE_DIR": os.path.join(workdir, "embedding_cache") if args.embedding_cache else "",
+    })
+    if args.fake_embeddings:
+        import embedding_cache
+        embedding_cache.get_embeddings = lambda model_name=None: HashEmbeddings()
+
+
+def ingest_corpus(args, embeddings, client, collection_name: str):
+    from bm25 import BM25Index, index_path
+    from ingest import iter_pages, run_pipeline
+
+    if args.pdf:
+        pages = iter_pages(args.pdf)
+    else:
+        pages = (Document(page_content=text, metadata={"source": "benchmark_corpus.pdf", "page": i})
+                 for i, text in enumerate(CORPUS))
+    return run_pipeline(pages, embeddings, client, collection_name,
+                        sparse_index=BM25Index.open(index_path(collection_name)))
+
+
+async def run(args) -> dict:
+    llm_server = FakeLLMServer(args.llm_latency_ms, args.llm_prefill_ms, args.llm_token_ms, args.answer_tokens).start()
+    workdir = tempfile.mkdtemp(prefix="rag_benchmark_")
+    prepare_environment(args, llm_server, workdir)
+
+    from collection import connect
+    from embedding_cache import get_embeddings
+
+    client = connect()
+    ingest_corpus(args, get_embeddings(), client, "research_assistant")
+    client.close()    # Releases the directory for assistant_core's client
+
+    import assistant_core as core    # Imported here, after the environment is in place
+
+    if args.no_answer_cache:
+        core.answer_cache.threshold = float("inf")
+    recorder = StageRecorder()
+    recorder.instrument(core.embeddings, ["embed_query", "embed_documents", "aembed_query", "aembed_documents"],
+                        "embedding")
+    for client in (core.client, core.async_client):
+        if client is not None:
+            recorder.instrument(client, ["query_points", "query_batch_points", "retrieve", "get_collection"], "qdrant")
+
+    turns = []
+    for iteration in range(args.iterations):
+        if not args.warm:
+            core.retriever.query_cache.clear()
+            core.retriever.result_cache.clear()
+            core.answer_cache.clear()
+        for conversation in CONVERSATIONS:
+            session_id = f"bench-{iteration}-{uuid.uuid4().hex[:8]}"
+            for question in conversation:
+                start = time.perf_counter()
+                async with core.session_store.asession(session_id) as session:
+                    answer = await core.full_chain.ainvoke(
+                        {"question": question, "chat_history": session.history()},
+                        config={"callbacks": [recorder]},
+                    )
+                    await asyncio.to_thread(core.save_turn, session, question, answer)
+                turns.append(time.perf_counter() - start)
+    llm_server.stop()
+
+    stages = {}
+    for stage in STAGES:
+        samples = recorder.samples.get(stage, [])
+        stages[stage] = {
+            "calls": len(samples),
+            "total_ms": round(sum(samples) * 1000, 2),
+            "latency_ms": percentiles(samples),
+            **(recorder.tokens[stage] if stage.endswith("_llm") else {}),
+        }
+    return {
+        "settings": {key: value for key, value in sorted(vars(args).items()) if key not in ("json", "compare")},
+        "turns": len(turns),
+        "turn_latency_ms": percentiles(turns),
+        "stages": stages,
+        "llm": llm_server.stats,
+        "answer_cache": core.answer_cache.snapshot(),
+    }
+
+
+def print_report(report: dict, baseline: Optional[dict] = None):
+    turn = report["turn_latency_ms"]
+    print(f"\n{report['turns']} turns: mean {turn['mean']} ms, p50 {turn['p50']} ms, p95 {turn['p95']} ms")
+    header = f"{'stage':<18}{'calls':>7}{'total ms':>11}{'p50 ms':>9}{'p95 ms':>9}{'prompt tok':>12}{'gen tok':>9}"
+    print(header + ("   Δ total ms" if baseline else ""))
+    for stage, result in report["stages"].items():
+        latency = result["latency_ms"]
+        line = (f"{stage:<18}{result['calls']:>7}{result['total_ms']:>11.1f}{latency.get('p50', 0):>9.1f}"
+                f"{latency.get('p95', 0):>9.1f}{result.get('prompt_tokens', ''):>12}{result.get('completion_tokens', ''):>9}")
+        if baseline and stage in baseline.get("stages", {}):
+            before = baseline["stages"][stage]["total_ms"]
+            change = result["total_ms"] - before
+            line += f"   {change:+.1f}" + (f" ({change / before:+.0%})" if before else "")
+        print(line)
+    if baseline:
+        before = baseline["turn_latency_ms"]
+        print(f"turn mean {turn['mean'] - before['mean']:+.1f} ms, p95 {turn['p95'] - before['p95']:+.1f} ms vs baseline")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage latency benchmark for the research assistant's chain.")
+    parser.add_argument("--iterations", type=int, default=3, help="Runs over the conversation set.")
+    parser.add_argument("--pdf", nargs="*", help="Ingest these PDFs instead of the built-in corpus.")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Hashed bag-of-words instead of MiniLM.")
+    parser.add_argument("--embedding-cache", action="store_true", help="Use an (initially empty) embedding cache.")
+    parser.add_argument("--warm", action="store_true", help="Keep retrieval and answer caches between iterations.")
+    parser.add_argument("--no-answer-cache", action="store_true")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="Fixed cost per LLM call.")
+    parser.add_argument("--llm-prefill-ms", type=float, default=0.2, help="Cost per prompt token.")
+    parser.add_argument("--llm-token-ms", type=float, default=2.0, help="Cost per generated token.")
+    parser.add_argument("--answer-tokens", type=int, default=150, help="Length of a generated answer.")
+    parser.add_argument("--json", help="Write the report to this file.")
+    parser.add_argument("--compare", help="An earlier report to diff against.")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
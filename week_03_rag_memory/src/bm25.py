@@ -0,0 +1,145 @@
+"""
+Sparse BM25 index over the chunks of a Qdrant collection.
+
+Dense search is weak on exact terms: equation and section numbers, acronyms,
+variable names such as d_model. The BM25 index is built by ingest.py next to
+the collection (BM25_INDEX_DIR/<collection>.json) and keyed by the same point
+IDs, so the retriever can fuse its ranking with the dense one and fetch any
+chunk that only BM25 found from Qdrant by ID.
+
+The index is a plain inverted list of term frequencies. Ingestion adds and
+removes chunks incrementally and saves it atomically; readers reload it when
+the file changes.
+"""
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+BM25_INDEX_DIR = os.getenv("BM25_INDEX_DIR", "../data/bm25")
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# Words, numbers and dotted numbers ("3.2", "10.5.1"), so section and equation numbers stay whole
+_TOKEN = re.compile(r"\w+(?:\.\d+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def index_path(collection_name: str, directory: str = BM25_INDEX_DIR) -> str:
+    return os.path.join(directory, f"{collection_name}.json")
+
+
+class BM25Index:
+    """
+    Args:
+        path (str): The JSON file the index is saved to and reloaded from; None for in-memory only.
+        k1 (float): Term frequency saturation.
+        b (float): Length normalisation.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = BM25_K1, b: float = BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._docs: Dict[str, Dict[str, int]] = {}        # id -> term frequencies
+        self._postings: Dict[str, Dict[str, int]] = {}    # term -> id -> frequency
+        self._lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str, **kwargs) -> "BM25Index":
+        """The index saved at `path`, or an empty one if there is none yet."""
+        index = cls(path, **kwargs)
+        index.refresh()
+        return index
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._docs
+
+    def ids(self) -> List[str]:
+        return list(self._docs)
+
+    def add(self, doc_id: str, text: str):
+        with self._lock:
+            self._remove(doc_id)
+            self._insert(doc_id, dict(Counter(tokenize(text))))
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._remove(doc_id)
+
+    def search(self, query: str, limit: int = 8) -> List[Tuple[str, float]]:
+        """The `limit` best (id, score) pairs for `query`, best first."""
+        with self._lock:
+            count = len(self._docs)
+            if not count:
+                return []
+            average_length = self._total_length / count
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
+
+    def save(self):
+        """Writes the index to a temporary file that atomically replaces `path`."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"docs": self._docs}, f)
+            os.replace(temp_path, self.path)
+            self._mtime = os.stat(self.path).st_mtime_ns
+
+    def refresh(self) -> bool:
+        """Reloads the index if its file changed since it was last read or written. Returns True if it did."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except (OSError, TypeError):
+            return False
+        if mtime == self._mtime:
+            return False
+        with open(self.path) as f:
+            data = json.load(f)
+        with self._lock:
+            self._docs, self._postings, self._lengths, self._total_length = {}, {}, {}, 0
+            for doc_id, frequencies in data["docs"].items():
+                self._insert(doc_id, frequencies)
+            self._mtime = mtime
+        return True
+
+    # --- internals ---
+    def _insert(self, doc_id: str, frequencies: Dict[str, int]):
+        self._docs[doc_id] = frequencies
+        self._lengths[doc_id] = length = sum(frequencies.values())
+        self._total_length += length
+        for term, frequency in frequencies.items():
+            self._postings.setdefault(term, {})[doc_id] = frequency
+
+    def _remove(self, doc_id: str):
+        frequencies = self._docs.pop(doc_id, None)
+        if frequencies is None:
+            return
+        self._total_length -= self._lengths.pop(doc_id)
+        for term in frequencies:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
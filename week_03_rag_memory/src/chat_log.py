@@ -0,0 +1,219 @@
+"""
+Append-only chat history log.
+
+Each message is one JSON line (messages_to_dict format), so saving a turn
+appends two lines instead of rewriting the whole history. Writes are flushed
+straight away but fsync'ed in batches: after `fsync_every` lines, after
+`fsync_interval` seconds, and at exit.
+
+Pruning appends a {"type": "prune", "keep": n} marker instead of rewriting the
+file; clearing truncates it. Once a write takes the file past `compact_bytes`
+(or twice its size after the last compaction, whichever is larger), the log is
+compacted under the same lock: the last `compact_keep` live messages and the
+current summary are written to a temporary file that atomically replaces the
+log. Older messages are never loaded again (startup reads a much smaller
+window), so the file stays bounded in normal use, not only after a prune.
+
+In summary memory mode (see memory.py) a {"type": "summary", "text": ...,
+"unsummarized": k} record stores the rolling summary of everything but the k
+messages before it and the messages after it. A later prune marker discards it.
+
+Startup reads the file backwards and decodes only the last `window` live
+messages, so load time does not grow with the length of the conversation.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import weakref
+from typing import List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+FSYNC_EVERY = int(os.getenv("CHAT_LOG_FSYNC_EVERY", "8"))
+FSYNC_INTERVAL = float(os.getenv("CHAT_LOG_FSYNC_INTERVAL", "1.0"))
+COMPACT_BYTES = int(os.getenv("CHAT_LOG_COMPACT_BYTES", str(1024 * 1024)))
+# Live messages kept by a compaction; keep it well above CHAT_HISTORY_WINDOW
+COMPACT_KEEP = int(os.getenv("CHAT_LOG_COMPACT_KEEP", "1000"))
+
+_BLOCK_SIZE = 64 * 1024
+
+# Logs with an open file, fsync'ed and closed at exit
+_open_logs = weakref.WeakSet()
+
+
+@atexit.register
+def _close_all():
+    for log in list(_open_logs):
+        log.close()
+
+
+class ChatLog:
+    """
+    Args:
+        path (str): The .jsonl log file.
+        fsync_every (int): Lines written between fsyncs.
+        fsync_interval (float): Maximum seconds between fsyncs while writing.
+        compact_bytes (int): File size above which a write compacts the log.
+        compact_keep (int): Live messages a compaction keeps.
+    """
+
+    def __init__(self, path: str, fsync_every: int = FSYNC_EVERY, fsync_interval: float = FSYNC_INTERVAL,
+                 compact_bytes: int = COMPACT_BYTES, compact_keep: int = COMPACT_KEEP):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_bytes = compact_bytes
+        self.compact_keep = compact_keep
+        self._lock = threading.Lock()
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._compacted_size = 0    # File size right after the last compaction
+
+    def append(self, messages: List[BaseMessage]):
+        self._write([{"type": "message", "data": data} for data in messages_to_dict(messages)])
+
+    def prune(self, keep_last_n: int):
+        """Marks everything but the last `keep_last_n` messages as deleted."""
+        self._write([{"type": "prune", "keep": keep_last_n}])
+
+    def write_summary(self, text: str, unsummarized: int):
+        """Records the rolling summary; the last `unsummarized` messages so far are not in it."""
+        self._write([{"type": "summary", "text": text, "unsummarized": unsummarized}])
+
+    def clear(self):
+        with self._lock:
+            self._close_file()
+            open(self.path, "w").close()
+
+    def load_tail(self, window: Optional[int] = None) -> List[BaseMessage]:
+        """
+        The last `window` live messages (all of them if None), oldest first.
+        Only the end of the file that holds them is read and decoded.
+        """
+        with self._lock:
+            return self._read_tail(window)[0]
+
+    def load(self, window: Optional[int] = None) -> Tuple[List[BaseMessage], Optional[dict]]:
+        """
+        Like `load_tail`, plus the latest summary among the records read, as
+        {"text": ..., "unsummarized": messages at the end not covered by it}, or None.
+        """
+        with self._lock:
+            return self._read_tail(window)
+
+    def compact(self):
+        """Rewrites the log with only its last `compact_keep` live messages and the current summary."""
+        with self._lock:
+            self._compact()
+
+    def close(self):
+        with self._lock:
+            self._close_file()
+
+    # --- internals ---
+    def _read_tail(self, window: Optional[int]) -> Tuple[List[BaseMessage], Optional[dict]]:
+        if not os.path.exists(self.path):
+            return [], None
+        records = []
+        summary, summary_searched = None, False
+        # Messages still wanted before the current position; prune markers can only lower it
+        budget = window if window is not None else float("inf")
+        for line in self._reverse_lines():
+            if budget <= 0:
+                break
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue    # A line torn by a crash mid-write
+            if record["type"] == "prune":
+                budget = min(budget, record["keep"])
+                summary_searched = True     # Pruning drops the summary written before it
+            elif record["type"] == "message":
+                records.append(record["data"])
+                budget -= 1
+            elif record["type"] == "summary" and not summary_searched:
+                summary = {"text": record["text"], "unsummarized": len(records) + record["unsummarized"]}
+                summary_searched = True
+        records.reverse()
+        return messages_from_dict(records), summary
+
+    def _write(self, records: List[dict]):
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a")
+                _open_logs.add(self)
+                if self._file.tell() and not self._ends_with_newline():
+                    self._file.write("\n")    # Don't glue new records onto a torn last line
+            self._file.write("".join(json.dumps(record) + "\n" for record in records))
+            self._file.flush()
+            self._unsynced += len(records)
+            if self._file.tell() > max(self.compact_bytes, 2 * self._compacted_size):
+                self._compact()
+            elif self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _compact(self):
+        # Caller holds self._lock
+        live, summary = self._read_tail(self.compact_keep)
+        self._close_file()
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            for data in messages_to_dict(live):
+                f.write(json.dumps({"type": "message", "data": data}) + "\n")
+            if summary is not None:
+                # After the messages, so it still covers all but the last `unsummarized` of them
+                record = {"type": "summary", "text": summary["text"],
+                          "unsummarized": min(summary["unsummarized"], len(live))}
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            self._compacted_size = f.tell()
+        os.replace(temp_path, self.path)
+
+    def _sync(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def _close_file(self):
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _reverse_lines(self):
+        """Yields the file's non-empty lines from last to first, reading it in blocks from the end."""
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            remainder = b""
+            while position > 0:
+                size = min(_BLOCK_SIZE, position)
+                position -= size
+                f.seek(position)
+                lines = (f.read(size) + remainder).split(b"\n")
+                remainder = lines.pop(0)    # May be the end of a line that starts in an earlier block
+                for line in reversed(lines):
+                    if line.strip():
+                        yield line.decode("utf-8")
+            if remainder.strip():
+                yield remainder.decode("utf-8")
+
+
+def migrate_json_history(json_path: str, log: ChatLog):
+    """Moves a chat_history.json written by older versions into `log`, once."""
+    if not os.path.exists(json_path) or os.path.exists(log.path):
+        return
+    with open(json_path) as f:
+        log.append(messages_from_dict(json.load(f)))
+    os.replace(json_path, f"{json_path}.migrated")
@@ -0,0 +1,267 @@
+"""
+Provisioning of the research_assistant collection: quantisation, on-disk
+vectors, HNSW settings and the matching search parameters.
+
+By default Qdrant keeps every vector in RAM at full precision (4 bytes per
+dimension). With int8 scalar quantisation the index searches 1-byte copies
+(4x smaller), with binary quantisation 1-bit copies (32x smaller). The
+full-precision originals can then live on disk; only the quantised copies
+and the HNSW graph need RAM. Quantised scores are approximate, so searches
+oversample candidates and rescore them with the original vectors.
+
+Ingestion also stamps the collection with a version in its metadata whenever
+it changes the points, so caches of answers built on the old contents (see
+answer_cache.py) can tell they are stale.
+
+With QDRANT_PATH set, Qdrant runs embedded in the assistant's process (local
+mode) with its data under that directory, and no server is needed: searches are
+function calls instead of HTTP requests. Local mode keeps the vectors in RAM,
+searches them exhaustively and ignores the quantisation and HNSW settings; it
+suits a single node with a corpus of up to some tens of thousands of chunks.
+Only one process can open the directory at a time, so run ingest.py before
+starting the assistant, not alongside it. Within the process, local mode is not
+thread-safe (its SQLite storage fails on concurrent writes), so connect() hands
+out one client whose calls are serialised by a lock.
+
+Binary quantisation loses more recall on small models (MiniLM has 384
+dimensions) than scalar; run collection_benchmark.py to compare the options
+on your data before switching.
+
+Usage:
+    python collection.py                                   # create with the QDRANT_* settings
+    python collection.py --quantization scalar --on-disk   # also updates an existing collection
+"""
+import argparse
+import os
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+# Directory of an embedded Qdrant in this process; empty to use the server at QDRANT_URL
+QDRANT_PATH = os.getenv("QDRANT_PATH", "")
+# "none", "scalar" (int8) or "binary"
+QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none")
+# Keep the full-precision vectors on disk (only sensible with quantisation)
+VECTORS_ON_DISK = os.getenv("QDRANT_VECTORS_ON_DISK", "false").lower() == "true"
+HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+# Search-time candidate list size; 0 leaves Qdrant's default
+HNSW_EF = int(os.getenv("QDRANT_HNSW_EF", "0"))
+# Seconds between checks of the collection version by the serving side
+VERSION_CHECK_INTERVAL = float(os.getenv("QDRANT_VERSION_CHECK_INTERVAL", "30"))
+# Re-rank quantised candidates with the original vectors, fetching `oversampling` times the limit
+RESCORE = os.getenv("QDRANT_RESCORE", "true").lower() == "true"
+OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+_FLOAT_BYTES = 4
+_LINK_BYTES = 4
+
+
+@dataclass
+class CollectionConfig:
+    quantization: str = QUANTIZATION
+    on_disk: bool = VECTORS_ON_DISK
+    m: int = HNSW_M
+    ef_construct: int = HNSW_EF_CONSTRUCT
+    hnsw_ef: int = HNSW_EF
+    rescore: bool = RESCORE
+    oversampling: float = OVERSAMPLING
+
+    def __post_init__(self):
+        if self.quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization {self.quantization!r}; expected one of {QUANTIZATION_MODES}")
+
+    def vectors_config(self, vector_size: int) -> models.VectorParams:
+        return models.VectorParams(size=vector_size, distance=models.Distance.COSINE, on_disk=self.on_disk)
+
+    def hnsw_config(self) -> models.HnswConfigDiff:
+        return models.HnswConfigDiff(m=self.m, ef_construct=self.ef_construct)
+
+    def quantization_config(self):
+        # The quantised copies stay in RAM even when the originals are on disk
+        if self.quantization == "scalar":
+            return models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        if self.quantization == "binary":
+            return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def search_params(self) -> Optional[models.SearchParams]:
+        """Query-time parameters matching the collection, or None when Qdrant's defaults apply."""
+        quantization = None
+        if self.quantization != "none":
+            quantization = models.QuantizationSearchParams(rescore=self.rescore, oversampling=self.oversampling)
+        if quantization is None and not self.hnsw_ef:
+            return None
+        return models.SearchParams(hnsw_ef=self.hnsw_ef or None, quantization=quantization)
+
+    def estimated_memory(self, count: int, vector_size: int) -> dict:
+        """
+        Rough RAM and disk use for `count` vectors: the searched vectors (quantised or not),
+        the originals unless they are on disk, and about 2 * m links per point in the HNSW graph.
+        """
+        original = count * vector_size * _FLOAT_BYTES
+        quantised = {"none": 0, "scalar": count * vector_size, "binary": count * ((vector_size + 7) // 8)}
+        graph = count * self.m * 2 * _LINK_BYTES
+        ram = quantised[self.quantization] + graph + (0 if self.on_disk else original)
+        return {"ram_bytes": ram, "disk_bytes": original if self.on_disk else 0}
+
+
+def is_embedded() -> bool:
+    return bool(QDRANT_PATH)
+
+
+class SerializedClient:
+    """
+    Wraps a client so only one of its methods runs at a time. Ingest workers,
+    searches run in threads, the router and CollectionVersion all share the
+    embedded client.
+    """
+
+    def __init__(self, client: QdrantClient):
+        self._client = client
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._client, name)
+        if not callable(attribute):
+            return attribute
+
+        def serialized(*args, **kwargs):
+            with self._lock:
+                return attribute(*args, **kwargs)
+        return serialized
+
+
+def connect() -> QdrantClient:
+    """A client for the embedded store at QDRANT_PATH if it is set, else for the server at QDRANT_URL."""
+    if is_embedded():
+        return SerializedClient(QdrantClient(path=QDRANT_PATH))
+    return QdrantClient(url=QDRANT_URL, prefer_grpc=False)
+
+
+def aconnect() -> Optional[AsyncQdrantClient]:
+    """
+    An async client for the server at QDRANT_URL, or None in embedded mode:
+    the directory can only be opened once per process, so async callers run
+    the sync client in a thread instead.
+    """
+    if is_embedded():
+        return None
+    return AsyncQdrantClient(url=QDRANT_URL, prefer_grpc=False)
+
+
+def create_collection(client: QdrantClient, collection_name: str, vector_size: int,
+                      config: Optional[CollectionConfig] = None):
+    """Creates the collection in the layout langchain_qdrant.QdrantVectorStore reads, with `config`'s storage settings."""
+    config = config or CollectionConfig()
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=config.vectors_config(vector_size),
+        hnsw_config=config.hnsw_config(),
+        quantization_config=config.quantization_config(),
+    )
+
+
+def bump_collection_version(client: QdrantClient, collection_name: str) -> str:
+    """Marks the collection's contents as changed."""
+    version = uuid.uuid4().hex
+    client.update_collection(collection_name, metadata={"version": version})
+    return version
+
+
+def version_of(info: models.CollectionInfo) -> str:
+    # Qdrant servers without collection metadata fall back to the point count
+    metadata = info.config.metadata or {}
+    return metadata.get("version") or f"points:{info.points_count}"
+
+
+class CollectionVersion:
+    """
+    The collection's current version, re-read at most every `interval` seconds
+    so the request path does not pay a Qdrant round trip each time.
+
+    Args:
+        client: QdrantClient for `get`.
+        collection_name (str): The collection to watch.
+        async_client: Optional AsyncQdrantClient for `aget`.
+        interval (float): Seconds a read version is trusted.
+    """
+
+    def __init__(self, client, collection_name: str, async_client=None, interval: float = VERSION_CHECK_INTERVAL):
+        self.client = client
+        self.async_client = async_client
+        self.collection_name = collection_name
+        self.interval = interval
+        self._version = None
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[str]:
+        if self._fresh():
+            return self._version
+        try:
+            return self._remember(version_of(self.client.get_collection(self.collection_name)))
+        except Exception as e:
+            print(f"Collection version check failed: {e}")
+            return self._remember(self._version)
+
+    async def aget(self) -> Optional[str]:
+        if self._fresh() or self.async_client is None:
+            return self.get()
+        try:
+            return self._remember(version_of(await self.async_client.get_collection(self.collection_name)))
+        except Exception as e:
+            print(f"Collection version check failed: {e}")
+            return self._remember(self._version)
+
+    def _fresh(self) -> bool:
+        return time.monotonic() - self._checked < self.interval
+
+    def _remember(self, version: Optional[str]) -> Optional[str]:
+        with self._lock:
+            self._version = version
+            self._checked = time.monotonic()
+        return version
+
+
+def update_collection(client: QdrantClient, collection_name: str, config: Optional[CollectionConfig] = None):
+    """
+    Applies `config` to an existing collection. Qdrant rebuilds the quantised
+    vectors and the HNSW graph in the background; searches keep working meanwhile.
+    """
+    config = config or CollectionConfig()
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": models.VectorParamsDiff(on_disk=config.on_disk)},
+        hnsw_config=config.hnsw_config(),
+        quantization_config=config.quantization_config() or models.Disabled.DISABLED,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or re-provision the research assistant's collection.")
+    parser.add_argument("--collection", default="research_assistant")
+    parser.add_argument("--vector-size", type=int, default=384, help="Used only when the collection is created.")
+    parser.add_argument("--quantization", choices=QUANTIZATION_MODES, default=QUANTIZATION)
+    parser.add_argument("--on-disk", action="store_true", default=VECTORS_ON_DISK, help="Keep original vectors on disk.")
+    parser.add_argument("--m", type=int, default=HNSW_M, help="HNSW links per node.")
+    parser.add_argument("--ef-construct", type=int, default=HNSW_EF_CONSTRUCT)
+    args = parser.parse_args()
+
+    config = CollectionConfig(quantization=args.quantization, on_disk=args.on_disk, m=args.m,
+                              ef_construct=args.ef_construct)
+    client = connect()
+    if client.collection_exists(args.collection):
+        update_collection(client, args.collection, config)
+        print(f"Updated {args.collection}: {asdict(config)}")
+    else:
+        create_collection(client, args.collection, args.vector_size, config)
+        print(f"Created {args.collection}: {asdict(config)}")
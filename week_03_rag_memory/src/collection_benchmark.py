@@ -0,0 +1,184 @@
+"""
+Recall, memory and latency of the collection settings in collection.py.
+
+Loads a set of vectors (the research_assistant collection, or synthetic
+clustered vectors), creates one temporary collection per configuration in the
+target Qdrant and runs the same queries against each. Recall@k is measured
+against exact nearest neighbours computed with numpy; RAM and disk are
+estimated from the vector count and settings (see
+CollectionConfig.estimated_memory), and "corpus_multiple" is how many times
+the corpus would fit in the RAM the full-precision baseline needs.
+
+Run it against a Qdrant server: local mode always searches exhaustively and
+ignores quantisation, so every configuration would look the same.
+
+Usage:
+    python collection_benchmark.py --synthetic 50000 --dim 384 --k 4
+    python collection_benchmark.py --from-collection research_assistant --json results.json
+    python collection_benchmark.py --configs baseline,scalar-disk --m 32 --ef-construct 200
+"""
+import argparse
+import dataclasses
+import json
+import os
+import time
+from typing import List
+
+import numpy as np
+from collection import CollectionConfig, create_collection
+from latency_stats import percentiles
+from qdrant_client import QdrantClient, models
+
+PRESETS = {
+    "baseline": CollectionConfig(quantization="none", on_disk=False),
+    "scalar": CollectionConfig(quantization="scalar", on_disk=False),
+    "scalar-disk": CollectionConfig(quantization="scalar", on_disk=True),
+    "scalar-disk-norescore": CollectionConfig(quantization="scalar", on_disk=True, rescore=False),
+    "binary-disk": CollectionConfig(quantization="binary", on_disk=True, oversampling=3.0),
+}
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int = 64, seed: int = 7) -> np.ndarray:
+    """Clustered vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(0, clusters, size=count)] + rng.normal(scale=0.6, size=(count, dim))
+    return vectors.astype(np.float32)
+
+
+def collection_vectors(client: QdrantClient, collection_name: str) -> np.ndarray:
+    vectors, offset = [], None
+    while True:
+        points, offset = client.scroll(collection_name, limit=1000, offset=offset, with_payload=False, with_vectors=True)
+        vectors.extend(point.vector for point in points)
+        if offset is None:
+            break
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    """Cosine top-k by brute force: the ground truth for recall."""
+    normalised = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ normalised.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+
+def wait_until_indexed(client: QdrantClient, collection_name: str, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.get_collection(collection_name).status == models.CollectionStatus.GREEN:
+            return True
+        time.sleep(0.5)
+    return False
+
+
+def benchmark_config(client: QdrantClient, name: str, config: CollectionConfig, vectors: np.ndarray,
+                     queries: np.ndarray, truth: List[set], args) -> dict:
+    collection_name = f"{args.prefix}_{name}"
+    if client.collection_exists(collection_name):
+        client.delete_collection(collection_name)
+    create_collection(client, collection_name, vectors.shape[1], config)
+    if args.force_index:
+        # Build the HNSW graph even for small benchmark sets, as a large collection would have one
+        client.update_collection(collection_name, optimizers_config=models.OptimizersConfigDiff(indexing_threshold=1))
+
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), args.batch_size):
+        batch = vectors[offset:offset + args.batch_size]
+        client.upsert(collection_name, points=models.Batch(
+            ids=list(range(offset, offset + len(batch))), vectors=batch.tolist()
+        ), wait=True)
+    indexed = wait_until_indexed(client, collection_name, args.index_timeout)
+    build_seconds = time.perf_counter() - start
+
+    params = config.search_params()
+    for query in queries[:5]:    # Warm-up
+        client.query_points(collection_name, query=query.tolist(), limit=args.k, search_params=params)
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        points = client.query_points(collection_name, query=query.tolist(), limit=args.k, search_params=params).points
+        latencies.append(time.perf_counter() - start)
+        hits += len(expected & {point.id for point in points})
+
+    info = client.get_collection(collection_name)
+    if not args.keep:
+        client.delete_collection(collection_name)
+    return {
+        "config": dataclasses.asdict(config),
+        f"recall@{args.k}": round(hits / (len(queries) * args.k), 4),
+        "latency_ms": percentiles(latencies),
+        "memory": config.estimated_memory(len(vectors), vectors.shape[1]),
+        "build_seconds": round(build_seconds, 2),
+        "indexed": indexed,
+        "indexed_vectors_count": info.indexed_vectors_count,
+    }
+
+
+def run(args) -> dict:
+    client = QdrantClient(url=args.url)
+    if args.from_collection:
+        vectors = collection_vectors(client, args.from_collection)
+    else:
+        vectors = synthetic_vectors(args.synthetic, args.dim, seed=args.seed)
+    if len(vectors) <= args.k:
+        raise SystemExit(f"Need more than {args.k} vectors, got {len(vectors)}.")
+
+    # Queries: stored vectors with a little noise, like a question close to a chunk
+    rng = np.random.default_rng(args.seed)
+    picked = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+    queries = picked + rng.normal(scale=0.1 * float(np.std(vectors)), size=picked.shape).astype(np.float32)
+    truth = exact_neighbours(vectors, queries, args.k)
+
+    results = {}
+    for name in args.configs.split(","):
+        config = dataclasses.replace(PRESETS[name], m=args.m, ef_construct=args.ef_construct, hnsw_ef=args.hnsw_ef)
+        print(f"Benchmarking {name}...")
+        results[name] = benchmark_config(client, name, config, vectors, queries, truth, args)
+
+    baseline_ram = dataclasses.replace(PRESETS["baseline"], m=args.m).estimated_memory(
+        len(vectors), vectors.shape[1])["ram_bytes"]
+    for result in results.values():
+        result["corpus_multiple"] = round(baseline_ram / result["memory"]["ram_bytes"], 2)
+    return {"vectors": len(vectors), "dim": int(vectors.shape[1]), "queries": len(queries), "k": args.k,
+            "configs": results}
+
+
+def print_report(report: dict):
+    k = report["k"]
+    print(f"\n{report['vectors']} vectors x {report['dim']} dims, {report['queries']} queries, k={k}")
+    print(f"{'config':<24}{'recall@' + str(k):>10}{'p50 ms':>9}{'p99 ms':>9}{'RAM MB':>9}{'disk MB':>9}{'x corpus':>10}")
+    for name, result in report["configs"].items():
+        memory = result["memory"]
+        print(f"{name:<24}{result[f'recall@{k}']:>10.4f}{result['latency_ms']['p50']:>9.2f}"
+              f"{result['latency_ms']['p99']:>9.2f}{memory['ram_bytes'] / 2**20:>9.1f}"
+              f"{memory['disk_bytes'] / 2**20:>9.1f}{result['corpus_multiple']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark quantisation and HNSW settings for the collection.")
+    parser.add_argument("--url", default=os.getenv("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--from-collection", help="Benchmark with this collection's vectors.")
+    parser.add_argument("--synthetic", type=int, default=20000, help="Synthetic vectors when no collection is given.")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--configs", default=",".join(PRESETS), help=f"Comma-separated; from {', '.join(PRESETS)}.")
+    parser.add_argument("--m", type=int, default=16, help="HNSW links per node, for every config.")
+    parser.add_argument("--ef-construct", type=int, default=100)
+    parser.add_argument("--hnsw-ef", type=int, default=0, help="Search-time ef; 0 for Qdrant's default.")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--index-timeout", type=float, default=300.0)
+    parser.add_argument("--no-force-index", dest="force_index", action="store_false")
+    parser.add_argument("--prefix", default="bench")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark collections.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Also write the report to this file.")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,131 @@
+"""
+Post-retrieval stage for the RAG chain: dedupe, rerank, pack.
+
+The retriever returns more candidates than the prompt needs, and chunks cut
+with a 100-character overlap (or the same page ingested twice) repeat each
+other. ContextPacker
+  1. drops chunks whose word shingles are mostly contained in a chunk already kept,
+  2. reranks the rest against the question with a small CPU cross-encoder, in batches,
+  3. keeps the best chunks that fit in `token_budget` tokens and formats them
+     as plain text with their source and page.
+
+Prompt tokens drive the LLM's prefill time, so a few relevant chunks answer
+faster than many overlapping ones. Without the cross-encoder (RERANK_MODEL=""
+or sentence-transformers missing) the retrieval order is kept.
+"""
+import os
+import threading
+from typing import List, Optional, Set
+
+from langchain_core.documents import Document
+from sessions import estimate_tokens
+
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+# Candidates the retriever hands over, and tokens of context they are packed into
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "12"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+# A chunk is a duplicate when this share of its shingles already appeared in kept chunks
+DEDUPE_CONTAINMENT = float(os.getenv("CONTEXT_DEDUPE_CONTAINMENT", "0.8"))
+
+_SHINGLE_WORDS = 5
+
+
+def shingles(text: str, size: int = _SHINGLE_WORDS) -> Set[int]:
+    words = text.lower().split()
+    if len(words) <= size:
+        return {hash(" ".join(words))} if words else set()
+    return {hash(" ".join(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+
+def dedupe(documents: List[Document], containment: float = DEDUPE_CONTAINMENT) -> List[Document]:
+    """Keeps documents in order, skipping those mostly contained in the ones kept before them."""
+    kept, seen = [], set()
+    for document in documents:
+        own = shingles(document.page_content)
+        if own and len(own & seen) / len(own) >= containment:
+            continue
+        kept.append(document)
+        seen |= own
+    return kept
+
+
+def format_context(documents: List[Document]) -> str:
+    parts = []
+    for document in documents:
+        source = os.path.basename(str(document.metadata.get("source", ""))) or "document"
+        page = document.metadata.get("page")
+        header = f"[{source}, page {page + 1}]" if isinstance(page, int) else f"[{source}]"
+        parts.append(f"{header}\n{document.page_content.strip()}")
+    return "\n\n".join(parts)
+
+
+class ContextPacker:
+    """
+    Args:
+        rerank_model (str): A sentence-transformers CrossEncoder; empty to keep the retrieval order.
+        batch_size (int): Question/chunk pairs scored per cross-encoder call.
+        token_budget (int): Tokens of context passed to the prompt.
+        containment (float): Shingle containment above which a chunk counts as a duplicate.
+    """
+
+    def __init__(self, rerank_model: str = RERANK_MODEL, batch_size: int = RERANK_BATCH_SIZE,
+                 token_budget: int = CONTEXT_TOKEN_BUDGET, containment: float = DEDUPE_CONTAINMENT):
+        self.rerank_model = rerank_model
+        self.batch_size = batch_size
+        self.token_budget = token_budget
+        self.containment = containment
+        self.stats = {"candidates": 0, "duplicates": 0, "packed": 0, "tokens": 0}
+        self._model = None
+        self._model_failed = False
+        self._lock = threading.Lock()
+
+    def __call__(self, question: str, documents: List[Document]) -> str:
+        return format_context(self.select(question, documents))
+
+    def select(self, question: str, documents: List[Document]) -> List[Document]:
+        """The deduplicated, reranked documents that fit in the token budget, best first."""
+        unique = dedupe(documents, self.containment)
+        ranked = self.rerank(question, unique)
+        packed, used = [], 0
+        for document in ranked:
+            tokens = estimate_tokens(document.page_content)
+            if used + tokens > self.token_budget:
+                continue    # A shorter chunk further down may still fit
+            packed.append(document)
+            used += tokens
+        if not packed and ranked:
+            # Even the best chunk is over budget: cut it down rather than send no context
+            best = ranked[0]
+            packed = [Document(page_content=best.page_content[:self.token_budget * 4], metadata=best.metadata)]
+            used = estimate_tokens(packed[0].page_content)
+        with self._lock:
+            self.stats["candidates"] += len(documents)
+            self.stats["duplicates"] += len(documents) - len(unique)
+            self.stats["packed"] += len(packed)
+            self.stats["tokens"] += used
+        return packed
+
+    def rerank(self, question: str, documents: List[Document]) -> List[Document]:
+        model = self._load()
+        if model is None or len(documents) < 2:
+            return documents
+        scores = model.predict(
+            [(question, document.page_content) for document in documents], batch_size=self.batch_size
+        )
+        for document, score in zip(documents, scores):
+            document.metadata["rerank_score"] = round(float(score), 4)
+        return [document for _, document in sorted(zip(scores, documents), key=lambda pair: -pair[0])]
+
+    def _load(self) -> Optional[object]:
+        if not self.rerank_model or self._model_failed:
+            return None
+        with self._lock:
+            if self._model is None and not self._model_failed:
+                try:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.rerank_model, device="cpu")
+                except Exception as e:
+                    print(f"Cross-encoder {self.rerank_model} unavailable, keeping the retrieval order: {e}")
+                    self._model_failed = True
+            return self._model
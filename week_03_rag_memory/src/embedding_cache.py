@@ -0,0 +1,205 @@
+"""
+Persistent embedding cache shared by ingestion and the assistants.
+
+Vectors are keyed by the embedding model's name, whether the text was embedded
+as a document or a query, and a hash of the text. They are stored per model in
+two append-only files:
+
+    <cache_dir>/<model>/vectors.bin   row i = one float32/float16 vector
+    <cache_dir>/<model>/keys.bin      row i = the 16-byte key of vector i
+
+plus a small meta.json with the dimension and dtype. The vectors file is read
+through a numpy memmap, so a large cache costs page cache, not heap. Rows are
+only ever appended, so another process (ingest.py and the web app share the
+cache) can add vectors, and this one picks them up on its next miss.
+
+The wrapped model is loaded only on the first miss, so a fully cached run never
+loads sentence-transformers at all.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialised within one process
+    fcntl = None
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Empty string disables the cache
+CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "../data/embedding_cache")
+# float16 halves the file size at ~3 significant digits per component
+CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float32")
+
+_KEY_SIZE = 16
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated texts from the on-disk cache.
+
+    Args:
+        model_name (str): Part of the cache key; vectors of different models never mix.
+        load_model (Callable): Returns the real Embeddings object; called on the first miss.
+        cache_dir (str): Root folder of the cache.
+        dtype (str): "float32" or "float16".
+    """
+
+    def __init__(self, model_name: str, load_model: Callable[[], Embeddings], cache_dir: str = CACHE_DIR,
+                 dtype: str = CACHE_DTYPE):
+        self.model_name = model_name
+        self._load_model = load_model
+        self._model: Optional[Embeddings] = None
+        self.dtype = np.dtype(dtype)
+        self.path = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._model_lock = threading.Lock()   # Separate, so a slow model load does not hold up cache hits
+        self._index: Dict[bytes, int] = {}
+        self._dim: Optional[int] = None
+        self._vectors: Optional[np.memmap] = None
+        self._keys_read = 0      # Bytes of keys.bin already in _index
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock:
+            self._load_meta()
+            self._refresh()
+
+    @property
+    def model(self) -> Embeddings:
+        if self._model is None:
+            with self._model_lock:
+                # Embed workers can miss at the same time; only the first loads the model
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, "document")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query")[0]
+
+    # --- internals ---
+    def _key(self, text: str, kind: str) -> bytes:
+        return hashlib.blake2b(f"{kind}\0{text}".encode("utf-8"), digest_size=_KEY_SIZE).digest()
+
+    def _embed(self, texts: List[str], kind: str) -> List[List[float]]:
+        keys = [self._key(text, kind) for text in texts]
+        with self._lock:
+            found = self._lookup(keys)
+            if len(found) < len(set(keys)):
+                self._refresh()
+                found = self._lookup(keys)
+
+        missing = list(dict.fromkeys(i for i, key in enumerate(keys) if key not in found))
+        missing_keys = {}
+        if missing:
+            # Deduplicate identical texts within the call before asking the model
+            first_index = {}
+            for i in missing:
+                first_index.setdefault(keys[i], i)
+            order = list(first_index.values())
+            if kind == "query":
+                vectors = [self.model.embed_query(texts[i]) for i in order]
+            else:
+                vectors = self.model.embed_documents([texts[i] for i in order])
+            # Round through the cache dtype so a hit and a miss return the same numbers
+            stored = np.asarray(vectors, dtype=self.dtype).astype(np.float32).tolist()
+            missing_keys = {keys[i]: vector for i, vector in zip(order, stored)}
+            with self._lock:
+                self._append(missing_keys)
+
+        with self._lock:
+            self.stats["hits"] += len(texts) - len(missing)
+            self.stats["misses"] += len(missing)
+        return [
+            missing_keys[key] if key in missing_keys else found[key]
+            for key in keys
+        ]
+
+    def _lookup(self, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        found = {}
+        for key in keys:
+            row = self._index.get(key)
+            if row is not None and key not in found:
+                found[key] = self._vectors[row].astype(np.float32).tolist()
+        return found
+
+    def _load_meta(self):
+        meta_path = os.path.join(self.path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self._dim = meta["dim"]
+            self.dtype = np.dtype(meta["dtype"])   # An existing cache keeps its dtype
+
+    def _refresh(self):
+        """Reads keys appended since the last refresh (also by other processes) and remaps the vectors."""
+        keys_path = os.path.join(self.path, "keys.bin")
+        vectors_path = os.path.join(self.path, "vectors.bin")
+        if self._dim is None or not os.path.exists(keys_path):
+            return
+        row_bytes = self._dim * self.dtype.itemsize
+        # Only trust rows whose vector is fully written
+        rows = min(os.path.getsize(keys_path) // _KEY_SIZE, os.path.getsize(vectors_path) // row_bytes)
+        if rows * _KEY_SIZE <= self._keys_read:
+            return
+        with open(keys_path, "rb") as f:
+            f.seek(self._keys_read)
+            data = f.read(rows * _KEY_SIZE - self._keys_read)
+        first_row = self._keys_read // _KEY_SIZE
+        for offset in range(0, len(data), _KEY_SIZE):
+            self._index[data[offset:offset + _KEY_SIZE]] = first_row + offset // _KEY_SIZE
+        self._keys_read = rows * _KEY_SIZE
+        self._vectors = np.memmap(vectors_path, dtype=self.dtype, mode="r", shape=(rows, self._dim))
+
+    def _append(self, vectors: Dict[bytes, List[float]]):
+        new = {key: vector for key, vector in vectors.items() if key not in self._index}
+        if not new:
+            return
+        with self._file_lock():
+            if self._dim is None:
+                self._load_meta()   # Another process may have started the cache meanwhile
+            if self._dim is None:
+                self._dim = len(next(iter(new.values())))
+                with open(os.path.join(self.path, "meta.json"), "w") as f:
+                    json.dump({"model": self.model_name, "dim": self._dim, "dtype": self.dtype.name}, f)
+            self._refresh()   # Pick up rows other processes wrote, so our row numbers are right
+            new = {key: vector for key, vector in new.items() if key not in self._index}
+            if not new:
+                return
+            array = np.asarray(list(new.values()), dtype=self.dtype)
+            # Vectors before keys: a reader never sees a key whose vector is missing
+            with open(os.path.join(self.path, "vectors.bin"), "ab") as f:
+                f.write(array.tobytes())
+            with open(os.path.join(self.path, "keys.bin"), "ab") as f:
+                f.write(b"".join(new.keys()))
+            self._refresh()
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialises appends between processes sharing the cache folder."""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.path, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def get_embeddings(model_name: str = EMBEDDING_MODEL) -> Embeddings:
+    """The HuggingFace embeddings for `model_name`, behind the on-disk cache unless it is disabled."""
+    if not CACHE_DIR:
+        return HuggingFaceEmbeddings(model_name=model_name)
+    return CachedEmbeddings(model_name, lambda: HuggingFaceEmbeddings(model_name=model_name))
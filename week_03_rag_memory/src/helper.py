@@ -1,6 +1,7 @@
 import os
 
 import requests
+from collection import QDRANT_PATH, QDRANT_URL
 
 # ___ Check if the file exists if not download it to ../data
 # If the file is not found, download it from the source URL and save to week_03_rag_memory/data
@@ -43,11 +44,14 @@ def check_and_download_file(file_path="../data/Attention_is_all_you_need.pdf", u
 # check is qdrant db is running on localhost:6333
 def check_qdrant_status():
     """
-    Check if Qdrant is running.
+    Check if Qdrant is running. The embedded store (QDRANT_PATH) runs in
+    process and needs no check.
     """
-    qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
+    if QDRANT_PATH:
+        print(f"Using the embedded Qdrant at {QDRANT_PATH}.")
+        return True
     try:
-        response = requests.get(f"{qdrant_url}/collections")
+        response = requests.get(f"{QDRANT_URL}/collections")
         if response.status_code == 200:
             print("Qdrant is running.")
             return True
@@ -1,43 +1,379 @@
+"""
+Streaming ingestion pipeline for the research assistant.
+
+Pages are loaded lazily, split into chunks, grouped into batches, embedded by a
+pool of workers and upserted to Qdrant by another pool. Each pool only takes a
+new batch when one of its `max_pending` slots is free, so a slow Qdrant holds
+back the embedders and the embedders hold back the PDF reader. Memory stays
+bounded by the batches in flight instead of growing with the document set.
+
+Re-running it is incremental. Every chunk's point ID is derived from its source
+file, page and a hash of its text, so unchanged chunks are found in Qdrant and
+skipped before they are embedded. Points of an ingested source whose text is
+gone (edited or removed pages, deleted files in an ingested folder) are deleted
+at the end. Sources are stored relative to the corpus root (INGEST_CORPUS_ROOT,
+default week_03_rag_memory/data), so the same file gets the same IDs whatever
+directory ingestion runs from, in the container (/app/data) or outside it.
+
+A BM25 index of the same chunks (see bm25.py) is kept in step with the
+collection and saved next to it for hybrid retrieval.
+
+Usage:
+    python ingest.py                                  # the default paper
+    python ingest.py ../data                          # every PDF in a folder
+    python ingest.py a.pdf b.pdf --batch-size 128 --embed-workers 4
+"""
+import argparse
+import hashlib
 import os
+import sys
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Set
+
+from bm25 import BM25Index, index_path
+from collection import CollectionConfig, bump_collection_version, connect, create_collection
+from embedding_cache import EMBEDDING_MODEL, get_embeddings
 from helper import check_and_download_file, check_qdrant_status
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_qdrant import QdrantVectorStore
-
-# ---- pre-set-up -----
-url = "https://arxiv.org/pdf/1706.03762"
-file_path = "../data/Attention_is_all_you_need.pdf"
-if check_and_download_file(file_path, url):
-    print("File exists or has been downloaded successfully.")
-else:
-    print("File not found and download failed.")
-    exit()
-if check_qdrant_status():
-    print("Qdrant is running.")
-else:
-    print("Qdrant is not running.")
-    exit()
-
-# ---- 1. Load the data from pdf -----
-loader = PyPDFLoader(file_path)
-documents = loader.load()
-print(f"Loaded {len(documents)} page(s) from the PDF.)")
-
-# ---- 2. Split the documents into chunks -----
-print("Loading embedding model...")
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-docs = text_splitter.split_documents(documents)
-
-# ---- 3. Create the vector store ----
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-# ---- 4. Store chunks into the Qdrant  ----
-qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
-qdrant = QdrantVectorStore.from_documents(
-    documents=docs, 
-    embedding=embeddings, 
-    url=qdrant_url, 
-    collection_name="research_assistant"
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient, models
+
+COLLECTION_NAME = "research_assistant"
+DEFAULT_URL = "https://arxiv.org/pdf/1706.03762"
+DEFAULT_FILE = "../data/Attention_is_all_you_need.pdf"
+# Fixed namespace so the same chunk always maps to the same point ID
+CHUNK_ID_NAMESPACE = uuid.UUID("5f1d9a0e-7c43-4d8e-9a56-0b7e2c1f3a84")
+
+# Chunks per embedding call / upsert request
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "2"))
+UPSERT_WORKERS = int(os.getenv("INGEST_UPSERT_WORKERS", "2"))
+# Batches a stage may have in flight before it stops pulling from the one before
+MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "4"))
+# Sources under this folder are stored relative to it; others by absolute path
+CORPUS_ROOT = os.path.abspath(
+    os.getenv("INGEST_CORPUS_ROOT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
 )
-print("--- Ingestion complete ---")
\ No newline at end of file
+
+
+def canonical_source(path: str) -> str:
+    """The form of `path` stored in the payload and hashed into point IDs: relative to CORPUS_ROOT if inside it."""
+    absolute = os.path.abspath(path)
+    relative = os.path.relpath(absolute, CORPUS_ROOT)
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        return absolute
+    return relative
+
+
+def source_path(source: str) -> str:
+    """The file a canonical source refers to."""
+    return os.path.join(CORPUS_ROOT, source)    # An absolute source stays as it is
+
+
+def stored_source(source: str) -> str:
+    """
+    The canonical form of a source read back from a point. Older versions stored
+    paths as given on the command line; one that only resolves from the current
+    directory is taken as such.
+    """
+    if os.path.isabs(source) or (os.path.exists(source) and not os.path.exists(source_path(source))):
+        return canonical_source(source)
+    return canonical_source(source_path(source))
+
+
+# ---- 1. Load pages, one at a time -----
+def iter_pdf_paths(paths: Iterable[str]) -> Iterator[str]:
+    """Expands folders to the PDFs they contain, in name order."""
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(".pdf"):
+                    yield os.path.normpath(os.path.join(path, name))
+        else:
+            yield os.path.normpath(path)
+
+
+def iter_pages(paths: Iterable[str]) -> Iterator[Document]:
+    for path in iter_pdf_paths(paths):
+        yield from PyPDFLoader(path).lazy_load()
+
+
+# ---- 2. Split each page into chunks -----
+def iter_chunks(pages: Iterable[Document], text_splitter, progress: "Progress") -> Iterator[Document]:
+    for page in pages:
+        progress.pages += 1
+        if page.metadata.get("source"):
+            page.metadata["source"] = canonical_source(page.metadata["source"])
+        for chunk in text_splitter.split_documents([page]):
+            chunk.metadata["content_hash"] = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()
+            chunk.id = chunk_id(chunk)
+            yield chunk
+
+
+def chunk_id(chunk: Document) -> str:
+    """Deterministic point ID from the chunk's source, page and content hash."""
+    key = f"{chunk.metadata.get('source', '')}|{chunk.metadata.get('page', '')}|{chunk.metadata['content_hash']}"
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, key))
+
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bounded_map(executor: ThreadPoolExecutor, func: Callable, items: Iterable, max_pending: int) -> Iterator:
+    """
+    Like executor.map, but only pulls the next item from `items` once fewer than
+    `max_pending` calls are running. Results come back in input order.
+    """
+    pending = deque()
+    for item in items:
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+        pending.append(executor.submit(func, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+# ---- 3. Embed and store batches -----
+def existing_ids(client: QdrantClient, collection_name: str, ids: List[str]) -> Set[str]:
+    if not ids or not client.collection_exists(collection_name):
+        return set()
+    points = client.retrieve(collection_name, ids=ids, with_payload=False, with_vectors=False)
+    return {str(point.id) for point in points}
+
+
+def embed_batch(embeddings, chunks: List[Document]):
+    if not chunks:
+        return chunks, []
+    vectors = embeddings.embed_documents([chunk.page_content for chunk in chunks])
+    return chunks, vectors
+
+
+def ensure_collection(client: QdrantClient, collection_name: str, vector_size: int,
+                      config: Optional[CollectionConfig] = None):
+    """Creates the collection if needed, with the storage settings of `config` (see collection.py)."""
+    if not client.collection_exists(collection_name):
+        create_collection(client, collection_name, vector_size, config)
+
+
+def to_points(chunks: List[Document], vectors: List[List[float]]) -> List[models.PointStruct]:
+    return [
+        models.PointStruct(
+            id=chunk.id,
+            vector=vector,
+            payload={"page_content": chunk.page_content, "metadata": chunk.metadata},
+        )
+        for chunk, vector in zip(chunks, vectors)
+    ]
+
+
+class Progress:
+    """Counts pages and chunks and prints throughput every `every` seconds."""
+
+    def __init__(self, every: float = 2.0):
+        self.every = every
+        self.pages = 0
+        self.chunks = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.started = time.perf_counter()
+        self._last_report = self.started
+
+    @property
+    def chunks_per_second(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return (self.chunks + self.unchanged) / elapsed if elapsed else 0.0
+
+    def stored(self, count: int, unchanged: int = 0):
+        self.chunks += count
+        self.unchanged += unchanged
+        now = time.perf_counter()
+        if now - self._last_report >= self.every:
+            self._last_report = now
+            print(self.line())
+
+    def line(self) -> str:
+        return (
+            f"  {self.pages} page(s), {self.chunks} chunk(s) stored, {self.unchanged} unchanged, "
+            f"{self.deleted} deleted, {self.chunks_per_second:.1f} chunks/sec"
+        )
+
+
+def delete_stale(client: QdrantClient, collection_name: str, sources: Set[str], folders: Set[str],
+                 seen_ids: Set[str], sparse_index: Optional[BM25Index] = None) -> int:
+    """
+    Deletes points that belong to an ingested source but were not seen in this run,
+    and points whose source file under an ingested folder no longer exists.
+    `sources` and `folders` are in canonical_source form.
+    They are removed from `sparse_index` too.
+
+    Returns:
+        int: The number of points deleted.
+    """
+    if not client.collection_exists(collection_name):
+        return 0
+    stale, offset = [], None
+    while True:
+        points, offset = client.scroll(
+            collection_name, limit=1000, offset=offset, with_payload=["metadata.source"], with_vectors=False
+        )
+        for point in points:
+            stored = (point.payload or {}).get("metadata", {}).get("source", "")
+            if not stored:
+                continue
+            source = stored_source(stored)
+            if source in sources:
+                if str(point.id) not in seen_ids:
+                    stale.append(point.id)
+            elif os.path.normpath(os.path.dirname(source)) in folders and not os.path.exists(source_path(source)):
+                stale.append(point.id)
+        if offset is None:
+            break
+    for start in range(0, len(stale), 1000):
+        client.delete(collection_name, points_selector=models.PointIdsList(points=stale[start:start + 1000]), wait=True)
+    if sparse_index is not None:
+        for point_id in stale:
+            sparse_index.remove(str(point_id))
+    return len(stale)
+
+
+def run_pipeline(
+    pages: Iterable[Document],
+    embeddings,
+    client: QdrantClient,
+    collection_name: str = COLLECTION_NAME,
+    text_splitter=None,
+    batch_size: int = BATCH_SIZE,
+    embed_workers: int = EMBED_WORKERS,
+    upsert_workers: int = UPSERT_WORKERS,
+    max_pending: int = MAX_PENDING,
+    folders: Iterable[str] = (),
+    sparse_index: Optional[BM25Index] = None,
+) -> Progress:
+    """
+    Splits, embeds and stores `pages` in Qdrant, batch by batch.
+
+    Args:
+        pages (Iterable[Document]): Pages to ingest; consumed lazily.
+        embeddings: A LangChain Embeddings object.
+        client (QdrantClient): Client for the target Qdrant.
+        collection_name (str): Created on the first batch if it does not exist.
+        text_splitter: Defaults to 1000-character chunks with 100 characters of overlap.
+        batch_size (int): Chunks per embedding call and per upsert.
+        embed_workers (int): Threads computing embeddings.
+        upsert_workers (int): Threads sending upserts to Qdrant.
+        max_pending (int): Batches each stage may have in flight (backpressure).
+        folders (Iterable[str]): Ingested folders; points of PDFs that were removed from them are deleted.
+        sparse_index (BM25Index): Updated with the same chunks and saved at the end, if given.
+
+    Returns:
+        Progress: Final page/chunk counts and throughput.
+    """
+    text_splitter = text_splitter or RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    progress = Progress()
+    collection_ready = False
+    seen_ids: Set[str] = set()
+    sources: Set[str] = set()
+
+    def embed_changed(chunks):
+        # Unchanged chunks already have a point with the same ID; only the rest are embedded
+        unique = list({chunk.id: chunk for chunk in chunks}.values())
+        known = existing_ids(client, collection_name, [chunk.id for chunk in unique])
+        changed = [chunk for chunk in unique if chunk.id not in known]
+        return embed_batch(embeddings, changed) + (len(unique) - len(changed),)
+
+    def upsert(batch):
+        chunks, vectors, unchanged = batch
+        if chunks:
+            client.upsert(collection_name=collection_name, points=to_points(chunks, vectors), wait=True)
+        return len(chunks), unchanged
+
+    def tracked(chunks_iter):
+        for chunk in chunks_iter:
+            seen_ids.add(chunk.id)
+            sources.add(chunk.metadata.get("source", ""))    # Canonical, see iter_chunks
+            # Also catches unchanged chunks that predate the index
+            if sparse_index is not None and chunk.id not in sparse_index:
+                sparse_index.add(chunk.id, chunk.page_content)
+            yield chunk
+
+    def embedded_batches(embedded):
+        # Runs in the calling thread, so the collection is created once before any upsert
+        nonlocal collection_ready
+        for chunks, vectors, unchanged in embedded:
+            if not collection_ready and vectors:
+                ensure_collection(client, collection_name, len(vectors[0]))
+                collection_ready = True
+            yield chunks, vectors, unchanged
+
+    with ThreadPoolExecutor(embed_workers, thread_name_prefix="embed") as embed_pool, \
+            ThreadPoolExecutor(upsert_workers, thread_name_prefix="upsert") as upsert_pool:
+        batches = iter_batches(tracked(iter_chunks(pages, text_splitter, progress)), batch_size)
+        embedded = bounded_map(embed_pool, embed_changed, batches, max_pending)
+        for count, unchanged in bounded_map(upsert_pool, upsert, embedded_batches(embedded), max_pending):
+            progress.stored(count, unchanged)
+
+    progress.deleted = delete_stale(
+        client, collection_name, sources, {canonical_source(f) for f in folders}, seen_ids, sparse_index
+    )
+    if sparse_index is not None and sparse_index.path:
+        sparse_index.save()
+    if progress.chunks or progress.deleted:
+        bump_collection_version(client, collection_name)    # Invalidates cached answers
+    return progress
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest PDFs into the research assistant's Qdrant collection.")
+    parser.add_argument("paths", nargs="*", help="PDF files or folders of PDFs (default: the Attention paper).")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--embed-workers", type=int, default=EMBED_WORKERS)
+    parser.add_argument("--upsert-workers", type=int, default=UPSERT_WORKERS)
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING)
+    args = parser.parse_args()
+
+    # ---- pre-set-up -----
+    paths = args.paths
+    if not paths:
+        if check_and_download_file(DEFAULT_FILE, DEFAULT_URL):
+            print("File exists or has been downloaded successfully.")
+        else:
+            print("File not found and download failed.")
+            sys.exit(1)
+        paths = [DEFAULT_FILE]
+    if check_qdrant_status():
+        print("Qdrant is running.")
+    else:
+        print("Qdrant is not running.")
+        sys.exit(1)
+
+    print("Loading embedding model...")
+    embeddings = get_embeddings(EMBEDDING_MODEL)
+    client = connect()
+
+    print(f"Ingesting {', '.join(paths)} (batch size {args.batch_size}, "
+          f"{args.embed_workers} embed / {args.upsert_workers} upsert workers)")
+    progress = run_pipeline(
+        iter_pages(paths),
+        embeddings,
+        client,
+        batch_size=args.batch_size,
+        embed_workers=args.embed_workers,
+        upsert_workers=args.upsert_workers,
+        max_pending=args.max_pending,
+        folders=[path for path in paths if os.path.isdir(path)],
+        sparse_index=BM25Index.open(index_path(COLLECTION_NAME)),
+    )
+    print(progress.line())
+    print("--- Ingestion complete ---")
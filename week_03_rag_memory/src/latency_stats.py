@@ -0,0 +1,26 @@
+"""
+Latency summaries shared by benchmark.py and collection_benchmark.py.
+
+Kept free of other project imports: benchmark.py loads it before it sets the
+environment (QDRANT_PATH and friends) that collection.py reads on import.
+"""
+from typing import Dict, List
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Nearest-rank p50/p95/p99 and mean of `samples`, in milliseconds."""
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+        return round(ordered[index] * 1000, 2)
+
+    return {
+        "n": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+    }
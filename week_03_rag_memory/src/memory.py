@@ -0,0 +1,86 @@
+"""
+Rolling summary memory for the chat sessions.
+
+With CHAT_MEMORY_MODE=summary the chains see the last `keep_turns` turns
+verbatim, preceded by a summary of everything older. Once `fold_turns` turns
+have moved past the verbatim window, a background worker asks the LLM to fold
+them into the summary; the request that triggered it does not wait. The summary
+is capped at `max_tokens`, so a turn's prompt stays the same size however long
+the session runs.
+
+The summary is saved in the session's log (see chat_log.py) and restored with it.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from langchain_core.messages import BaseMessage, HumanMessage
+from sessions import Session, SessionStore
+
+# "window" (newest messages within the token budget) or "summary"
+MEMORY_MODE = os.getenv("CHAT_MEMORY_MODE", "window")
+SUMMARY_KEEP_TURNS = int(os.getenv("CHAT_SUMMARY_KEEP_TURNS", "4"))
+# Turns past the verbatim window that are folded in one LLM call
+SUMMARY_FOLD_TURNS = int(os.getenv("CHAT_SUMMARY_FOLD_TURNS", "2"))
+SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
+
+
+def transcript(messages: List[BaseMessage]) -> str:
+    return "\n".join(
+        f"{'User' if isinstance(m, HumanMessage) else 'Assistant'}: {m.content}" for m in messages
+    )
+
+
+class RollingSummarizer:
+    """
+    Args:
+        summarize: Called as summarize(summary, transcript, max_words); returns the new summary.
+        store (SessionStore): Where the sessions live; a session being summarised is never evicted.
+        keep_turns (int): Turns (question + answer) kept verbatim.
+        fold_turns (int): Turns folded into the summary per update.
+        max_tokens (int): Upper bound for the summary.
+    """
+
+    def __init__(self, summarize: Callable[[str, str, int], str], store: SessionStore,
+                 keep_turns: int = SUMMARY_KEEP_TURNS, fold_turns: int = SUMMARY_FOLD_TURNS,
+                 max_tokens: int = SUMMARY_MAX_TOKENS):
+        self.summarize = summarize
+        self.store = store
+        self.keep_turns = keep_turns
+        self.fold_turns = fold_turns
+        self.max_tokens = max_tokens
+        self.stats = {"updates": 0, "folded_messages": 0, "failures": 0}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarizer")
+
+    def after_turn(self, session: Session):
+        """Schedules a summary update if enough turns have left the verbatim window."""
+        threshold = 2 * (self.keep_turns + self.fold_turns)
+        with self._lock:
+            if session.summarizing or session.unsummarized < threshold:
+                return
+            session.summarizing = True
+        self._pool.submit(self._update, session.id)
+
+    # --- internals ---
+    def _update(self, session_id: str):
+        with self.store.pinned(session_id) as session:
+            try:
+                messages, generation = session.unsummarized_messages()
+                to_fold = messages[:max(len(messages) - 2 * self.keep_turns, 0)]
+                if not to_fold:
+                    return
+                summary = self.summarize(session.summary, transcript(to_fold), int(self.max_tokens * 0.75))
+                # Four characters per token (see sessions.estimate_tokens)
+                session.fold(summary.strip()[:self.max_tokens * 4], len(to_fold), generation)
+                with self._lock:
+                    self.stats["updates"] += 1
+                    self.stats["folded_messages"] += len(to_fold)
+            except Exception as e:
+                print(f"Summary update for session {session_id} failed: {e}")
+                with self._lock:
+                    self.stats["failures"] += 1
+            finally:
+                with self._lock:
+                    session.summarizing = False
@@ -0,0 +1,271 @@
+"""
+Multi-query retrieval with one batched Qdrant request and reciprocal rank fusion.
+
+MultiQueryRetriever asks the LLM for a few rewrites of the question and then
+searches for each rewrite in turn. FusedMultiQueryRetriever uses the same
+prompt, but embeds the original question and all rewrites and sends every
+search to Qdrant in one query_batch_points call. The ranked lists are then
+merged with reciprocal rank fusion: a chunk scores sum(1 / (rrf_k + rank)) over
+the lists it appears in, so a chunk found by several rewrites comes out on top.
+
+With a BM25 index (see bm25.py), every query is also run against it and its
+rankings join the fusion, so exact terms (equation and section numbers,
+acronyms) are found even when the dense search misses them. Chunks only BM25
+found are fetched from Qdrant by ID in one extra request.
+
+With an AsyncQdrantClient, the async path embeds the queries in one call and
+awaits the batch search, so it never ties up a worker thread.
+
+The generated rewrites and the fused results are cached per normalised question
+(TTL + LRU), so asking the same thing again costs neither the LLM call nor the
+searches. Results are also keyed by the collection version (see
+collection.CollectionVersion), so a re-ingest is never answered from results of
+the old contents, and callers get copies they are free to annotate.
+"""
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.retrievers.multi_query import DEFAULT_QUERY_PROMPT, LineListOutputParser
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from qdrant_client import models
+
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "256"))
+
+
+class TTLCache:
+    """A small thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, max_entries: int = RETRIEVAL_CACHE_SIZE, ttl: float = RETRIEVAL_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.stats["misses"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return True, entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def normalise_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?!.").strip()
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[Tuple[str, Document]]], k: int = 60) -> List[Tuple[Document, float]]:
+    """
+    Fuses ranked lists of (id, Document) into one list sorted by RRF score.
+    The same id in several lists is merged into one entry.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranked in ranked_lists:
+        for rank, (doc_id, document) in enumerate(ranked, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(doc_id, document)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [(documents[doc_id], scores[doc_id]) for doc_id in ordered]
+
+
+class FusedMultiQueryRetriever(BaseRetriever):
+    """
+    Drop-in replacement for MultiQueryRetriever.from_llm over a Qdrant collection.
+
+    Attributes:
+        llm_chain: Generates the rewrites; returns a list of strings.
+        embeddings: Embeds the queries.
+        client: QdrantClient for the collection.
+        async_client: Optional AsyncQdrantClient for the async path.
+        collection_name (str): The collection written by ingest.py.
+        k (int): Documents returned after fusion.
+        fetch_k (int): Hits requested per query before fusion.
+        rrf_k (int): The RRF constant; larger values flatten the rank weights.
+        include_original (bool): Also search for the question itself.
+        sparse_index: Optional BM25Index over the same point IDs (hybrid search).
+        search_params: Optional qdrant SearchParams, e.g. rescoring for a quantised collection.
+        collection_version: Optional collection.CollectionVersion; part of the result cache key.
+    """
+
+    llm_chain: Any
+    embeddings: Any
+    client: Any
+    async_client: Any = None
+    collection_name: str
+    k: int = 4
+    fetch_k: int = 8
+    rrf_k: int = 60
+    include_original: bool = True
+    sparse_index: Any = None
+    search_params: Any = None
+    collection_version: Any = None
+    query_cache: Any = None
+    result_cache: Any = None
+
+    @classmethod
+    def from_llm(cls, llm, embeddings, client, collection_name: str, prompt=DEFAULT_QUERY_PROMPT, **kwargs):
+        return cls(
+            llm_chain=prompt | llm | LineListOutputParser(),
+            embeddings=embeddings,
+            client=client,
+            collection_name=collection_name,
+            query_cache=TTLCache(),
+            result_cache=TTLCache(),
+            **kwargs,
+        )
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        key = normalise_question(query)
+        version = self.collection_version.get() if self.collection_version is not None else None
+        found, documents = self._cache_get(self.result_cache, (version, key))
+        if found:
+            return self._copies(documents)
+        found, queries = self._cache_get(self.query_cache, key)
+        if not found:
+            queries = self.llm_chain.invoke({"question": query}, config={"callbacks": run_manager.get_child()})
+            self._cache_set(self.query_cache, key, queries)
+        documents = self._search(self._with_original(query, queries))
+        self._cache_set(self.result_cache, (version, key), documents)
+        return self._copies(documents)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        key = normalise_question(query)
+        version = await self.collection_version.aget() if self.collection_version is not None else None
+        found, documents = self._cache_get(self.result_cache, (version, key))
+        if found:
+            return self._copies(documents)
+        found, queries = self._cache_get(self.query_cache, key)
+        if not found:
+            queries = await self.llm_chain.ainvoke({"question": query}, config={"callbacks": run_manager.get_child()})
+            self._cache_set(self.query_cache, key, queries)
+        queries = self._with_original(query, queries)
+        if self.async_client is not None:
+            documents = await self._asearch(queries)
+        else:
+            documents = await asyncio.to_thread(self._search, queries)
+        self._cache_set(self.result_cache, (version, key), documents)
+        return self._copies(documents)
+
+    # --- internals ---
+    def _with_original(self, query: str, queries: List[str]) -> List[str]:
+        queries = [q.strip() for q in queries if q and q.strip()]
+        if self.include_original:
+            queries = [query] + queries
+        return list(dict.fromkeys(queries))
+
+    def _search(self, queries: List[str]) -> List[Document]:
+        """One batched Qdrant request for all queries, fused with RRF."""
+        # One batched call; MiniLM embeds queries and documents the same way
+        vectors = self.embeddings.embed_documents(queries)
+        responses = self.client.query_batch_points(self.collection_name, requests=self._requests(vectors))
+        ranked_lists, documents = self._dense_lists(responses)
+        sparse_lists = self._sparse_lists(queries)
+        missing = self._missing(sparse_lists, documents)
+        if missing:
+            points = self.client.retrieve(self.collection_name, ids=missing, with_payload=True)
+            documents.update((str(point.id), self._to_document(point)) for point in points)
+        return self._fuse(ranked_lists + self._resolve(sparse_lists, documents))
+
+    async def _asearch(self, queries: List[str]) -> List[Document]:
+        vectors = await self.embeddings.aembed_documents(queries)
+        responses = await self.async_client.query_batch_points(self.collection_name, requests=self._requests(vectors))
+        ranked_lists, documents = self._dense_lists(responses)
+        sparse_lists = self._sparse_lists(queries)
+        missing = self._missing(sparse_lists, documents)
+        if missing:
+            points = await self.async_client.retrieve(self.collection_name, ids=missing, with_payload=True)
+            documents.update((str(point.id), self._to_document(point)) for point in points)
+        return self._fuse(ranked_lists + self._resolve(sparse_lists, documents))
+
+    def _requests(self, vectors) -> List[models.QueryRequest]:
+        return [
+            models.QueryRequest(query=vector, limit=self.fetch_k, params=self.search_params, with_payload=True)
+            for vector in vectors
+        ]
+
+    def _dense_lists(self, responses) -> Tuple[List[List[Tuple[str, Document]]], Dict[str, Document]]:
+        ranked_lists = [
+            [(str(point.id), self._to_document(point)) for point in response.points]
+            for response in responses
+        ]
+        documents = {doc_id: document for ranked in ranked_lists for doc_id, document in ranked}
+        return ranked_lists, documents
+
+    def _sparse_lists(self, queries: List[str]) -> List[List[str]]:
+        """BM25 rankings (point IDs) for each query; none without an index."""
+        if self.sparse_index is None:
+            return []
+        self.sparse_index.refresh()    # Picks up a re-run of ingest.py
+        return [[doc_id for doc_id, _ in self.sparse_index.search(q, self.fetch_k)] for q in queries]
+
+    @staticmethod
+    def _missing(sparse_lists: List[List[str]], documents: Dict[str, Document]) -> List[str]:
+        return list(dict.fromkeys(doc_id for ranked in sparse_lists for doc_id in ranked if doc_id not in documents))
+
+    @staticmethod
+    def _resolve(sparse_lists: List[List[str]], documents: Dict[str, Document]) -> List[List[Tuple[str, Document]]]:
+        # IDs no longer in the collection (index older than a deletion) are skipped
+        return [[(doc_id, documents[doc_id]) for doc_id in ranked if doc_id in documents] for ranked in sparse_lists]
+
+    def _fuse(self, ranked_lists: List[List[Tuple[str, Document]]]) -> List[Document]:
+        fused = reciprocal_rank_fusion(ranked_lists, k=self.rrf_k)
+        # Different points can carry the same text (e.g. the same paper ingested twice)
+        unique, seen = [], set()
+        for document, score in fused:
+            if document.page_content in seen:
+                continue
+            seen.add(document.page_content)
+            document.metadata["rrf_score"] = round(score, 6)
+            unique.append(document)
+            if len(unique) == self.k:
+                break
+        return unique
+
+    def _to_document(self, point) -> Document:
+        payload = point.payload or {}
+        metadata = dict(payload.get("metadata") or {})
+        metadata["_id"] = point.id
+        metadata["_collection_name"] = self.collection_name
+        return Document(page_content=payload.get("page_content", ""), metadata=metadata)
+
+    @staticmethod
+    def _copies(documents: List[Document]) -> List[Document]:
+        """Copies of cached documents, so later stages (e.g. the reranker's scores) don't change the cache."""
+        return [Document(page_content=d.page_content, metadata=dict(d.metadata)) for d in documents]
+
+    @staticmethod
+    def _cache_get(cache: Optional[TTLCache], key):
+        return cache.get(key) if cache is not None else (False, None)
+
+    @staticmethod
+    def _cache_set(cache: Optional[TTLCache], key, value):
+        if cache is not None:
+            cache.set(key, value)
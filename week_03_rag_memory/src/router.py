@@ -0,0 +1,159 @@
+"""
+Local routing between the conversational chain and the RAG chain.
+
+The LLM router in assistant_core.py costs a full LLM call per message just to
+answer YES/NO. EmbeddingRouter makes the same decision with the MiniLM model
+that is already loaded for retrieval: the question is compared with the recent
+history turns and with the closest chunk of the document corpus. If it is
+clearly closer to the conversation, it is a follow-up; otherwise it goes to RAG.
+
+In "compare" mode the LLM router still runs, in the background, and every
+decision is logged together with the LLM's answer. The agreement rate is the
+local router's accuracy measured against the LLM router; its counters are kept
+in `stats`. In "local" mode nothing is written to disk.
+"""
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+
+# "local", "llm" or "compare" (local decides, the LLM router is logged for agreement)
+ROUTER_MODE = os.getenv("ROUTER_MODE", "local")
+# History messages (human + AI) compared with the question
+HISTORY_MESSAGES = int(os.getenv("ROUTER_HISTORY_MESSAGES", "6"))
+# The question must be at least this similar to a history turn to count as a follow-up...
+MIN_HISTORY_SIMILARITY = float(os.getenv("ROUTER_MIN_HISTORY_SIMILARITY", "0.35"))
+# ...and this much closer to the history than to the best document chunk
+MARGIN = float(os.getenv("ROUTER_MARGIN", "0.05"))
+LOG_PATH = os.getenv(
+    "ROUTER_LOG_PATH", os.path.join(os.getenv("CHAT_HISTORY_DIR", "/app/chat_history"), "router_log.jsonl")
+)
+
+
+@dataclass
+class RouteDecision:
+    question: str
+    follow_up: bool
+    history_score: float
+    corpus_score: float
+    llm_follow_up: Optional[bool] = None
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class EmbeddingRouter:
+    """
+    Args:
+        embeddings: The LangChain Embeddings object used for retrieval.
+        client: QdrantClient holding the document collection.
+        async_client: Optional AsyncQdrantClient for `aroute`.
+        collection_name (str): The document collection.
+        log_path (str): JSONL file for compared decisions; empty to disable.
+    """
+
+    def __init__(self, embeddings, client, collection_name: str, log_path: str = LOG_PATH, async_client=None):
+        self.embeddings = embeddings
+        self.client = client
+        self.async_client = async_client
+        self.collection_name = collection_name
+        self.log_path = log_path
+        self.stats = {"local": 0, "follow_ups": 0, "compared": 0, "agreements": 0, "log_errors": 0}
+        self._lock = threading.Lock()
+        self._shadow = ThreadPoolExecutor(max_workers=1, thread_name_prefix="router-shadow")
+
+    def route(self, question: str, chat_history: list) -> RouteDecision:
+        """Decides whether `question` is a follow-up to the conversation (True) or needs RAG (False)."""
+        history = self._history(chat_history)
+        if not history:
+            return self._decide(question, 0.0, 0.0)
+        vector = self.embeddings.embed_query(question)
+        history_vectors = self.embeddings.embed_documents(history)
+        history_score = max(_cosine(vector, other) for other in history_vectors)
+        return self._decide(question, history_score, self._corpus_score(vector))
+
+    async def aroute(self, question: str, chat_history: list) -> RouteDecision:
+        """Async counterpart of `route`."""
+        history = self._history(chat_history)
+        if not history:
+            return self._decide(question, 0.0, 0.0)
+        vector, history_vectors = await asyncio.gather(
+            self.embeddings.aembed_query(question), self.embeddings.aembed_documents(history)
+        )
+        history_score = max(_cosine(vector, other) for other in history_vectors)
+        return self._decide(question, history_score, await self._acorpus_score(vector))
+
+    def compare_in_background(self, decision: RouteDecision, llm_route):
+        """Runs `llm_route()` (returns the LLM router's text) off the request path and logs agreement."""
+        def run():
+            try:
+                decision.llm_follow_up = "YES" in llm_route().upper()
+            except Exception as e:
+                print(f"LLM router comparison failed: {e}")
+                return
+            with self._lock:
+                self.stats["compared"] += 1
+                self.stats["agreements"] += decision.llm_follow_up == decision.follow_up
+            self.log(decision)
+        self._shadow.submit(run)
+
+    @property
+    def agreement(self) -> Optional[float]:
+        compared = self.stats["compared"]
+        return self.stats["agreements"] / compared if compared else None
+
+    def log(self, decision: RouteDecision):
+        """Appends a compared decision to the log; a failed write is counted, never raised."""
+        if not self.log_path:
+            return
+        record = {"time": time.time(), **asdict(decision), "agreement_rate": self.agreement}
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                with open(self.log_path, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                self.stats["log_errors"] += 1
+                print(f"Router log write failed: {e}")
+
+    @staticmethod
+    def _history(chat_history: list) -> List[str]:
+        return [m.content[:1000] for m in chat_history[-HISTORY_MESSAGES:] if getattr(m, "content", "")]
+
+    def _decide(self, question: str, history_score: float, corpus_score: float) -> RouteDecision:
+        decision = RouteDecision(
+            question,
+            follow_up=history_score >= MIN_HISTORY_SIMILARITY and history_score >= corpus_score + MARGIN,
+            history_score=round(history_score, 4),
+            corpus_score=round(corpus_score, 4),
+        )
+        with self._lock:
+            self.stats["local"] += 1
+            self.stats["follow_ups"] += decision.follow_up
+        return decision
+
+    def _corpus_score(self, vector: List[float]) -> float:
+        try:
+            points = self.client.query_points(self.collection_name, query=vector, limit=1).points
+        except Exception as e:
+            print(f"Router corpus lookup failed, assuming the corpus matches: {e}")
+            return 1.0
+        return points[0].score if points else 0.0
+
+    async def _acorpus_score(self, vector: List[float]) -> float:
+        if self.async_client is None:
+            return await asyncio.to_thread(self._corpus_score, vector)
+        try:
+            points = (await self.async_client.query_points(self.collection_name, query=vector, limit=1)).points
+        except Exception as e:
+            print(f"Router corpus lookup failed, assuming the corpus matches: {e}")
+            return 1.0
+        return points[0].score if points else 0.0
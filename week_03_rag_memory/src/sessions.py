@@ -0,0 +1,301 @@
+"""
+Per-session conversation store for the web app.
+
+Every session has its own append-only ChatLog under <directory>/sessions/ and
+an in-memory window of its latest messages. Writes go to disk on every turn,
+so evicting a session only drops its in-memory copy. When the estimated size
+of all in-memory sessions passes `memory_budget_bytes`, idle sessions are
+evicted, least recently used first, and reloaded from their log tail on the
+next request. A reload reads the log outside the store-wide lock (in a worker
+thread on the async path), so other sessions are not held up by it; concurrent
+requests for the same session wait for the one load.
+
+The history passed to the chains is cut to a token budget rather than a fixed
+number of messages: the newest messages are kept until the budget is spent.
+With a rolling summary (see memory.py), the history is the summary followed by
+the messages it does not cover yet.
+"""
+import asyncio
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from chat_log import ChatLog
+from langchain_core.messages import BaseMessage, SystemMessage
+
+DEFAULT_SESSION = "default"
+# Upper bound for all in-memory histories together
+MEMORY_BUDGET_BYTES = int(float(os.getenv("CHAT_MEMORY_BUDGET_MB", "64")) * 1024 * 1024)
+# Messages kept in memory per session
+HISTORY_WINDOW = int(os.getenv("CHAT_HISTORY_WINDOW", "50"))
+# Tokens of history passed to the chains, and kept by "prune"
+TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_MESSAGE_OVERHEAD = 200   # Rough bytes per message object besides its text
+
+
+def estimate_tokens(text: str) -> int:
+    """About four characters per token for English text; no tokenizer needed."""
+    return len(text) // 4 + 1
+
+
+def token_window(messages: List[BaseMessage], max_tokens: int = TOKEN_BUDGET) -> List[BaseMessage]:
+    """The longest run of newest messages that fits in `max_tokens` (at least the last one)."""
+    used, start = 0, len(messages)
+    for index in range(len(messages) - 1, -1, -1):
+        used += estimate_tokens(str(messages[index].content))
+        if used > max_tokens and start < len(messages):
+            break
+        start = index
+    return messages[start:]
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def is_valid_session_id(session_id: Optional[str]) -> bool:
+    return bool(session_id) and bool(_SESSION_ID.match(session_id))
+
+
+class Session:
+    def __init__(self, session_id: str, log: ChatLog, messages: List[BaseMessage], summary: Optional[dict] = None):
+        self.id = session_id
+        self.log = log
+        self.messages = messages
+        self.summary = summary["text"] if summary else ""
+        # Newest messages not folded into the summary yet (all of them without a summary)
+        self.unsummarized = summary["unsummarized"] if summary else len(messages)
+        self.summarizing = False
+        self.generation = 0     # Bumped by prune/clear, so a summary of dropped messages is discarded
+        self._state_lock = threading.Lock()    # Keeps messages, summary and log records in step
+        self.size = self._measure()     # Estimated bytes of the in-memory history
+        self.lock = threading.Lock()    # One turn at a time per session...
+        self.alock = asyncio.Lock()     # ...or, for the async web handlers, without blocking the event loop
+        self.active = 0                 # Requests currently using the session
+        self.last_used = time.time()
+
+    def _measure(self) -> int:
+        return sum(len(str(m.content)) + _MESSAGE_OVERHEAD for m in self.messages) + len(self.summary)
+
+    def history(self, max_tokens: int = TOKEN_BUDGET) -> List[BaseMessage]:
+        with self._state_lock:
+            if not self.summary:
+                return token_window(self.messages, max_tokens)
+            summary = SystemMessage(content=f"Summary of the earlier conversation:\n{self.summary}")
+            recent = self.messages[-self.unsummarized:] if self.unsummarized else []
+            return [summary] + token_window(recent, max(max_tokens - estimate_tokens(self.summary), 1))
+
+    def unsummarized_messages(self) -> Tuple[List[BaseMessage], int]:
+        """The messages the summary does not cover yet, and the generation they belong to."""
+        with self._state_lock:
+            return (self.messages[-self.unsummarized:] if self.unsummarized else []), self.generation
+
+    def append(self, messages: List[BaseMessage], window: int = HISTORY_WINDOW):
+        with self._state_lock:
+            self.messages.extend(messages)
+            del self.messages[:-window]
+            self.unsummarized = min(self.unsummarized + len(messages), len(self.messages))
+            self.size = self._measure()
+            self.log.append(messages)
+
+    def fold(self, summary: str, folded: int, generation: int):
+        """Replaces the summary with one that also covers the oldest `folded` unsummarized messages."""
+        with self._state_lock:
+            if generation != self.generation:
+                return
+            self.summary = summary
+            self.unsummarized = max(self.unsummarized - folded, 0)
+            self.size = self._measure()
+            self.log.write_summary(summary, self.unsummarized)
+
+    def prune(self, max_tokens: int = TOKEN_BUDGET):
+        """Keeps only the messages that fit in the token budget, in memory and in the log. Drops the summary."""
+        with self._state_lock:
+            kept = token_window(self.messages, max_tokens)
+            if len(kept) < len(self.messages) or self.summary:
+                self.messages[:] = kept
+                self.generation += 1
+                self.summary = ""
+                self.unsummarized = len(kept)
+                self.size = self._measure()
+                self.log.prune(len(kept))
+
+    def clear(self):
+        with self._state_lock:
+            self.messages.clear()
+            self.generation += 1
+            self.summary = ""
+            self.unsummarized = 0
+            self.size = 0
+            self.log.clear()
+
+
+class SessionStore:
+    """
+    Args:
+        directory (str): Folder for the per-session logs.
+        memory_budget_bytes (int): Estimated size of all in-memory histories before eviction starts.
+        window (int): Messages kept in memory per session.
+    """
+
+    def __init__(self, directory: str, memory_budget_bytes: int = MEMORY_BUDGET_BYTES, window: int = HISTORY_WINDOW):
+        self.directory = os.path.join(directory, "sessions")
+        self.memory_budget_bytes = memory_budget_bytes
+        self.window = window
+        self.stats = {"loaded": 0, "evicted": 0}
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._loading: Dict[str, Future] = {}    # Placeholders for sessions being read from disk
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def session(self, session_id: str):
+        """
+        Yields the session, loading it from disk if needed, and holds its turn lock.
+        Sessions in use are never evicted.
+        """
+        session = self._acquire(session_id)
+        try:
+            with session.lock:
+                yield session
+        finally:
+            self._release(session)
+
+    @asynccontextmanager
+    async def asession(self, session_id: str):
+        """Async counterpart of `session`; loads the session and waits for its turn without blocking the event loop."""
+        session = await self._aacquire(session_id)
+        try:
+            async with session.alock:
+                yield session
+        finally:
+            self._release(session)
+
+    @contextmanager
+    def pinned(self, session_id: str):
+        """Yields the session and keeps it from being evicted, without taking its turn lock."""
+        session = self._acquire(session_id)
+        try:
+            yield session
+        finally:
+            self._release(session)
+
+    def peek(self, session_id: str) -> List[BaseMessage]:
+        """A copy of the session's in-memory messages, without waiting for a running turn."""
+        session = self._acquire(session_id)
+        try:
+            return list(session.messages)
+        finally:
+            self._release(session)
+
+    async def apeek(self, session_id: str) -> List[BaseMessage]:
+        """Async counterpart of `peek`."""
+        session = await self._aacquire(session_id)
+        try:
+            return list(session.messages)
+        finally:
+            self._release(session)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "sessions_in_memory": len(self._sessions),
+                "memory_bytes": sum(session.size for session in self._sessions.values()),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                **self.stats,
+            }
+
+    # --- internals ---
+    def _acquire(self, session_id: str) -> Session:
+        while True:
+            session, loading, owner = self._claim(session_id)
+            if session is not None:
+                return session
+            if not owner:
+                loading.result()    # Another thread is loading it; look again once it is done
+                continue
+            try:
+                return self._install(session_id, self._load(session_id))
+            finally:
+                self._done_loading(session_id, loading)
+
+    async def _aacquire(self, session_id: str) -> Session:
+        while True:
+            session, loading, owner = self._claim(session_id)
+            if session is not None:
+                return session
+            if not owner:
+                await asyncio.wrap_future(loading)
+                continue
+            try:
+                return self._install(session_id, await asyncio.to_thread(self._load, session_id))
+            finally:
+                self._done_loading(session_id, loading)
+
+    def _claim(self, session_id: str) -> Tuple[Optional[Session], Optional[Future], bool]:
+        """
+        Returns the in-memory session, already pinned, or the placeholder of its load
+        and whether the caller owns that load (and must read the log).
+        """
+        if not is_valid_session_id(session_id):
+            raise ValueError(f"Invalid session id: {session_id!r}")
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.active += 1
+                return session, None, False
+            loading = self._loading.get(session_id)
+            if loading is not None:
+                return None, loading, False
+            loading = self._loading[session_id] = Future()
+            return None, loading, True
+
+    def _install(self, session_id: str, session: Session) -> Session:
+        with self._lock:
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            session.active += 1
+            self.stats["loaded"] += 1
+            return session
+
+    def _done_loading(self, session_id: str, loading: Future):
+        # Also on a failed load, so waiters retry rather than hang
+        with self._lock:
+            del self._loading[session_id]
+        loading.set_result(None)
+
+    def _release(self, session: Session):
+        with self._lock:
+            session.active -= 1
+            session.last_used = time.time()
+            self._evict()
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.jsonl")
+
+    def _load(self, session_id: str) -> Session:
+        log = ChatLog(self._path(session_id))
+        messages, summary = log.load(self.window)
+        return Session(session_id, log, messages, summary)
+
+    def _evict(self):
+        """Drops idle sessions, least recently used first, until the memory estimate fits the budget."""
+        total = sum(session.size for session in self._sessions.values())
+        for session_id in list(self._sessions):
+            if total <= self.memory_budget_bytes:
+                break
+            session = self._sessions[session_id]
+            if session.active:
+                continue
+            total -= session.size
+            session.log.close()
+            del self._sessions[session_id]
+            self.stats["evicted"] += 1
@@ -3,19 +3,29 @@ import os
 
 # Import the assistant logic
 from assistant_core import (
-    chat_history, 
-    get_assistant_response, 
-    clear_chat_history, 
-    prune_chat_history
+    aget_assistant_response,
+    astream_assistant_response,
+    aget_chat_history,
+    aclear_chat_history,
+    embedding_router,
+    aprune_chat_history,
+    answer_cache,
+    context_packer,
+    session_store,
+    summarizer
 )
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 from langchain_core.messages import (
     AIMessage,
     HumanMessage,
 )
+from sessions import is_valid_session_id, new_session_id
+
+SESSION_COOKIE = "session_id"
+SESSION_HEADER = "X-Session-ID"
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
@@ -24,30 +34,83 @@ templates = Jinja2Templates(directory="templates")
 class ChatMessage(BaseModel):
     message: str
 
+def session_id_for(request: Request) -> str:
+    """The caller's session: the X-Session-ID header, else the session cookie, else a new one."""
+    for session_id in (request.headers.get(SESSION_HEADER), request.cookies.get(SESSION_COOKIE)):
+        if is_valid_session_id(session_id):
+            return session_id
+    return new_session_id()
+
+def with_session(response: Response, request: Request, session_id: str) -> Response:
+    if request.cookies.get(SESSION_COOKIE) != session_id:
+        response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+    return response
+
 @app.get("/", response_class=HTMLResponse)
 async def chat_page(request: Request):
-    # The chat_history is now managed per session, so we pass the current state
-    return templates.TemplateResponse("chat.html", {"request": request, "messages": chat_history})
+    session_id = session_id_for(request)
+    response = templates.TemplateResponse(
+        "chat.html", {"request": request, "messages": await aget_chat_history(session_id)}
+    )
+    return with_session(response, request, session_id)
 
+# The chain runs asynchronously (LLM, embeddings and Qdrant), so slow turns don't hold a thread each
 @app.post("/chat")
-async def chat(chat_message: ChatMessage):
+async def chat(chat_message: ChatMessage, request: Request):
+    session_id = session_id_for(request)
     if chat_message.message:
-        response = get_assistant_response(chat_message.message)
-        # The last message in chat_history is the assistant's response
-        assistant_message = chat_history[-1].content
-        return JSONResponse(content={"response": assistant_message})
+        response = await aget_assistant_response(chat_message.message, session_id)
+        return with_session(JSONResponse(content={"response": response}), request, session_id)
     return JSONResponse(content={"response": "No message provided"}, status_code=400)
 
+def sse(data: dict, event: str = None) -> str:
+    """One Server-Sent Events message."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(chat_message: ChatMessage, request: Request):
+    """Streams the answer as Server-Sent Events: `data: {"token": ...}` per chunk, then an `event: done`."""
+    session_id = session_id_for(request)
+    if not chat_message.message:
+        return JSONResponse(content={"response": "No message provided"}, status_code=400)
+
+    async def events():
+        try:
+            async for token in astream_assistant_response(chat_message.message, session_id):
+                yield sse({"token": token})
+        except Exception as e:
+            yield sse({"error": str(e)}, event="error")
+            return
+        yield sse({}, event="done")
+
+    response = StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    return with_session(response, request, session_id)
+
 @app.post("/chat/clear")
-async def clear_history():
-    clear_chat_history()
-    return JSONResponse(content={"message": "Chat history cleared"})
+async def clear_history(request: Request):
+    session_id = session_id_for(request)
+    await aclear_chat_history(session_id)
+    return with_session(JSONResponse(content={"message": "Chat history cleared"}), request, session_id)
 
 @app.post("/chat/prune")
-async def prune_history():
-    prune_chat_history() # a default of 4 messages will be kept
-    return JSONResponse(content={"message": "Chat history pruned"})
+async def prune_history(request: Request):
+    session_id = session_id_for(request)
+    await aprune_chat_history(session_id) # keeps the newest messages within the token budget
+    return with_session(JSONResponse(content={"message": "Chat history pruned"}), request, session_id)
+
+@app.get("/stats")
+async def stats():
+    return JSONResponse(content={
+        "router": {**embedding_router.stats, "agreement_with_llm": embedding_router.agreement},
+        "sessions": session_store.snapshot(),
+        "summaries": summarizer.stats,
+        "answer_cache": answer_cache.snapshot(),
+        "context": context_packer.stats,
+    })
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)